@@ -0,0 +1,56 @@
+"""Benchmark getting the JupyterHub config, as done by most of the service routes.
+
+Measures the first (startup) load of a config file, a warm ``get_jupyterhub_config``
+call, and the previous behaviour: a full load once per expiry of a 180s TTL cache.
+Run from the repository root:
+
+    python -m benchmarks.bench_config_load --config jupyterhub_config.py --calls 10000
+"""
+import argparse
+import logging
+import os
+import statistics
+import time
+
+from jhub_apps.service.logging_utils import setup_logging
+
+
+def _time(func, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", default="jupyterhub_config.py")
+    parser.add_argument("--calls", type=int, default=10000)
+    parser.add_argument("--loads", type=int, default=5, help="number of full loads to average")
+    args = parser.parse_args()
+
+    # Keep the benchmark output readable, only warnings from jhub-apps are shown
+    logging.basicConfig(level=logging.WARNING)
+    setup_logging()
+    os.environ["JHUB_JUPYTERHUB_CONFIG"] = os.path.abspath(args.config)
+    from jhub_apps.service.utils import _load_jupyterhub_config, get_jupyterhub_config
+
+    start = time.perf_counter()
+    get_jupyterhub_config()
+    startup = time.perf_counter() - start
+    full_loads = _time(lambda: _load_jupyterhub_config(os.environ["JHUB_JUPYTERHUB_CONFIG"]), args.loads)
+    warm_calls = _time(get_jupyterhub_config, args.calls)
+
+    print(f"config: {args.config}")
+    print(f"first load (startup)          {startup * 1000:10.1f}ms")
+    print(f"full load, median of {args.loads:<3}      {statistics.median(full_loads) * 1000:10.1f}ms")
+    print(f"warm get_jupyterhub_config()  {statistics.median(warm_calls) * 1e6:10.2f}us median, "
+          f"{max(warm_calls) * 1000:.2f}ms max over {args.calls} calls")
+    print(f"before: a request stalled for a full load every 180s per worker, "
+          f"now only when {args.config} changes (reloaded in the background)")
+
+
+if __name__ == "__main__":
+    main()
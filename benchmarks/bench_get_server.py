@@ -0,0 +1,89 @@
+"""Benchmark ``AsyncHubClient.get_server`` response size and latency against the number of Hub users.
+
+``get_server`` used to list all the users and filter them in Python, it now fetches the
+single user, so its cost must not grow with the size of the Hub. Run from the
+repository root:
+
+    python -m benchmarks.bench_get_server --users 100 1000 10000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+from benchmarks.stub_hub import StubHub, make_users
+from jhub_apps.service.logging_utils import setup_logging
+
+USERNAME = "user-0"
+SERVERNAME = "app-0"
+
+
+async def _response_size(http_client, url, **params):
+    response = await http_client.get(url, params=params)
+    response.raise_for_status()
+    return len(response.content)
+
+
+async def _latencies(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def bench(repeat):
+    from jhub_apps.hub_client.async_hub_client import AsyncHubClient, close_http_client, get_http_client
+
+    http_client = get_http_client()
+    hub_client = AsyncHubClient(username=USERNAME)
+
+    async def list_all_users():
+        """The previous implementation of get_server"""
+        users = await hub_client.get_users()
+        given_user = next(user for user in users if user["name"] == USERNAME)
+        return given_user["servers"][SERVERNAME]
+
+    async def get_server():
+        return await hub_client.get_server(USERNAME, SERVERNAME)
+
+    assert await list_all_users() == await get_server()
+    sizes = (
+        await _response_size(http_client, "/users", include_stopped_servers=True),
+        await _response_size(http_client, f"/users/{USERNAME}", include_stopped_servers=True),
+    )
+    latencies = (
+        await _latencies(list_all_users, repeat),
+        await _latencies(get_server, repeat),
+    )
+    await close_http_client()
+    return sizes, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[100, 1000, 10_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    # Keep the benchmark output readable, only warnings from jhub-apps are shown
+    logging.basicConfig(level=logging.WARNING)
+    setup_logging()
+    os.environ["JUPYTERHUB_API_TOKEN"] = "benchmark-service-token"
+    print(f"{'users':>7}  {'GET /users':>24}  {'GET /users/{name}':>24}")
+    for user_count in args.users:
+        with StubHub(users=make_users(user_count)) as hub:
+            os.environ["JUPYTERHUB_API_URL"] = hub.api_url
+            (all_size, one_size), (all_latencies, one_latencies) = asyncio.run(bench(args.repeat))
+        print(
+            f"{user_count:>7}  "
+            f"{all_size / 1024:9.1f}KiB {statistics.median(all_latencies) * 1000:9.2f}ms  "
+            f"{one_size / 1024:9.1f}KiB {statistics.median(one_latencies) * 1000:9.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark fetching the config of an app from a large git repository.
+
+Builds a local fixture repository with a small conda-project config directory, a
+thumbnail and large data files (served over file:// with partial clones allowed),
+then compares the previous shallow clone of the whole branch with the git mirrors:
+a cold partial fetch of the config and thumbnail only, a fetch of a new commit into
+the existing mirror, and the resolution of an unchanged ref (cache hit).
+Run from the repository root:
+
+    python -m benchmarks.bench_git_app_config --data-files 20 --data-file-size 10
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import git
+
+from jhub_apps.service.git_mirrors import GitMirrors, resolve_ref
+from jhub_apps.service.logging_utils import setup_logging
+
+THUMBNAIL = "thumbnail.png"
+
+
+def _directory_size(path) -> int:
+    return sum(file.stat().st_size for file in Path(path).rglob("*") if file.is_file())
+
+
+def _create_fixture_repo(path: Path, data_files: int, data_file_size: int) -> git.Repo:
+    repo = git.Repo.init(path, initial_branch="main")
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "benchmark")
+        config.set_value("user", "email", "benchmark@example.com")
+        config.set_value("uploadpack", "allowFilter", "true")
+    (path / "config").mkdir()
+    (path / "config" / "conda-project.yml").write_text("name: app\nenvironments:\n  default: [environment.yml]\n")
+    (path / "config" / "environment.yml").write_text("dependencies:\n  - python\n  - panel\n")
+    (path / THUMBNAIL).write_bytes(os.urandom(50 * 1024))
+    (path / "data").mkdir()
+    for i in range(data_files):
+        # Random, so that it doesn't compress
+        (path / "data" / f"dataset-{i}.bin").write_bytes(os.urandom(data_file_size * 1024 * 1024))
+    repo.git.add(A=True)
+    repo.index.commit("Add app")
+    return repo
+
+
+def _time(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-files", type=int, default=20)
+    parser.add_argument("--data-file-size", type=int, default=10, help="size of each data file, in MiB")
+    args = parser.parse_args()
+
+    # Keep the benchmark output readable, only warnings from jhub-apps are shown
+    logging.basicConfig(level=logging.WARNING)
+    setup_logging()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        repo = _create_fixture_repo(temp_path / "repo", args.data_files, args.data_file_size)
+        url = f"file://{temp_path / 'repo'}"
+        print(f"fixture: {args.data_files} data files of {args.data_file_size} MiB, "
+              f"{_directory_size(temp_path / 'repo' / '.git') / 2 ** 20:.1f} MiB of git objects")
+
+        clone_path = temp_path / "clone"
+        clone = _time(lambda: git.Repo.clone_from(url, clone_path, depth=1, branch="main"))
+        print(f"before: shallow clone          {clone * 1000:10.1f}ms "
+              f"{_directory_size(clone_path) / 2 ** 20:10.1f} MiB on disk")
+
+        git_mirrors = GitMirrors(path=str(temp_path / "mirrors"))
+
+        def fetch_app(checkout: str):
+            ref = resolve_ref(url, "main")
+            with git_mirrors.open(url) as mirror:
+                git_mirrors.fetch(mirror, ref)
+                git_mirrors.extract(mirror, ref.sha, ["config"], checkout)
+                git_mirrors.extract(mirror, ref.sha, [THUMBNAIL], checkout)
+
+        cold = _time(lambda: fetch_app(str(temp_path / "cold")))
+        print(f"after: cold partial fetch      {cold * 1000:10.1f}ms "
+              f"{_directory_size(temp_path / 'mirrors') / 2 ** 20:10.1f} MiB on disk")
+
+        (temp_path / "repo" / "config" / "environment.yml").write_text("dependencies:\n  - python\n")
+        repo.index.add(["config/environment.yml"])
+        repo.index.commit("Update the environment")
+        incremental = _time(lambda: fetch_app(str(temp_path / "incremental")))
+        print(f"after: new commit, same mirror {incremental * 1000:10.1f}ms "
+              f"{_directory_size(temp_path / 'mirrors') / 2 ** 20:10.1f} MiB on disk")
+
+        unchanged = _time(lambda: resolve_ref(url, "main"))
+        print(f"after: unchanged ref (cached)  {unchanged * 1000:10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
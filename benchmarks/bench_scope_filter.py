@@ -0,0 +1,58 @@
+"""Benchmark filtering users by scopes with ScopeFilter against a per-user has_scope loop.
+
+Requires JupyterHub>=5. Run from the repository root:
+
+    python -m benchmarks.bench_scope_filter --users 10000
+"""
+import argparse
+import time
+
+from jhub_apps.hub_client.hub_client import ScopeFilter
+
+
+def has_scope_loop(scopes, entities, entity_key="user"):
+    """The previous implementation of filter_entity_based_on_scopes"""
+    from jupyterhub.scopes import expand_scopes, has_scope
+    allowed_entities_to_read = set()
+    expanded_scopes = expand_scopes(scopes)
+    for entity in entities:
+        if has_scope(f'read:{entity_key}s:name!{entity_key}={entity}', expanded_scopes):
+            allowed_entities_to_read.add(entity)
+    return list(allowed_entities_to_read)
+
+
+def _timed(fn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--allowed", type=int, default=500, help="number of explicitly allowed users")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    users = [f"user-{i}" for i in range(args.users)]
+    # Allow every n-th user explicitly, as a user with a custom sharing role would
+    step = max(args.users // args.allowed, 1)
+    scopes = [f"read:users:name!user={user}" for user in users[::step]]
+
+    # has_scope memoizes up to 1024 results, which doesn't help when cycling
+    # through thousands of users
+    loop_time, expected = _timed(lambda: has_scope_loop(scopes, users), args.repeat)
+    filter_time, allowed = _timed(lambda: ScopeFilter(scopes).filter(users), args.repeat)
+    assert set(allowed) == set(expected)
+
+    print(f"{args.users} users, {len(scopes)} scopes, {len(allowed)} allowed")
+    print(f"has_scope loop   {loop_time * 1000:9.2f}ms")
+    print(f"ScopeFilter      {filter_time * 1000:9.2f}ms  ({loop_time / filter_time:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
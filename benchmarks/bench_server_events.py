@@ -0,0 +1,94 @@
+"""Benchmark the Hub requests made to keep open tabs up to date with server changes.
+
+Compares N tabs polling ``GET /server/`` with N tabs subscribed to the server events
+(``/server/events``), which share a single watcher per worker. Run from the
+repository root:
+
+    python -m benchmarks.bench_server_events --tabs 50 --duration 10 --interval 2
+"""
+import argparse
+import asyncio
+import logging
+from unittest.mock import Mock
+
+import httpx
+
+from benchmarks.bench_server_list import USERNAME, _set_environment
+from benchmarks.stub_hub import StubHub, make_users
+from jhub_apps.service.logging_utils import setup_logging
+
+
+async def poll_server_list(tabs, duration, interval):
+    from jhub_apps.service.app import app
+    from jhub_apps.service.security import get_current_user
+
+    user = Mock()
+    user.name = USERNAME
+
+    async def current_user():
+        return user
+
+    app.dependency_overrides[get_current_user] = current_user
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://japps") as client:
+
+        async def tab():
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + duration
+            while loop.time() < deadline:
+                (await client.get("/server/")).raise_for_status()
+                await asyncio.sleep(interval)
+
+        await asyncio.gather(*[tab() for _ in range(tabs)])
+
+
+async def watch_server_events(tabs, duration, interval):
+    """As the /server/events route: the tabs of the user share a listing of the shared servers."""
+    from jhub_apps.service.events import ServerEvents
+
+    server_events = ServerEvents(interval=interval)
+
+    async def tab():
+        events = server_events.watch(USERNAME)
+        try:
+            async for _ in events:
+                pass
+        finally:
+            await events.aclose()
+
+    tasks = [asyncio.create_task(tab()) for _ in range(tabs)]
+    await asyncio.sleep(duration)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _count_requests(hub, bench):
+    before = hub.request_count
+    asyncio.run(bench)
+    # Leaves out the request made by request_count itself
+    return hub.request_count - before - 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tabs", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--interval", type=float, default=2, help="polling/events interval in seconds")
+    parser.add_argument("--users", type=int, default=500, help="number of users in the stub Hub")
+    args = parser.parse_args()
+
+    # Keep the benchmark output readable, only warnings from jhub-apps are shown
+    logging.basicConfig(level=logging.WARNING)
+    setup_logging()
+    with StubHub(users=make_users(args.users)) as hub:
+        _set_environment(hub.api_url)
+        print(f"{args.tabs} tabs for {args.duration:.0f}s, every {args.interval:.0f}s, {args.users} users")
+        polling = _count_requests(hub, poll_server_list(args.tabs, args.duration, args.interval))
+        print(f"polling GET /server/   hub requests={polling:6d}")
+        events = _count_requests(hub, watch_server_events(args.tabs, args.duration, args.interval))
+        print(f"/server/events         hub requests={events:6d}")
+
+
+if __name__ == "__main__":
+    main()
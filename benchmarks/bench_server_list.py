@@ -0,0 +1,145 @@
+"""Benchmark concurrent ``GET /server/`` requests against a local stub Hub.
+
+Compares the blocking ``HubClient`` (as the routes used it before) with the
+pooled ``AsyncHubClient`` now used by the routes, unconditional requests with
+revalidations (``If-None-Match``), and the full listing with a page of the
+compact listing (``fields``/``limit``). Run from the repository root:
+
+    python -m benchmarks.bench_server_list --requests 200 --concurrency 50 --latency 0.02 --servers-per-user 200
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+from unittest.mock import Mock
+
+import httpx
+
+from benchmarks.stub_hub import StubHub, make_users
+from jhub_apps.service.logging_utils import setup_logging
+
+USERNAME = "user-0"
+# Fields shown on the cards of the home grid
+CARD_FIELDS = "display_name,description,framework,thumbnail,url,ready,pending,stopped,last_activity,public"
+
+
+def _set_environment(api_url):
+    os.environ["JUPYTERHUB_API_URL"] = api_url
+    os.environ["JUPYTERHUB_API_TOKEN"] = "benchmark-service-token"
+    os.environ.setdefault("PUBLIC_HOST", "/")
+    os.environ.setdefault("JUPYTERHUB_CLIENT_ID", "service-japps")
+    os.environ.setdefault("JUPYTERHUB_OAUTH_CALLBACK_URL", "/")
+    # An empty JupyterHub config, i.e. the JAppsConfig defaults
+    config_file = tempfile.NamedTemporaryFile("w", suffix="_jupyterhub_config.py", delete=False)
+    config_file.close()
+    os.environ.setdefault("JHUB_JUPYTERHUB_CONFIG", config_file.name)
+
+
+async def _run_concurrently(request_fn, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def timed():
+        async with semaphore:
+            start = time.perf_counter()
+            await request_fn()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[timed() for _ in range(total)])
+    return time.perf_counter() - start, latencies
+
+
+def _report(name, elapsed, latencies, response_size=None):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    size = f"  size={response_size / 1024:8.1f}KiB" if response_size is not None else ""
+    print(
+        f"{name:<24} total={elapsed:7.3f}s  req/s={len(latencies) / elapsed:8.1f}  "
+        f"p50={statistics.median(latencies) * 1000:8.1f}ms  p95={p95 * 1000:8.1f}ms{size}"
+    )
+
+
+async def bench_blocking_hub_client(total, concurrency):
+    """Emulates the previous route body, which called the blocking HubClient."""
+    from jhub_apps.hub_client.hub_client import HubClient
+
+    async def server_list():
+        hub_user = HubClient(username=USERNAME).get_user()
+        HubClient().get_users()
+        HubClient(username=USERNAME).get_shared_servers()
+        return hub_user["servers"]
+
+    return await _run_concurrently(server_list, total, concurrency)
+
+
+async def bench_async_route(total, concurrency, params=None, conditional=False):
+    from jhub_apps.service.app import app
+    from jhub_apps.service.security import get_current_user
+
+    user = Mock()
+    user.name = USERNAME
+
+    async def current_user():
+        return user
+
+    app.dependency_overrides[get_current_user] = current_user
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://japps") as client:
+
+        response_sizes = []
+        headers = {}
+        if conditional:
+            # As a polling browser revalidating its cached listing
+            headers["If-None-Match"] = (await client.get("/server/", params=params)).headers["etag"]
+
+        async def server_list():
+            response = await client.get("/server/", params=params, headers=headers)
+            if response.status_code != 304:
+                response.raise_for_status()
+            response_sizes.append(len(response.content))
+
+        return (*await _run_concurrently(server_list, total, concurrency), response_sizes[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.01, help="stub Hub latency in seconds")
+    parser.add_argument("--users", type=int, default=100, help="number of users in the stub Hub")
+    parser.add_argument("--servers-per-user", type=int, default=2)
+    parser.add_argument("--skip-blocking", action="store_true", help="skip the (slow) blocking HubClient run")
+    parser.add_argument("--page-size", type=int, default=50, help="limit of the compact listing")
+    args = parser.parse_args()
+
+    # Keep the benchmark output readable, only warnings from jhub-apps are shown
+    logging.basicConfig(level=logging.WARNING)
+    setup_logging()
+    users = make_users(args.users, servers_per_user=args.servers_per_user)
+    with StubHub(users=users, latency=args.latency) as hub:
+        _set_environment(hub.api_url)
+        print(
+            f"{args.requests} requests, concurrency {args.concurrency}, "
+            f"stub Hub latency {args.latency * 1000:.0f}ms, {args.users} users "
+            f"with {args.servers_per_user} servers each"
+        )
+        if not args.skip_blocking:
+            _report("blocking HubClient", *asyncio.run(bench_blocking_hub_client(args.requests, args.concurrency)))
+        _report("AsyncHubClient /server/", *asyncio.run(bench_async_route(args.requests, args.concurrency)))
+        _report(
+            "conditional /server/",
+            *asyncio.run(bench_async_route(args.requests, args.concurrency, conditional=True)),
+        )
+        compact_params = {"fields": CARD_FIELDS, "limit": args.page_size}
+        _report(
+            f"compact page of {args.page_size}",
+            *asyncio.run(bench_async_route(args.requests, args.concurrency, params=compact_params)),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark thumbnail processing and the size of the app list payload before and after.
+
+Before, each app stored its uploaded thumbnail verbatim as a data URL in its
+user_options, so the /server/ payload grew with every image. Now the image is
+downscaled, re-encoded and stored once, and user_options only keep its URL. Run from
+the repository root:
+
+    python -m benchmarks.bench_thumbnail_payload --apps 200 --width 4000 --height 3000
+"""
+import argparse
+import io
+import json
+import logging
+import tempfile
+import time
+
+from PIL import Image
+
+from benchmarks.stub_hub import make_server
+from jhub_apps.service.logging_utils import setup_logging
+from jhub_apps.service.thumbnail_processing import THUMBNAIL_SIZES, render_thumbnails
+from jhub_apps.service.thumbnails import LocalThumbnailStore, get_thumbnail_url
+from jhub_apps.service.utils import encode_file_to_data_url
+
+
+def make_photo(width, height):
+    """Gradients with a little noise, about as large as a photo once saved as PNG"""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    fractal = Image.effect_mandelbrot((width, height), (-2.0, -1.5, 1.0, 1.5), 64)
+    noise = Image.blend(gradient, Image.effect_noise((width, height), 16), 0.1)
+    image = Image.merge("RGB", (gradient, fractal, noise))
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def _payload_size(thumbnails):
+    servers = [
+        make_server("user-0", f"app-{i}", thumbnail=thumbnail)
+        for i, thumbnail in enumerate(thumbnails)
+    ]
+    return len(json.dumps({"user_apps": servers, "shared_apps": []}).encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", type=int, default=200)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    args = parser.parse_args()
+
+    # Keep the benchmark output readable, only warnings from jhub-apps are shown
+    logging.basicConfig(level=logging.WARNING)
+    setup_logging()
+    upload = make_photo(args.width, args.height)
+    start = time.perf_counter()
+    renditions = render_thumbnails(upload)
+    processing_time = time.perf_counter() - start
+
+    largest_size, *smaller_sizes = renditions
+    with tempfile.TemporaryDirectory() as store_path:
+        key = LocalThumbnailStore(store_path).put(
+            renditions[largest_size].content,
+            renditions[largest_size].mime_type,
+            variants={size: renditions[size].content for size in smaller_sizes},
+        )
+    data_url = encode_file_to_data_url("upload.png", upload)
+
+    print(f"upload {args.width}x{args.height} PNG: {len(upload) / 1024:,.0f} KiB, "
+          f"processed in {processing_time * 1000:.0f}ms")
+    for size in THUMBNAIL_SIZES:
+        if size in renditions:
+            print(f"  rendition {size:>4}px WebP: {len(renditions[size].content) / 1024:8,.1f} KiB")
+    print(f"thumbnail in user_options: {len(data_url) / 1024:,.0f} KiB before, "
+          f"{len(get_thumbnail_url(key))} bytes after")
+    before = _payload_size([data_url] * args.apps)
+    after = _payload_size([get_thumbnail_url(key)] * args.apps)
+    print(f"/server/ payload with {args.apps} apps: "
+          f"{before / 1024 / 1024:,.1f} MiB before, {after / 1024:,.1f} KiB after")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""A minimal in-process stand-in for the JupyterHub REST API used by the benchmarks.
+
+Only the endpoints called by jhub-apps are implemented, each response is delayed
+by a configurable latency to emulate a real Hub under load.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import multiprocessing
+import socket
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request, Response
+
+HUB_API_PREFIX = "/hub/api"
+
+
+def make_server(username, servername, **user_options):
+    return {
+        "name": servername,
+        "ready": False,
+        "stopped": True,
+        "pending": None,
+        "url": f"/user/{username}/{servername}/",
+        "progress_url": f"/hub/api/users/{username}/servers/{servername}/progress",
+        "started": None,
+        "last_activity": "2024-01-01T00:00:00Z",
+        "state": {},
+        "user_options": {
+            "jhub_app": True,
+            "display_name": servername,
+            "description": "Benchmark app",
+            "framework": "panel",
+            "thumbnail": "",
+            **user_options,
+        },
+    }
+
+
+def make_users(count: int, servers_per_user: int = 2):
+    users = {}
+    for i in range(count):
+        name = f"user-{i}"
+        users[name] = {
+            "name": name,
+            "kind": "user",
+            "admin": False,
+            "groups": [],
+            "servers": {
+                f"app-{j}": make_server(name, f"app-{j}") for j in range(servers_per_user)
+            },
+        }
+    return users
+
+
+def create_stub_hub_app(users: dict, latency: float = 0.0, shared_with=None, page_limit: int = 200) -> FastAPI:
+    """Creates the stub Hub API app.
+
+    :param users: mapping of username to Hub user model
+    :param latency: seconds to wait before answering each request
+    :param shared_with: mapping of username to list of (owner, servername) shared with the user
+    :param page_limit: number of users per page of ``GET /users``, as ``api_page_default_limit``
+    """
+    app = FastAPI()
+    token_ids = itertools.count()
+    shared_with = shared_with or {}
+    app.state.request_count = 0
+
+    @app.middleware("http")
+    async def delay(request: Request, call_next):
+        app.state.request_count += 1
+        if latency:
+            await asyncio.sleep(latency)
+        return await call_next(request)
+
+    @app.get("/stats")
+    async def get_stats():
+        # Not part of the Hub API: lets benchmarks count the requests made to the Hub
+        return {"request_count": app.state.request_count}
+
+    @app.post(HUB_API_PREFIX + "/users/{name}/tokens", status_code=201)
+    async def create_token(name: str):
+        token_id = f"a{next(token_ids)}"
+        return {"id": token_id, "token": f"token-{token_id}", "scopes": ["read:users:name"]}
+
+    @app.delete(HUB_API_PREFIX + "/users/{name}/tokens/{token_id}", status_code=204)
+    async def revoke_token(name: str, token_id: str):
+        return None
+
+    @app.get(HUB_API_PREFIX + "/users")
+    async def get_users(request: Request, offset: int = 0, limit: int = page_limit):
+        all_users = list(users.values())
+        if request.headers.get("Accept") != "application/jupyterhub-pagination+json":
+            return all_users
+        next_offset = offset + limit
+        page = {
+            "items": all_users[offset:next_offset],
+            "_pagination": {
+                "offset": offset,
+                "limit": limit,
+                "total": len(all_users),
+                "next": {"offset": next_offset, "limit": limit} if next_offset < len(all_users) else None,
+            },
+        }
+        # Like the Hub (Tornado), answer conditional requests with a hash of the body
+        body = json.dumps(page).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, media_type="application/json", headers={"ETag": etag})
+
+    @app.get(HUB_API_PREFIX + "/users/{name}")
+    async def get_user(name: str):
+        if name not in users:
+            raise HTTPException(status_code=404)
+        return users[name]
+
+    @app.get(HUB_API_PREFIX + "/users/{name}/shared")
+    async def get_shared(name: str):
+        return {
+            "items": [
+                {"server": {"name": servername, "user": {"name": owner}}}
+                for owner, servername in shared_with.get(name, [])
+            ],
+            "_pagination": {"next": None},
+        }
+
+    @app.get(HUB_API_PREFIX + "/groups")
+    async def get_groups():
+        return []
+
+    return app
+
+
+def _serve(port, app_kwargs):
+    app = create_stub_hub_app(**app_kwargs)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+class StubHub:
+    """Runs the stub Hub with uvicorn in a separate process, so that it doesn't
+    compete with the code being benchmarked for the GIL.
+
+    Accepts the same keyword arguments as ``create_stub_hub_app``.
+    """
+
+    def __init__(self, **app_kwargs):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.process = multiprocessing.Process(target=_serve, args=(self.port, app_kwargs), daemon=True)
+
+    @property
+    def api_url(self):
+        return f"http://127.0.0.1:{self.port}{HUB_API_PREFIX}"
+
+    @property
+    def request_count(self) -> int:
+        stats = httpx.get(f"http://127.0.0.1:{self.port}/stats").json()
+        return stats["request_count"]
+
+    def __enter__(self):
+        self.process.start()
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.1):
+                    break
+            except OSError:
+                time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.join()
@@ -1,7 +1,7 @@
 import textwrap
 import typing as t
 from pydantic import BaseModel, ValidationError
-from traitlets import Unicode, Union, List, Callable, Integer, TraitType, TraitError
+from traitlets import Unicode, Union, List, Callable, Integer, Float, Type, TraitType, TraitError
 
 from traitlets.config import SingletonConfigurable, Enum
 
@@ -138,6 +138,154 @@ class JAppsConfig(SingletonConfigurable):
         help="Version of jhub-app-proxy to install. Can be overridden by JHUB_APP_PROXY_VERSION environment variable.",
     ).tag(config=True)
 
+    user_cache_ttl = Integer(
+        30,
+        help="""
+        Number of seconds for which the JHub Apps service caches an authenticated user,
+        before fetching it again from the Hub. Set to 0 to disable the cache.
+        """,
+    ).tag(config=True)
+
+    user_cache_maxsize = Integer(
+        1024,
+        help="Maximum number of authenticated users cached by each JHub Apps service worker.",
+    ).tag(config=True)
+
+    share_permissions_cache_ttl = Integer(
+        60,
+        help="""
+        Number of seconds for which the users and groups a user is allowed to share apps with
+        are cached by the JHub Apps service. Set to 0 to disable the cache.
+        """,
+    ).tag(config=True)
+
+    server_snapshot_ttl = Integer(
+        10,
+        help="""
+        Number of seconds for which the snapshot of all the servers in the Hub, used to list the apps
+        shared with a user, is served before being refreshed in the background. Set to 0 to disable the
+        snapshot and fetch only the owners of the shared apps from the Hub on every request.
+        """,
+    ).tag(config=True)
+
+    server_events_interval = Float(
+        5.0,
+        help="""
+        Number of seconds between two checks for changes to the servers of the Hub, pushed to the
+        clients of /server/events. Each service worker checks once per interval for all its clients,
+        and only while at least one is connected. The apps shared with each connected user are also
+        listed again once per interval, for all the clients of that user.
+        """,
+    ).tag(config=True)
+
+    hub_api_max_connections = Integer(
+        100,
+        help="Maximum number of concurrent connections from each JHub Apps service worker to the Hub API.",
+    ).tag(config=True)
+
+    hub_api_max_keepalive_connections = Integer(
+        20,
+        help="Maximum number of idle connections to the Hub API kept open by each JHub Apps service worker.",
+    ).tag(config=True)
+
+    hub_api_keepalive_expiry = Float(
+        30.0,
+        help="Number of seconds after which an idle connection to the Hub API is closed.",
+    ).tag(config=True)
+
+    hub_api_timeout = Float(
+        30.0,
+        help="Number of seconds to wait for a response (read, write or pool) from the Hub API.",
+    ).tag(config=True)
+
+    hub_api_connect_timeout = Float(
+        30.0,
+        help="""
+        Number of seconds to wait for a connection to the Hub API. The default is generous
+        to handle hairpin NAT delays in local clusters (kind/k3d).
+        """,
+    ).tag(config=True)
+
+    thumbnail_store_class = Type(
+        default_value="jhub_apps.service.thumbnails.LocalThumbnailStore",
+        klass="jhub_apps.service.thumbnails.ThumbnailStore",
+        help="""
+        Class of the store for app thumbnails, a subclass of jhub_apps.service.thumbnails.ThumbnailStore.
+        It is instantiated with thumbnail_store_path.
+        """,
+    ).tag(config=True)
+
+    thumbnail_store_path = Unicode(
+        "jhub_apps_thumbnails",
+        help="""
+        Location of the thumbnail store. For the default store, a directory relative to the working
+        directory of JupyterHub, which must be shared by all the JHub Apps service workers.
+        """,
+    ).tag(config=True)
+
+    git_mirrors_path = Unicode(
+        "jhub_apps_git_mirrors",
+        help="""
+        Directory of the bare mirrors of the git repositories apps are created from, relative to the
+        working directory of JupyterHub. It can be shared by all the JHub Apps service workers.
+        """,
+    ).tag(config=True)
+
+    git_mirrors_max = Integer(
+        32,
+        help="""
+        Maximum number of git repository mirrors kept on disk, the least recently used ones are deleted.
+        Set to 0 to fetch every repository into a temporary directory instead.
+        """,
+    ).tag(config=True)
+
+    repo_inspection_workers = Integer(
+        4,
+        help="""
+        Number of git repositories each JHub Apps service worker inspects concurrently (fetching their
+        conda-project config for /app-config-from-git/), in threads of their own.
+        """,
+    ).tag(config=True)
+
+    repo_inspection_max_queued = Integer(
+        16,
+        help="""
+        Number of git repository inspections queued by each JHub Apps service worker, once all the
+        inspection threads are busy. Further requests are rejected with a 429 response.
+        """,
+    ).tag(config=True)
+
+    repo_inspection_timeout = Float(
+        120.0,
+        help="""
+        Number of seconds after which a request for the config of a git repository fails with a 504
+        response, and after which git commands are killed.
+        """,
+    ).tag(config=True)
+
+    jobs_db_path = Unicode(
+        "jhub_apps_jobs.sqlite",
+        help="""
+        Path of the SQLite database of the jobs run in the background by the JHub Apps service (see the
+        "Prefer: respond-async" header), relative to the working directory of JupyterHub. It must be
+        shared by all the JHub Apps service workers.
+        """,
+    ).tag(config=True)
+
+    jobs_concurrency = Integer(
+        4,
+        help="Maximum number of jobs run concurrently by each JHub Apps service worker.",
+    ).tag(config=True)
+
+    app_metadata_db_path = Unicode(
+        "jhub_apps_app_metadata.sqlite",
+        help="""
+        Path of the SQLite database of the app display names, descriptions, thumbnails and sharing
+        edited without restarting the apps, relative to the working directory of JupyterHub. It must be
+        shared by all the JHub Apps service workers.
+        """,
+    ).tag(config=True)
+
     additional_services = List(
         trait=PydanticModelTrait(AdditionalService),
         description="List of additional external services to display in JupyterHub UI.",
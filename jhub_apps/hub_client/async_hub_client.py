@@ -0,0 +1,666 @@
+import asyncio
+import importlib.util
+import json
+import os
+import time
+import typing
+import uuid
+from functools import wraps
+
+import httpx
+import structlog
+
+from jhub_apps.hub_client.hub_client import HubClient
+from jhub_apps.hub_client.utils import is_jupyterhub_5
+from jhub_apps.service.models import UserOptions, SharePermissions, ShareResult
+from jhub_apps.service.user_cache import evict_user_from_cache
+from jhub_apps.spawner.types import Framework
+
+JUPYTERHUB_API_TOKEN = os.environ.get("JUPYTERHUB_API_TOKEN")
+
+# Maximum number of concurrent share requests sent to the Hub for a single server
+SHARE_CONCURRENCY = 10
+
+# Lifetime of the tokens issued on behalf of users, they are replaced
+# USER_TOKEN_REFRESH_MARGIN seconds before expiring and the replaced
+# tokens are revoked USER_TOKEN_REVOKE_DELAY seconds later.
+USER_TOKEN_LIFETIME = 60 * 5
+USER_TOKEN_REFRESH_MARGIN = 60
+USER_TOKEN_REVOKE_DELAY = 30
+
+HTTP_POOL_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=30,
+)
+# Increase timeout to handle hairpin NAT delays in local clusters (kind/k3d)
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=30.0)
+
+logger = structlog.get_logger(__name__)
+
+_http_client: typing.Optional[httpx.AsyncClient] = None
+_http_client_loop: typing.Optional[asyncio.AbstractEventLoop] = None
+_http_pool_limits = HTTP_POOL_LIMITS
+_http_timeout = HTTP_TIMEOUT
+
+
+def _is_http2_available() -> bool:
+    # HTTP/2 support in httpx requires the optional "h2" package
+    return importlib.util.find_spec("h2") is not None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the pooled httpx client shared by every AsyncHubClient in this process.
+
+    Connections in the pool are bound to the event loop they were opened in, so a new
+    client is created if the running loop changes (e.g. in tests or CLI tasks).
+    """
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        http2 = _is_http2_available()
+        logger.info(
+            "Creating pooled Hub API client",
+            http2=http2, limits=str(_http_pool_limits), timeout=str(_http_timeout),
+        )
+        _http_client = httpx.AsyncClient(
+            base_url=os.environ["JUPYTERHUB_API_URL"],
+            limits=_http_pool_limits,
+            timeout=_http_timeout,
+            http2=http2,
+        )
+        _http_client_loop = loop
+    return _http_client
+
+
+def configure_http_client(
+        limits: typing.Optional[httpx.Limits] = None,
+        timeout: typing.Optional[httpx.Timeout] = None,
+):
+    """Sets the pool limits and timeouts of the pooled client, which apply to the
+    clients created afterwards."""
+    global _http_pool_limits, _http_timeout
+    _http_pool_limits = limits or HTTP_POOL_LIMITS
+    _http_timeout = timeout or HTTP_TIMEOUT
+
+
+async def close_http_client():
+    """Revokes the user tokens issued by this process and closes the pooled
+    Hub API client, to be called on application shutdown."""
+    global _http_client, _http_client_loop
+    if _http_client is not None and not _http_client.is_closed:
+        await token_broker.close(_http_client)
+        logger.info("Closing pooled Hub API client")
+        await _http_client.aclose()
+    _http_client = None
+    _http_client_loop = None
+
+
+class UserToken(typing.NamedTuple):
+    id: str
+    token: str
+    scopes: typing.List[str]
+    # time.monotonic() after which the token must not be handed out anymore
+    refresh_at: float
+
+
+class UserTokenBroker:
+    """Issues short-lived Hub API tokens on behalf of users and reuses them.
+
+    A single token per user is shared by all the requests of this worker until
+    ``USER_TOKEN_REFRESH_MARGIN`` seconds before it expires. Replaced tokens are
+    revoked in the background once in-flight requests had time to finish, the
+    remaining ones are revoked on shutdown (see ``close``).
+    """
+
+    def __init__(
+            self,
+            lifetime: int = USER_TOKEN_LIFETIME,
+            refresh_margin: int = USER_TOKEN_REFRESH_MARGIN,
+            revoke_delay: int = USER_TOKEN_REVOKE_DELAY,
+    ):
+        assert refresh_margin > revoke_delay, "tokens must outlive their revocation delay"
+        self.lifetime = lifetime
+        self.refresh_margin = refresh_margin
+        self.revoke_delay = revoke_delay
+        self._tokens: typing.Dict[str, UserToken] = {}
+        self._locks: typing.Dict[str, asyncio.Lock] = {}
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._revocations: typing.Set[asyncio.Task] = set()
+
+    def _user_lock(self, username: str) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Locks can't be shared between event loops
+            self._locks = {}
+            self._loop = loop
+        return self._locks.setdefault(username, asyncio.Lock())
+
+    def _is_valid(self, user_token: typing.Optional[UserToken]) -> bool:
+        return user_token is not None and time.monotonic() < user_token.refresh_at
+
+    async def get_token(self, username: str, http_client: httpx.AsyncClient) -> UserToken:
+        user_token = self._tokens.get(username)
+        if self._is_valid(user_token):
+            return user_token
+        # Only one request creates the token of a given user, the others wait for it
+        async with self._user_lock(username):
+            user_token = self._tokens.get(username)
+            if self._is_valid(user_token):
+                return user_token
+            new_user_token = await self._create_token(username, http_client)
+            self._tokens[username] = new_user_token
+        if user_token is not None:
+            self._schedule_revoke(username, user_token, http_client, delay=self.revoke_delay)
+        return new_user_token
+
+    def invalidate(self, username: str, token: str, http_client: httpx.AsyncClient):
+        """Stops handing out the given token, e.g. after the Hub rejected it."""
+        user_token = self._tokens.get(username)
+        if user_token is not None and user_token.token == token:
+            del self._tokens[username]
+            self._schedule_revoke(username, user_token, http_client, delay=0)
+
+    async def _create_token(self, username: str, http_client: httpx.AsyncClient) -> UserToken:
+        logger.info("Creating token for user", username=username)
+        r = await http_client.post(
+            f"/users/{username}/tokens",
+            headers={"Authorization": f"token {JUPYTERHUB_API_TOKEN}"},
+            json={"expires_in": self.lifetime, "note": "jhub-apps"},
+        )
+        r.raise_for_status()
+        rjson = r.json()
+        logger.info(f"Created token: {rjson['id']}")
+        return UserToken(
+            id=rjson["id"],
+            token=rjson["token"],
+            scopes=rjson.get("scopes", []),
+            refresh_at=time.monotonic() + self.lifetime - self.refresh_margin,
+        )
+
+    async def _revoke_token(self, username: str, user_token: UserToken, http_client: httpx.AsyncClient):
+        logger.debug(f"Revoking token: {user_token.id}")
+        try:
+            r = await http_client.delete(
+                f"/users/{username}/tokens/{user_token.id}",
+                headers={"Authorization": f"token {JUPYTERHUB_API_TOKEN}"},
+            )
+            logger.debug("Token revoked", status_code=r.status_code, username=username)
+        except httpx.HTTPError as e:
+            # The token expires on its own anyway
+            logger.warning("Failed to revoke token", token_id=user_token.id, error=str(e))
+
+    def _schedule_revoke(self, username: str, user_token: UserToken, http_client: httpx.AsyncClient, delay: float):
+        async def revoke():
+            await asyncio.sleep(delay)
+            await self._revoke_token(username, user_token, http_client)
+
+        task = asyncio.create_task(revoke())
+        self._revocations.add(task)
+        task.add_done_callback(self._revocations.discard)
+
+    async def close(self, http_client: typing.Optional[httpx.AsyncClient] = None):
+        """Revokes all the tokens issued by this broker, to be called on shutdown."""
+        for task in list(self._revocations):
+            task.cancel()
+        tokens, self._tokens = self._tokens, {}
+        if tokens:
+            http_client = http_client or get_http_client()
+            await asyncio.gather(*[
+                self._revoke_token(username, user_token, http_client)
+                for username, user_token in tokens.items()
+            ])
+
+
+token_broker = UserTokenBroker()
+
+
+def requires_user_token(func):
+    """Decorator to apply to methods of AsyncHubClient to make requests with a token
+    of the user, which is issued and reused across calls by the token broker.
+    """
+    @wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        user_token = await self.token_broker.get_token(self.username, self.http_client)
+        self.token_json = user_token._asdict()
+        self.tokens.append(user_token.token)
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            self.tokens.remove(user_token.token)
+    return wrapper
+
+
+class AsyncHubClient:
+    """Non-blocking counterpart of HubClient, to be used from the FastAPI routes.
+
+    All instances share a single pooled ``httpx.AsyncClient`` (see ``get_http_client``),
+    so connections to the Hub are kept alive across requests.
+    """
+
+    normalize_server_name = staticmethod(HubClient.normalize_server_name)
+
+    def __init__(
+            self,
+            username=None,
+            http_client: typing.Optional[httpx.AsyncClient] = None,
+            user_token_broker: typing.Optional[UserTokenBroker] = None,
+    ):
+        self.username = username
+        self.tokens = [JUPYTERHUB_API_TOKEN]
+        self.token_json = None
+        self.jhub_apps_request_id = None
+        self.token_broker = user_token_broker or token_broker
+        self._http_client = http_client
+        self._set_request_id()
+
+    def _set_request_id(self):
+        contextvars = structlog.contextvars.get_contextvars()
+        self.jhub_apps_request_id = contextvars.get("request_id")
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        return self._http_client or get_http_client()
+
+    def _headers(self, token=None):
+        header_token = token
+        if not token and self.tokens:
+            header_token = self.tokens[-1]
+
+        headers = {"Authorization": f"token {token or header_token}"}
+        if self.jhub_apps_request_id:
+            headers["JHUB_APPS_REQUEST_ID"] = self.jhub_apps_request_id
+        return headers
+
+    async def _request(self, method: str, url: str, token=None, **kwargs) -> httpx.Response:
+        headers = self._headers(token=token)
+        response = await self.http_client.request(method, url, headers=headers, **kwargs)
+        if self.username and response.status_code in (401, 403):
+            # The user's permissions might have changed or been revoked on the Hub,
+            # don't keep serving the user from cache
+            evict_user_from_cache(self.username)
+        if self.username and response.status_code == 401:
+            used_token = headers["Authorization"].partition(" ")[2]
+            self.token_broker.invalidate(self.username, used_token, self.http_client)
+        return response
+
+    async def get_users(self) -> typing.List[dict]:
+        r = await self._request(
+            "GET",
+            "/users",
+            params={"include_stopped_servers": True},
+            # We explicitly want to use japps app token for this
+            token=self.tokens[0],
+        )
+        r.raise_for_status()
+        return r.json()
+
+    async def _get_user_model(self, username: str) -> typing.Optional[dict]:
+        """Fetches a single user with its servers, None if the user doesn't exist."""
+        r = await self._request(
+            "GET",
+            f"/users/{username}",
+            params={"include_stopped_servers": True},
+            # We explicitly want to use japps app token for this
+            token=self.tokens[0],
+        )
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return r.json()
+
+    async def _get_all_pages(self, url: str, params: typing.Optional[dict] = None, token=None) -> typing.List[dict]:
+        """Fetches all the items of a paginated Hub API list endpoint (e.g. /users, /groups),
+        as the Hub only returns ``api_page_default_limit`` items per request by default.
+        The service token is used unless another token is given."""
+        items = []
+        params = dict(params or {})
+        while True:
+            r = await self.http_client.get(
+                url,
+                params=params,
+                headers={
+                    **self._headers(token=token or self.tokens[0]),
+                    "Accept": "application/jupyterhub-pagination+json",
+                },
+            )
+            r.raise_for_status()
+            rjson = r.json()
+            items.extend(rjson["items"])
+            next_page = rjson["_pagination"]["next"]
+            if not next_page:
+                return items
+            params["offset"] = next_page["offset"]
+            params["limit"] = next_page["limit"]
+
+    async def get_users_page(self, offset: int = 0, etag: typing.Optional[str] = None) -> typing.Optional[dict]:
+        """Fetches one page of users with all their servers.
+
+        When ``etag`` is given the request is conditional and None is returned if the
+        page didn't change. The returned page has the ETag of the response under "etag".
+        """
+        headers = {
+            **self._headers(token=self.tokens[0]),
+            "Accept": "application/jupyterhub-pagination+json",
+        }
+        if etag:
+            headers["If-None-Match"] = etag
+        r = await self.http_client.get(
+            "/users",
+            params={"include_stopped_servers": True, "offset": offset},
+            headers=headers,
+        )
+        if r.status_code == 304:
+            return None
+        r.raise_for_status()
+        return {**r.json(), "etag": r.headers.get("ETag")}
+
+    async def get_user_names(self) -> typing.List[str]:
+        """Returns the names of all the users in JupyterHub"""
+        users = await self._get_all_pages("/users")
+        return [user["name"] for user in users]
+
+    async def get_group_names(self) -> typing.List[str]:
+        """Returns the names of all the groups in JupyterHub"""
+        groups = await self.get_groups()
+        return [group["name"] for group in groups]
+
+    @requires_user_token
+    async def get_user(self, user=None):
+        r = await self._request(
+            "GET",
+            f"/users/{user or self.username}",
+            params={"include_stopped_servers": True},
+        )
+        r.raise_for_status()
+        return r.json()
+
+    @requires_user_token
+    async def get_server(self, username, servername=None) -> typing.Optional[typing.Union[dict, typing.Iterable[dict]]]:
+        """Returns the given server for the given user or all servers if servername is None"""
+        given_user = await self._get_user_model(username)
+        if given_user is None:
+            logger.info(f"No user with username: {username} found.")
+            return
+
+        if servername:
+            return given_user["servers"].get(servername)
+        else:
+            # return all user servers
+            return given_user["servers"]
+
+    @requires_user_token
+    async def start_server(self, username, servername):
+        server_owner = username
+        if not servername:
+            logger.info("Starting JupyterLab server")
+            # Default server, which is JupyterLab (not named server)
+            servername = ""
+            user_options = {}
+        else:
+            # Get named server
+            server = await self.get_server(username, servername)
+            if not server:
+                return None
+            user_options = server["user_options"]
+        url = f"/users/{server_owner}/servers/{servername}"
+        data = {"name": servername, **user_options}
+        response = await self._request("POST", url, json=data)
+        logger.info("Start server response", status_code=response.status_code, servername=servername)
+        return response
+
+    @requires_user_token
+    async def create_server(self, username: str, servername: str, user_options: UserOptions = None) -> tuple[int, str]:
+        logger.info("Creating new server", user=username)
+        user_servers = await self.get_server(username)
+        normalized_servername = self.normalize_server_name(servername)
+        logger.info("User servers", user_servers=user_servers.keys())
+        # If server with the given name already exists, see HubClient.create_server
+        if normalized_servername in user_servers:
+            unique_servername = f"{normalized_servername}-{uuid.uuid4().hex[:7]}"
+        else:
+            unique_servername = normalized_servername
+        logger.info("Normalized servername", servername=servername)
+        return await self._create_server(username, unique_servername, user_options)
+
+    @requires_user_token
+    async def edit_server(self, username: str, servername: str, user_options: UserOptions = None) -> tuple[int, str]:
+        logger.info("Editing server", server_name=servername)
+        server = await self.get_server(username, servername)
+        if server:
+            # Stop the server first
+            logger.info("Stopping the server first", server_name=servername)
+            await self.delete_server(username, server["name"])
+        else:
+            raise ValueError("Server does not exists")
+        logger.info("Now creating the server with new params", server_name=servername)
+        return await self._create_server(username, servername, user_options)
+
+    async def _create_server(self, username: str, servername: str, user_options: UserOptions = None) -> tuple[int, str]:
+        url = f"/users/{username}/servers/{servername}"
+        params = user_options.model_dump()
+        data = {"name": servername, **params}
+        logger.info("Creating new server", server_name=servername)
+        r = await self._request("POST", url, json=data)
+        r.raise_for_status()
+        if user_options.framework != Framework.jupyterlab.value:
+            if is_jupyterhub_5():
+                logger.info("Sharing", share_with=user_options.share_with)
+                await self._share_server_with_multiple_entities(
+                    username,
+                    servername,
+                    share_with=user_options.share_with
+                )
+            else:
+                logger.info("Not sharing server as JupyterHub < 5.x")
+        else:
+            logger.info(f"Not sharing the server as Framework is {user_options.framework}, "
+                        f"sharing JupyterLab servers is not allowed.")
+        return r.status_code, servername
+
+    async def _share_server(
+            self,
+            username: str,
+            servername: str,
+            share_to_user: typing.Optional[str],
+            share_to_group: typing.Optional[str],
+    ):
+        url = f"/shares/{username}/{servername}"
+        if share_to_user:
+            data = {"user": share_to_user}
+        elif share_to_group:
+            data = {"group": share_to_group}
+        else:
+            raise ValueError("None of share_to_user or share_to_group provided")
+        share_with = share_to_group or share_to_user
+        logger.info(f"Sharing {username}/{servername} with {share_with}")
+        return await self._request("POST", url, json=data)
+
+    async def _revoke_share(
+            self,
+            username: str,
+            servername: str,
+            revoke_from_user: typing.Optional[str],
+            revoke_from_group: typing.Optional[str],
+    ):
+        """Revoke the access of a single user or group to a given server"""
+        url = f"/shares/{username}/{servername}"
+        if revoke_from_user:
+            data = {"user": revoke_from_user}
+        elif revoke_from_group:
+            data = {"group": revoke_from_group}
+        else:
+            raise ValueError("None of revoke_from_user or revoke_from_group provided")
+        logger.info(f"Revoking {username}/{servername} from {revoke_from_group or revoke_from_user}")
+        return await self._request("PATCH", url, json=data)
+
+    async def get_server_shares(self, username: str, servername: str) -> SharePermissions:
+        """Returns the users and groups a given server is currently shared with"""
+        shares = await self._get_all_pages(f"/shares/{username}/{servername}", token=self.tokens[-1])
+        return SharePermissions(
+            users=[share["user"]["name"] for share in shares if share.get("user")],
+            groups=[share["group"]["name"] for share in shares if share.get("group")],
+        )
+
+    async def _share_server_with_multiple_entities(
+            self,
+            username: str,
+            servername: str,
+            share_with: typing.Optional[SharePermissions] = None
+    ) -> typing.Optional[typing.List[ShareResult]]:
+        """Makes the users and groups a server is shared with match ``share_with``.
+
+        Only the difference with the current shares is applied: new users and groups
+        are shared with and the ones not in ``share_with`` anymore are revoked, so
+        the users which keep their access never lose it.
+
+        :param username: owner of the servername
+        :param servername: servername to share
+        :param share_with: users and groups to share the server with
+        :return: result of the change for each user and group
+        """
+        if not share_with:
+            logger.info("Neither of share_to_user or share_to_group provided, NOT sharing")
+            return
+        logger.info(
+            f"Requested to share {username}/{servername}",
+            share_to_users=share_with.users, share_to_groups=share_with.groups
+        )
+        current_shares = await self.get_server_shares(username, servername)
+        changes = []
+        for kind, requested, current in (
+                ("user", share_with.users or [], current_shares.users),
+                ("group", share_with.groups or [], current_shares.groups),
+        ):
+            requested = list(dict.fromkeys(requested))
+            changes.extend(
+                (kind, name, "unchanged" if name in current else "share") for name in requested
+            )
+            changes.extend((kind, name, "revoke") for name in current if name not in requested)
+        # NOTE: JupyterHub 5.x doesn't provide a way for bulk sharing, so the changes
+        # are sent concurrently over the pooled client, bounded by SHARE_CONCURRENCY
+        semaphore = asyncio.Semaphore(SHARE_CONCURRENCY)
+
+        async def apply(kind, name, action) -> ShareResult:
+            if action == "unchanged":
+                return ShareResult(name=name, kind=kind, action=action)
+            user, group = (name, None) if kind == "user" else (None, name)
+            async with semaphore:
+                if action == "share":
+                    response = await self._share_server(username, servername, user, group)
+                else:
+                    response = await self._revoke_share(username, servername, user, group)
+            error = None
+            if response.is_error:
+                try:
+                    error = response.json().get("message")
+                except ValueError:
+                    error = response.text
+            return ShareResult(
+                name=name, kind=kind, action=action, success=response.is_success,
+                status_code=response.status_code, error=error,
+            )
+
+        results = await asyncio.gather(*[apply(*change) for change in changes])
+        logger.info(
+            "Sharing response",
+            shared=sum(result.action == "share" for result in results),
+            revoked=sum(result.action == "revoke" for result in results),
+            failed=[(result.kind, result.name) for result in results if not result.success],
+        )
+        return results
+
+    @requires_user_token
+    async def update_server_sharing(
+            self, username: str, servername: str, share_with: SharePermissions
+    ) -> typing.List[ShareResult]:
+        """Updates the users and groups a running or stopped server is shared with,
+        without restarting it."""
+        return await self._share_server_with_multiple_entities(username, servername, share_with)
+
+    async def _revoke_shared_access(self, username: str, servername: str):
+        """Revoke all shared access to a given server"""
+        logger.info("Revoking shared servers access", user=username, servername=servername)
+        url = f"/shares/{username}/{servername}"
+        return await self._request("DELETE", url)
+
+    @requires_user_token
+    async def get_shared_servers(self, username: str = None):
+        """List servers shared with user"""
+        username = username or self.username
+        if not is_jupyterhub_5():
+            logger.info("Unable to get shared servers as this feature is not available in JupyterHub < 5.x")
+            return []
+        logger.info("Getting shared servers", user=username)
+        return await self._get_all_pages(f"/users/{username}/shared", token=self.tokens[-1])
+
+    async def get_servers(self, server_keys: typing.Iterable[typing.Tuple[str, str]]) -> typing.Dict[typing.Tuple[str, str], dict]:
+        """Returns the servers for the given (owner, servername) pairs, keyed by pair.
+
+        Each owner is fetched once and owners are fetched concurrently, servers
+        which don't exist (anymore) are left out.
+        """
+        servers_by_owner = {}
+        for owner, servername in server_keys:
+            servers_by_owner.setdefault(owner, set()).add(servername)
+        semaphore = asyncio.Semaphore(SHARE_CONCURRENCY)
+
+        async def get_owner(owner):
+            async with semaphore:
+                return await self._get_user_model(owner)
+
+        owners = await asyncio.gather(*[get_owner(owner) for owner in servers_by_owner])
+        servers = {}
+        for owner, owner_model in zip(servers_by_owner, owners):
+            if owner_model is None:
+                continue
+            for servername in servers_by_owner[owner]:
+                server = owner_model["servers"].get(servername)
+                if server is not None:
+                    servers[(owner, servername)] = server
+        return servers
+
+    @requires_user_token
+    async def delete_server(self, username, server_name, remove=False) -> int:
+        if server_name is None:
+            # Default server and not named server
+            server_name = ""
+        url = f"/users/{username}/servers/{server_name}"
+        # This will remove it from the database, otherwise it will just stop the server
+        params = {"remove": remove}
+        r = await self._request("DELETE", url, json=params)
+        r.raise_for_status()
+        return r.status_code
+
+    async def stream_server_progress(self, username: str, servername: str) -> typing.AsyncIterator[dict]:
+        """Yields the events of the Hub's progress stream of a server, which ends once
+        the server is ready or failed to start. Uses the service token, so that one
+        stream can be shared by all the clients watching the server."""
+        if servername:
+            url = f"/users/{username}/servers/{servername}/progress"
+        else:
+            url = f"/users/{username}/server/progress"
+        headers = {**self._headers(token=self.tokens[0]), "Accept": "text/event-stream"}
+        # Spawns can take long, only connecting is timed out
+        timeout = httpx.Timeout(None, connect=self.http_client.timeout.connect)
+        async with self.http_client.stream("GET", url, headers=headers, timeout=timeout) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    yield json.loads(line[len("data:"):])
+
+    @requires_user_token
+    async def get_services(self):
+        r = await self._request("GET", "/services")
+        r.raise_for_status()
+        return r.json()
+
+    async def get_groups(self) -> typing.List[dict]:
+        """Returns all the groups in JupyterHub"""
+        return await self._get_all_pages("/groups")
+
+    @requires_user_token
+    async def get_user_scopes(self):
+        assert self.token_json
+        assert "scopes" in self.token_json
+        return self.token_json["scopes"]
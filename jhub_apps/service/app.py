@@ -1,13 +1,16 @@
 import os
-from pathlib import Path
 
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 
+from jhub_apps.service.client import close_client, init_client
 from jhub_apps.service.japps_routes import router as japps_router
+from jhub_apps.service.jobs import close_job_runner, get_job_runner
 from jhub_apps.service.logging_utils import setup_logging
 from jhub_apps.service.middlewares import create_middlewares
+from jhub_apps.service.repo_inspection import shutdown_repo_inspector
 from jhub_apps.service.routes import router
+from jhub_apps.service.static_files import STATIC_DIR, STATIC_ROUTE, FingerprintedStaticFiles
+from jhub_apps.service.utils import get_jupyterhub_config
 from jhub_apps.version import get_version
 import structlog
 
@@ -19,8 +22,6 @@ setup_logging()
 ### One way to handle this with FastAPI is to use an APIRouter.
 ### All routes are defined in routes.py
 
-STATIC_DIR = Path(__file__).parent.parent / "static"
-
 logger.info("Starting jhub-apps service initialization", version=str(get_version()), static_dir=str(STATIC_DIR))
 
 # Log critical environment variables
@@ -48,9 +49,9 @@ try:
     )
     logger.info("FastAPI application created successfully")
 
-    logger.info("Mounting static files", static_dir=str(STATIC_DIR), prefix=f"{router.prefix}/static")
-    static_files = StaticFiles(directory=STATIC_DIR)
-    app.mount(f"{router.prefix}/static", static_files, name="static")
+    logger.info("Mounting static files", static_dir=str(STATIC_DIR), prefix=f"{router.prefix}{STATIC_ROUTE}")
+    static_files = FingerprintedStaticFiles(directory=STATIC_DIR)
+    app.mount(f"{router.prefix}{STATIC_ROUTE}", static_files, name="static")
     logger.info("Static files mounted successfully")
 
     logger.info("Including main router", prefix=router.prefix)
@@ -70,10 +71,15 @@ try:
     @app.on_event("startup")
     async def startup_event():
         logger.info("FastAPI startup event triggered - application is ready to serve requests")
+        init_client(get_jupyterhub_config())
+        get_job_runner().start()
 
     @app.on_event("shutdown")
     async def shutdown_event():
         logger.info("FastAPI shutdown event triggered - application is stopping")
+        await close_client()
+        shutdown_repo_inspector()
+        await close_job_runner()
 
 except Exception as e:
     logger.error("Failed to start jhub-apps service", error=str(e), error_type=type(e).__name__)
@@ -1,21 +1,48 @@
 import os
 import pathlib
 import tempfile
+import threading
+import typing
 from pathlib import Path
 
-import git
+from cachetools import LRUCache
 from fastapi import HTTPException, status
 from pydantic import ValidationError
 
+from jhub_apps.service.git_mirrors import ResolvedRef, get_git_mirrors, resolve_ref
 from jhub_apps.service.models import Repository, JHubAppConfig
 from jhub_apps.service.utils import logger, encode_file_to_data_url
 
+# App configs by (repository url, commit SHA, config directory): a commit never changes
+GIT_APP_CONFIG_CACHE_SIZE = 256
+_app_config_cache: LRUCache = LRUCache(maxsize=GIT_APP_CONFIG_CACHE_SIZE)
+_app_config_cache_lock = threading.Lock()
 
-def _clone_repo(repository: Repository, temp_dir):
-    """Clone repository to the given tem_dir"""
+
+def _resolve_ref(repository: Repository) -> ResolvedRef:
+    """Resolve the ref of the repository to a commit SHA, without fetching it"""
     try:
-        logger.info("Trying to clone repository", repo_url=repository.url)
-        git.Repo.clone_from(repository.url, temp_dir, depth=1, branch=repository.ref)
+        return resolve_ref(repository.url, repository.ref, timeout=get_git_mirrors().timeout)
+    except Exception as e:
+        message = f"Repository ref '{repository.ref}' not found: {repository.url}"
+        logger.error(message, repo_url=repository.url)
+        logger.error(e)
+        raise HTTPException(
+            detail=message,
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+
+
+def _clone_repo(repository: Repository, ref: ResolvedRef, temp_dir, paths: typing.Iterable[str]):
+    """Fetch the commit of the ref into the repository's mirror and write the
+    given paths of its tree to the given temp_dir (for directories, only the
+    files directly in them)"""
+    try:
+        logger.info("Trying to clone repository", repo_url=repository.url, sha=ref.sha)
+        git_mirrors = get_git_mirrors()
+        with git_mirrors.open(repository.url) as mirror:
+            git_mirrors.fetch(mirror, ref)
+            git_mirrors.extract(mirror, ref.sha, paths, temp_dir)
     except Exception as e:
         message = f"Repository clone failed: {repository.url}"
         logger.error(message, repo_url=repository.url)
@@ -29,20 +56,35 @@ def _clone_repo(repository: Repository, temp_dir):
 def _get_app_configuration_from_git(
         repository: Repository
 ) -> JHubAppConfig:
-    """Clones the git directory into a temporary path and extracts all the metadata
-    about the app from conda-project's config yaml.
+    """Fetches the conda-project config directory of the repository into a temporary
+    path and extracts all the metadata about the app from conda-project's config yaml.
+
+    Only the files of the config directory and the thumbnail are fetched. The configs are cached by the commit the ref of the repository resolves to,
+    so only the ref is resolved when the repository didn't change.
     """
+    ref = _resolve_ref(repository)
+    cache_key = (repository.url, ref.sha, repository.config_directory)
+    with _app_config_cache_lock:
+        app_config: typing.Optional[JHubAppConfig] = _app_config_cache.get(cache_key)
+    if app_config is not None:
+        logger.info("Using cached app configuration", repo_url=repository.url, sha=ref.sha)
+        return app_config.model_copy(update={"repository": repository}, deep=True)
     with tempfile.TemporaryDirectory() as temp_dir:
-        _clone_repo(repository, temp_dir)
+        _clone_repo(repository, ref, temp_dir, [repository.config_directory])
         _check_conda_project_config_directory_exists(repository, temp_dir)
-        conda_project_yaml = _get_conda_project_config_yaml(temp_dir)
+        conda_project_yaml = _get_conda_project_config_yaml(os.path.join(temp_dir, repository.config_directory))
         jhub_apps_config_dict = _extract_jhub_apps_config_from_conda_project_config(conda_project_yaml)
+        thumbnail_path = jhub_apps_config_dict.get("thumbnail_path")
+        if thumbnail_path:
+            _clone_repo(repository, ref, temp_dir, [thumbnail_path])
         app_config = _load_jhub_app_config_to_pydantic_model(
             jhub_apps_config_dict,
             repository,
             temp_dir
         )
-        return app_config
+    with _app_config_cache_lock:
+        _app_config_cache[cache_key] = app_config.model_copy(deep=True)
+    return app_config
 
 
 def _load_jhub_app_config_to_pydantic_model(
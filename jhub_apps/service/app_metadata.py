@@ -0,0 +1,156 @@
+import json
+import sqlite3
+import threading
+import time
+import typing
+
+import structlog
+
+from jhub_apps.service.models import UserOptions
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_APP_METADATA_DB_PATH = "jhub_apps_app_metadata.sqlite"
+# User options which are only shown in the UI: changing them doesn't restart the app
+METADATA_FIELDS = ("display_name", "description", "thumbnail")
+# Applied through the sharing API of the Hub, without restarting the app either
+SHARING_FIELDS = ("share_with",)
+
+ServerKey = typing.Tuple[str, str]
+
+
+class UserOptionsChanges(typing.NamedTuple):
+    # New values of the changed metadata fields
+    metadata: typing.Dict[str, typing.Any]
+    sharing: bool
+    # Changed fields the app must be restarted for, e.g. its command, env or profile
+    restart: typing.Tuple[str, ...]
+
+
+def classify_changes(current: UserOptions, new: UserOptions) -> UserOptionsChanges:
+    """Classifies the changes from the current user options of an app to the new ones
+    into metadata-only, sharing and restart-required changes. Any field which isn't
+    metadata or sharing requires a restart."""
+    current_options = current.model_dump(mode="json")
+    new_options = new.model_dump(mode="json")
+    changed = [field for field in new_options if new_options[field] != current_options.get(field)]
+    return UserOptionsChanges(
+        metadata={field: new_options[field] for field in changed if field in METADATA_FIELDS},
+        sharing=any(field in SHARING_FIELDS for field in changed),
+        restart=tuple(field for field in changed if field not in METADATA_FIELDS + SHARING_FIELDS),
+    )
+
+
+class AppMetadataStore:
+    """User options of apps edited without a restart, persisted in a SQLite database
+    shared by all the service workers.
+
+    The Hub only stores the user options of a server when it's spawned, so the ones
+    changed in place (display name, description, thumbnail and sharing) are kept
+    here, by owner and server name, and laid over the Hub's in the listings (see
+    with_app_metadata). They are deleted when the app is restarted with new user
+    options or removed.
+    """
+
+    def __init__(self, path: str = DEFAULT_APP_METADATA_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS app_metadata (
+                owner TEXT NOT NULL,
+                servername TEXT NOT NULL,
+                user_options TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (owner, servername)
+            )
+            """
+        )
+
+    def get_all(self) -> typing.Dict[ServerKey, dict]:
+        with self._lock:
+            rows = self._connection.execute("SELECT owner, servername, user_options FROM app_metadata").fetchall()
+        return {(owner, servername): json.loads(user_options) for owner, servername, user_options in rows}
+
+    def get(self, owner: str, servername: str) -> dict:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT user_options FROM app_metadata WHERE owner = ? AND servername = ?", (owner, servername)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else {}
+
+    def update(self, owner: str, servername: str, user_options: dict):
+        """Adds the given user options to the ones already stored for the app."""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._connection.execute(
+                    "SELECT user_options FROM app_metadata WHERE owner = ? AND servername = ?", (owner, servername)
+                ).fetchone()
+                stored = json.loads(row[0]) if row is not None else {}
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO app_metadata (owner, servername, user_options, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (owner, servername, json.dumps({**stored, **user_options}), time.time()),
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def delete(self, owner: str, servername: str):
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM app_metadata WHERE owner = ? AND servername = ?", (owner, servername)
+            )
+
+    def close(self):
+        self._connection.close()
+
+
+def with_app_metadata(
+        server: dict, app_metadata: typing.Mapping[ServerKey, dict], owner: typing.Optional[str] = None
+) -> dict:
+    """Returns a copy of a Hub server model with the user options edited in place laid
+    over the Hub's, or the model itself when the app wasn't edited in place."""
+    if owner is None:
+        owner = server.get("full_name", "").split("/")[0]
+    user_options = app_metadata.get((owner, server.get("name")))
+    if not user_options:
+        return server
+    return {**server, "user_options": {**(server.get("user_options") or {}), **user_options}}
+
+
+def with_users_app_metadata(
+        users: typing.Dict[str, dict], app_metadata: typing.Mapping[ServerKey, dict]
+) -> typing.Dict[str, dict]:
+    """Same as with_app_metadata for all the servers of a mapping of user name to user model."""
+    owners = {owner for owner, _ in app_metadata}
+    if not owners & users.keys():
+        return users
+    return {
+        name: {
+            **user,
+            "servers": {
+                servername: with_app_metadata(server, app_metadata, owner=name)
+                for servername, server in (user.get("servers") or {}).items()
+            },
+        } if name in owners else user
+        for name, user in users.items()
+    }
+
+
+_app_metadata_store: typing.Optional[AppMetadataStore] = None
+
+
+def get_app_metadata_store() -> AppMetadataStore:
+    """Returns the app metadata store of this process, configured from JAppsConfig."""
+    global _app_metadata_store
+    if _app_metadata_store is None:
+        # Imported here to avoid circular imports, as utils uses the store
+        from jhub_apps.service.utils import get_jupyterhub_config
+        config = get_jupyterhub_config()
+        _app_metadata_store = AppMetadataStore(config.JAppsConfig.app_metadata_db_path)
+    return _app_metadata_store
@@ -1,18 +1,38 @@
-import os
-
 import httpx
 import structlog
 
+from jhub_apps.hub_client.async_hub_client import close_http_client, configure_http_client, get_http_client
 
 logger = structlog.get_logger(__name__)
 
 
 # a minimal alternative to using HubOAuth class
-def get_client():
-    base_url = os.environ["JUPYTERHUB_API_URL"]
-    token = os.environ["JUPYTERHUB_API_TOKEN"]
-    headers = {"Authorization": "Bearer %s" % token}
-    # Increase timeout to handle hairpin NAT delays in local clusters (kind/k3d)
-    timeout = httpx.Timeout(30.0, connect=30.0)
-    logger.info("Creating httpx client", base_url=base_url, timeout=str(timeout))
-    return httpx.AsyncClient(base_url=base_url, headers=headers, timeout=timeout)
+def get_client() -> httpx.AsyncClient:
+    """Returns the long-lived Hub API client of this worker.
+
+    The client is shared by all the requests (and by AsyncHubClient), it must not be
+    closed by callers and requests must set their own Authorization header.
+    """
+    return get_http_client()
+
+
+def init_client(config) -> httpx.AsyncClient:
+    """Creates the Hub API client of this worker from JAppsConfig, on app startup."""
+    japps_config = config.JAppsConfig
+    configure_http_client(
+        limits=httpx.Limits(
+            max_connections=japps_config.hub_api_max_connections,
+            max_keepalive_connections=japps_config.hub_api_max_keepalive_connections,
+            keepalive_expiry=japps_config.hub_api_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            japps_config.hub_api_timeout,
+            connect=japps_config.hub_api_connect_timeout,
+        ),
+    )
+    return get_http_client()
+
+
+async def close_client():
+    """Closes the Hub API client of this worker, on app shutdown."""
+    await close_http_client()
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import threading
+import time
+import typing
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# Minimum number of seconds between two checks of the config file for changes
+CONFIG_CHECK_INTERVAL = 2
+
+
+class ConfigFileState(typing.NamedTuple):
+    path: str
+    mtime_ns: int
+    size: int
+
+
+class JupyterHubConfigProvider:
+    """Loads the JupyterHub config once per process and reloads it when its file changes.
+
+    The file is checked (``os.stat``) at most once per ``check_interval`` seconds. When
+    its modification time or size changed, its content hash is compared with the one
+    of the loaded config and, if it differs too, the config is reloaded in a background
+    thread while callers keep getting the previous one (stale-while-revalidate). Only
+    the very first load blocks the callers. ``reload`` forces a synchronous reload,
+    e.g. when the config depends on something else than its file. Thread safe.
+    """
+
+    def __init__(
+            self,
+            loader: typing.Callable[[str], typing.Any],
+            path_getter: typing.Callable[[], str] = lambda: os.environ["JHUB_JUPYTERHUB_CONFIG"],
+            check_interval: float = CONFIG_CHECK_INTERVAL,
+    ):
+        self._loader = loader
+        self._path_getter = path_getter
+        self.check_interval = check_interval
+        # Held while loading, checks don't wait for it
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._config = None
+        self._version: typing.Optional[str] = None
+        self._file_state: typing.Optional[ConfigFileState] = None
+        self._checked_at = 0.0
+        self._reload_thread: typing.Optional[threading.Thread] = None
+
+    @property
+    def version(self) -> typing.Optional[str]:
+        """Hash of the content of the config file the current config was loaded from."""
+        return self._version
+
+    def get(self):
+        if self._config is None:
+            with self._lock:
+                if self._config is None:
+                    self._load()
+        elif time.monotonic() - self._checked_at > self.check_interval:
+            self._check()
+        return self._config
+
+    def reload(self):
+        """Reloads the config right away and returns it."""
+        with self._lock:
+            self._load()
+        return self._config
+
+    def _get_file_state(self) -> ConfigFileState:
+        path = self._path_getter()
+        stat = os.stat(path)
+        return ConfigFileState(path=path, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+    def _check(self):
+        if not self._check_lock.acquire(blocking=False):
+            # Being checked by another thread
+            return
+        try:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                return
+            self._checked_at = time.monotonic()
+            try:
+                file_state = self._get_file_state()
+            except OSError as e:
+                logger.warning("Failed to check the JupyterHub config file", error=str(e))
+                return
+            if file_state == self._file_state:
+                return
+            self._reload_thread = threading.Thread(
+                target=self._reload_if_changed, args=(file_state,), name="jupyterhub-config-reload", daemon=True
+            )
+            self._reload_thread.start()
+        finally:
+            self._check_lock.release()
+
+    def _reload_if_changed(self, file_state: ConfigFileState):
+        with self._lock:
+            try:
+                if self._get_version(file_state.path) == self._version:
+                    # Touched but unchanged
+                    self._file_state = file_state
+                    return
+                self._load()
+            except Exception as e:
+                # Keep serving the previous config, e.g. while the file is being edited,
+                # and don't retry until the file changes again
+                self._file_state = file_state
+                logger.exception("Failed to reload the JupyterHub config, keeping the previous one", error=str(e))
+
+    def _get_version(self, path: str) -> str:
+        with open(path, "rb") as config_file:
+            return hashlib.sha256(config_file.read()).hexdigest()
+
+    def _load(self):
+        started_at = time.monotonic()
+        file_state = self._get_file_state()
+        version = self._get_version(file_state.path)
+        config = self._loader(file_state.path)
+        self._config, self._version, self._file_state = config, version, file_state
+        self._checked_at = time.monotonic()
+        logger.info(
+            "Loaded JupyterHub config",
+            path=file_state.path,
+            version=version[:12],
+            duration=round(self._checked_at - started_at, 3),
+        )
@@ -0,0 +1,361 @@
+import asyncio
+import collections
+import contextlib
+import json
+import time
+import typing
+
+import httpx
+import structlog
+from starlette.concurrency import run_in_threadpool
+
+from jhub_apps.hub_client.async_hub_client import AsyncHubClient
+from jhub_apps.service.app_metadata import get_app_metadata_store, with_users_app_metadata
+from jhub_apps.service.server_list import get_server_key, summarize_server
+from jhub_apps.service.server_snapshot import get_server_snapshot
+from jhub_apps.service.thumbnails import with_thumbnail_url
+from jhub_apps.service.utils import get_jupyterhub_config, get_shared_server_keys
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_SERVER_EVENTS_INTERVAL = 5
+# Comment lines sent on idle streams, so that proxies don't close them
+SSE_KEEPALIVE_INTERVAL = 15
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Disable response buffering in nginx
+    "X-Accel-Buffering": "no",
+}
+# Number of spawn progress events replayed to clients joining a progress stream late
+PROGRESS_REPLAY_EVENTS = 50
+# Events queued for a subscriber which doesn't keep up, before its stream is ended
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_END = object()
+
+ServerKey = typing.Tuple[bool, str, str]
+
+
+class Broadcaster:
+    """Fans out the events of a single upstream source to any number of subscribers.
+
+    The source (an async iterator returned by ``source_factory``) is started by the
+    first subscriber and cancelled when the last one leaves. The last ``replay``
+    events of the current run are replayed to subscribers joining late. Subscribers
+    which fall more than SUBSCRIBER_QUEUE_SIZE events behind are dropped, their stream
+    ends and clients are expected to reconnect. ``on_idle`` is called once the last
+    subscriber left.
+    """
+
+    def __init__(
+            self,
+            source_factory: typing.Callable[[], typing.AsyncIterator[typing.Any]],
+            replay: int = 0,
+            on_idle: typing.Optional[typing.Callable[[], None]] = None,
+    ):
+        self._source_factory = source_factory
+        self._history: typing.Deque[typing.Any] = collections.deque(maxlen=replay)
+        self._on_idle = on_idle
+        self._subscribers: typing.Set[asyncio.Queue] = set()
+        self._task: typing.Optional[asyncio.Task] = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    async def subscribe(self) -> typing.AsyncIterator[typing.Any]:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        for event in self._history:
+            queue.put_nowait(event)
+        self._subscribers.add(queue)
+        if self._task is None:
+            self._history.clear()
+            self._task = asyncio.create_task(self._run())
+        try:
+            while True:
+                event = await queue.get()
+                if event is _END:
+                    return
+                yield event
+        finally:
+            self._subscribers.discard(queue)
+            if not self._subscribers:
+                if self._task is not None:
+                    self._task.cancel()
+                    self._task = None
+                if self._on_idle is not None:
+                    self._on_idle()
+
+    def _end(self, queue: asyncio.Queue):
+        # Make room for the end marker, the subscriber is done anyway
+        while queue.full():
+            queue.get_nowait()
+        queue.put_nowait(_END)
+
+    async def _run(self):
+        source = self._source_factory()
+        try:
+            async for event in source:
+                self._history.append(event)
+                for queue in list(self._subscribers):
+                    if queue.full():
+                        logger.warning("Dropping slow event stream subscriber")
+                        self._subscribers.discard(queue)
+                        self._end(queue)
+                    else:
+                        queue.put_nowait(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Event stream source failed", error=str(e))
+        finally:
+            # Closes the upstream connection of the source, if any, right away
+            await source.aclose()
+        # The source is exhausted (or failed): end the streams of the subscribers
+        self._task = None
+        for queue in list(self._subscribers):
+            self._end(queue)
+
+
+def format_sse(event: str, data: typing.Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def sse_stream(
+        events: typing.AsyncIterator[typing.Tuple[str, typing.Any]],
+        keepalive: float = SSE_KEEPALIVE_INTERVAL,
+) -> typing.AsyncIterator[str]:
+    """Formats (event, data) pairs as a server-sent events stream, with a comment
+    line whenever no event was sent for ``keepalive`` seconds."""
+    queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for event in events:
+                await queue.put(event)
+        finally:
+            await queue.put(_END)
+
+    pump_task = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event is _END:
+                break
+            yield format_sse(*event)
+    finally:
+        # Cancelling the pump closes ``events``, which unsubscribes from its broadcaster
+        pump_task.cancel()
+
+
+def _summarize_servers(servers: typing.Dict[tuple, dict], keys: typing.Iterable[tuple]) -> typing.List[dict]:
+    return [summarize_server(with_thumbnail_url(servers[key]), key).model_dump() for key in keys]
+
+
+class ServerEvents:
+    """Pushes the changes to the servers of the Hub to the users watching them.
+
+    A single poller per worker refreshes the server snapshot every ``interval``
+    seconds while at least one user is subscribed, and is stopped when the last one
+    leaves. The snapshot requests unchanged pages of users conditionally, so polling
+    an idle Hub costs a few 304 responses, whatever the number of subscribers.
+    Sharing doesn't change the snapshot, so the servers shared with each subscribed
+    user are also listed once per ``interval``, for all the subscribers of that user.
+    Each subscriber only receives the changes to its own servers and the ones shared
+    with it.
+    """
+
+    def __init__(self, interval: float = DEFAULT_SERVER_EVENTS_INTERVAL):
+        self.interval = interval
+        # The latest users are replayed to new subscribers, as their initial state
+        self._broadcaster = Broadcaster(self._watch_users, replay=1)
+        # Number of subscribers, latest shared keys (with the time they were listed)
+        # and listing in progress of each subscribed user
+        self._user_subscribers: typing.Counter[str] = collections.Counter()
+        self._shared_keys: typing.Dict[str, typing.Tuple[float, typing.List[ServerKey]]] = {}
+        self._shared_keys_tasks: typing.Dict[str, asyncio.Future] = {}
+
+    async def _watch_users(self) -> typing.AsyncIterator[typing.Dict[str, dict]]:
+        server_snapshot = get_server_snapshot()
+        app_metadata_store = get_app_metadata_store()
+        users = app_metadata = None
+        while True:
+            try:
+                await server_snapshot.refresh()
+            except Exception as e:
+                logger.warning("Failed to refresh servers for events", error=str(e))
+            # Apps edited in place change without the Hub knowing
+            latest_app_metadata = await run_in_threadpool(app_metadata_store.get_all)
+            if server_snapshot.users is not None and (
+                    server_snapshot.users is not users or latest_app_metadata != app_metadata
+            ):
+                users = server_snapshot.users
+                app_metadata = latest_app_metadata
+                yield with_users_app_metadata(users, app_metadata)
+            await asyncio.sleep(self.interval)
+
+    async def _list_shared_keys(
+            self, username: str
+    ) -> typing.Tuple[float, typing.Optional[typing.List[ServerKey]]]:
+        try:
+            shared_server_keys = await get_shared_server_keys(username)
+        except Exception as e:
+            logger.warning("Failed to get shared servers for events", user=username, error=str(e))
+            return time.monotonic(), None
+        listed_at = time.monotonic()
+        shared_keys = [(True, owner, servername) for owner, servername in shared_server_keys]
+        if self._user_subscribers[username]:
+            self._shared_keys[username] = (listed_at, shared_keys)
+        return listed_at, shared_keys
+
+    async def _get_shared_keys(
+            self, username: str
+    ) -> typing.Tuple[float, typing.Optional[typing.List[ServerKey]]]:
+        """Returns the keys of the servers shared with the user and the time they were
+        listed (None if that failed). They are listed at most once per ``interval`` and
+        concurrent calls share the same listing."""
+        cached = self._shared_keys.get(username)
+        if cached is not None and time.monotonic() - cached[0] < self.interval:
+            return cached
+        task = self._shared_keys_tasks.get(username)
+        if task is None:
+            task = asyncio.ensure_future(self._list_shared_keys(username))
+            self._shared_keys_tasks[username] = task
+            task.add_done_callback(lambda _: self._shared_keys_tasks.pop(username, None))
+        # Shielded, so that a subscriber leaving doesn't cancel the listing of the others
+        return await asyncio.shield(task)
+
+    async def watch(self, username: str) -> typing.AsyncIterator[typing.Tuple[str, dict]]:
+        """Yields a "servers" event with the ServerSummary of all the servers of the
+        user and the ones shared with it, then "changes" events with the summaries of
+        the servers which changed and the keys of the ones which were removed.
+
+        Sharing a server doesn't change the users of the snapshot, so the servers
+        shared with the user are listed again every ``interval`` seconds: servers
+        shared since are added and unshared ones are removed.
+        """
+        self._user_subscribers[username] += 1
+        users = None
+        sent: typing.Dict[ServerKey, dict] = {}
+        first = True
+        subscription = self._broadcaster.subscribe()
+        next_users = asyncio.ensure_future(subscription.__anext__())
+        try:
+            shared_keys_at, shared_keys = await self._get_shared_keys(username)
+            shared_keys = shared_keys or []
+            while True:
+                timeout = None if users is None else max(0.0, shared_keys_at + self.interval - time.monotonic())
+                await asyncio.wait({next_users}, timeout=timeout)
+                updated = False
+                if next_users.done():
+                    try:
+                        users = next_users.result()
+                    except StopAsyncIteration:
+                        return
+                    updated = True
+                    next_users = asyncio.ensure_future(subscription.__anext__())
+                if time.monotonic() - shared_keys_at >= self.interval:
+                    shared_keys_at, latest_shared_keys = await self._get_shared_keys(username)
+                    if latest_shared_keys is not None and latest_shared_keys != shared_keys:
+                        shared_keys = latest_shared_keys
+                        updated = True
+                if not updated:
+                    continue
+                servers = {
+                    get_server_key(server, owner=username): server
+                    for server in users.get(username, {}).get("servers", {}).values()
+                }
+                for key in shared_keys:
+                    _, owner, servername = key
+                    server = users.get(owner, {}).get("servers", {}).get(servername)
+                    if server is not None:
+                        servers[key] = server
+                summaries = {key: summarize_server(server, key).model_dump() for key, server in servers.items()}
+                changed_keys = [key for key, summary in summaries.items() if sent.get(key) != summary]
+                removed_keys = [key for key in sent if key not in summaries]
+                if not (first or changed_keys or removed_keys):
+                    continue
+                # Thumbnails are only resolved for the servers which are sent
+                changed_summaries = await run_in_threadpool(_summarize_servers, servers, changed_keys)
+                for key in removed_keys:
+                    del sent[key]
+                sent.update((key, summaries[key]) for key in changed_keys)
+                if first:
+                    first = False
+                    yield "servers", {"items": changed_summaries}
+                else:
+                    yield "changes", {
+                        "changed": changed_summaries,
+                        "removed": [{"owner": owner, "name": name} for _, owner, name in removed_keys],
+                    }
+        finally:
+            self._user_subscribers[username] -= 1
+            if not self._user_subscribers[username]:
+                del self._user_subscribers[username]
+                self._shared_keys.pop(username, None)
+            # Unsubscribes right away, rather than when the generator is garbage collected
+            next_users.cancel()
+            with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                await next_users
+            await subscription.aclose()
+
+
+_server_events: typing.Optional[ServerEvents] = None
+
+
+def get_server_events() -> ServerEvents:
+    """Returns the server events of this process, configured from JAppsConfig."""
+    global _server_events
+    if _server_events is None:
+        config = get_jupyterhub_config()
+        _server_events = ServerEvents(interval=config.JAppsConfig.server_events_interval)
+    return _server_events
+
+
+class ProgressStreams:
+    """Multiplexes the Hub's spawn progress streams: all the clients watching the
+    progress of a server share a single upstream stream, opened by the first one and
+    closed when the last one leaves. Clients joining late get the last ``replay``
+    events first."""
+
+    def __init__(self, replay: int = PROGRESS_REPLAY_EVENTS):
+        self.replay = replay
+        self._broadcasters: typing.Dict[typing.Tuple[str, str], Broadcaster] = {}
+
+    async def _stream_progress(self, username: str, servername: str) -> typing.AsyncIterator[dict]:
+        try:
+            async for event in AsyncHubClient().stream_server_progress(username, servername):
+                yield event
+        except httpx.HTTPError as e:
+            logger.warning("Failed to stream server progress", user=username, server=servername, error=str(e))
+            # Same as the Hub's event for a failed spawn, which ends the stream
+            yield {"progress": 100, "failed": True, "message": f"Failed to get the progress of the server: {e}"}
+
+    def subscribe(self, username: str, servername: str) -> typing.AsyncIterator[dict]:
+        key = (username, servername)
+        broadcaster = self._broadcasters.get(key)
+        if broadcaster is None:
+            broadcaster = Broadcaster(
+                lambda: self._stream_progress(username, servername),
+                replay=self.replay,
+                on_idle=lambda: self._broadcasters.pop(key, None),
+            )
+            self._broadcasters[key] = broadcaster
+        return broadcaster.subscribe()
+
+    async def watch(self, username: str, servername: str) -> typing.AsyncIterator[typing.Tuple[str, dict]]:
+        """Yields the "progress" events of a server, until it is ready or failed."""
+        subscription = self.subscribe(username, servername)
+        try:
+            async for event in subscription:
+                yield "progress", event
+        finally:
+            await subscription.aclose()
+
+
+# Process wide, so that the clients of all the requests share the upstream streams
+progress_streams = ProgressStreams()
@@ -0,0 +1,235 @@
+import contextlib
+import fcntl
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import typing
+from pathlib import Path
+
+import git
+import structlog
+
+from jhub_apps.service.utils import get_jupyterhub_config
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_GIT_MIRRORS_PATH = "jhub_apps_git_mirrors"
+DEFAULT_GIT_MIRRORS_MAX = 32
+GIT_SHA_PATTERN = re.compile(r"[0-9a-f]{40}")
+# Fail instead of waiting for credentials on a terminal, e.g. for private repositories
+GIT_ENV = {"GIT_TERMINAL_PROMPT": "0"}
+SYMLINK_MODE = "120000"
+
+
+class RefNotFound(Exception):
+    pass
+
+
+class ResolvedRef(typing.NamedTuple):
+    sha: str
+    # Full name of the ref to fetch, None when the ref is a commit SHA
+    name: typing.Optional[str]
+
+
+def resolve_ref(url: str, ref: str, timeout: typing.Optional[float] = None) -> ResolvedRef:
+    """Resolves a branch, tag or commit SHA of a remote repository to a commit SHA,
+    with ``git ls-remote``, which doesn't fetch any object. ``git`` is killed
+    after ``timeout`` seconds."""
+    if GIT_SHA_PATTERN.fullmatch(ref):
+        return ResolvedRef(sha=ref, name=None)
+    # The second pattern lists the commits of annotated tags
+    output = git.cmd.Git().ls_remote(url, ref, f"{ref}^{{}}", env=GIT_ENV, kill_after_timeout=timeout)
+    refs = {}
+    for line in output.splitlines():
+        sha, _, name = line.partition("\t")
+        refs[name] = sha
+    for name in (ref, f"refs/heads/{ref}", f"refs/tags/{ref}"):
+        if name in refs:
+            # Annotated tags are peeled to their commit
+            return ResolvedRef(sha=refs.get(f"{name}^{{}}", refs[name]), name=name)
+    raise RefNotFound(f"Ref '{ref}' not found in {url}")
+
+
+def _parse_ls_tree(output: str) -> typing.List[typing.Tuple[str, str, str, str]]:
+    """Parses the output of ``git ls-tree -z`` into (mode, type, object id, path) tuples."""
+    entries = []
+    for line in output.split("\0"):
+        if not line:
+            continue
+        info, _, path = line.partition("\t")
+        mode, object_type, oid = info.split()
+        entries.append((mode, object_type, oid, path))
+    return entries
+
+
+class GitMirrors:
+    """Bare mirrors of the git repositories apps are created from, kept on disk so
+    that fetching a new commit of a repository is incremental.
+
+    At most ``max_mirrors`` mirrors are kept, the least recently used ones are
+    deleted. The mirrors can be shared by several service workers: each one is
+    locked (``flock``) while in use. With ``max_mirrors`` set to 0, a temporary
+    mirror is used for every fetch. Fetches are killed after ``timeout`` seconds.
+    """
+
+    def __init__(
+            self,
+            path: str = DEFAULT_GIT_MIRRORS_PATH,
+            max_mirrors: int = DEFAULT_GIT_MIRRORS_MAX,
+            timeout: typing.Optional[float] = None,
+    ):
+        self.path = Path(path)
+        self.max_mirrors = max_mirrors
+        self.timeout = timeout
+
+    def _get_mirror_path(self, url: str) -> Path:
+        return self.path / f"{hashlib.sha256(url.encode()).hexdigest()[:32]}.git"
+
+    @contextlib.contextmanager
+    def _temporary_mirror(self, url: str) -> typing.Iterator[git.Repo]:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo = git.Repo.init(temp_dir, bare=True)
+            repo.create_remote("origin", url)
+            yield repo
+
+    @contextlib.contextmanager
+    def open(self, url: str) -> typing.Iterator[git.Repo]:
+        """Yields the mirror of the given repository, locked, created if needed."""
+        if not self.max_mirrors:
+            with self._temporary_mirror(url) as repo:
+                yield repo
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        mirror_path = self._get_mirror_path(url)
+        with open(f"{mirror_path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if mirror_path.exists():
+                    repo = git.Repo(mirror_path)
+                    # Last use, for the eviction of the least recently used mirrors
+                    os.utime(mirror_path)
+                else:
+                    repo = git.Repo.init(mirror_path, bare=True)
+                    repo.create_remote("origin", url)
+                    logger.info("Created git mirror", repo_url=url, path=str(mirror_path))
+                yield repo
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._evict(keep=mirror_path)
+
+    def _evict(self, keep: Path):
+        mirrors = sorted(self.path.glob("*.git"), key=lambda path: path.stat().st_mtime, reverse=True)
+        for mirror_path in mirrors[self.max_mirrors:]:
+            if mirror_path == keep:
+                continue
+            with open(f"{mirror_path}.lock", "w") as lock_file:
+                try:
+                    # Skip the mirrors in use
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                shutil.rmtree(mirror_path, ignore_errors=True)
+                logger.info("Evicted git mirror", path=str(mirror_path))
+
+    def has_commit(self, repo: git.Repo, sha: str) -> bool:
+        # Looks the ref up rather than the commit, which would be fetched lazily
+        # from the remote of a partial clone when missing
+        try:
+            repo.git.show_ref("--verify", "--quiet", f"refs/commits/{sha}")
+        except git.GitCommandError:
+            return False
+        return True
+
+    def fetch(self, repo: git.Repo, ref: ResolvedRef):
+        """Fetches the commit of the given ref into the mirror, unless it has it already.
+
+        Only the commit and its trees are fetched (partial clone, ``--filter=blob:none``),
+        the files are fetched by ``extract``. Servers which don't support partial
+        clones send the blobs too, and the fetch is retried without the filter if
+        it's rejected.
+        """
+        if self.has_commit(repo, ref.sha):
+            logger.info("Commit already in git mirror", sha=ref.sha)
+            return
+        # Kept under a ref of its own, so that it isn't garbage collected
+        refspec = f"+{ref.name or ref.sha}:refs/commits/{ref.sha}"
+        try:
+            repo.git.fetch(
+                "--depth=1", "--filter=blob:none", "origin", refspec, env=GIT_ENV, kill_after_timeout=self.timeout
+            )
+        except git.GitCommandError as e:
+            logger.warning(
+                "Partial fetch failed, fetching the whole commit", repo_url=repo.remotes.origin.url, error=str(e)
+            )
+            repo.git.fetch("--depth=1", "origin", refspec, env=GIT_ENV, kill_after_timeout=self.timeout)
+        fetched_sha = repo.git.rev_parse(f"refs/commits/{ref.sha}^{{commit}}")
+        if fetched_sha != ref.sha:
+            # The ref was updated since it was resolved
+            repo.git.update_ref("-d", f"refs/commits/{ref.sha}")
+            raise RefNotFound(f"Ref '{ref.name}' changed while being fetched")
+
+    def _list_files(self, repo: git.Repo, sha: str, path: str) -> typing.Dict[str, str]:
+        """Returns the blob ids of the files at the given path of the commit, by path:
+        the file itself or the files directly in the directory."""
+        path = posixpath.normpath(path.strip("/"))
+        if path.startswith(".."):
+            return {}
+        if path == ".":
+            tree_args = [sha]
+        else:
+            entries = _parse_ls_tree(repo.git.ls_tree("-z", sha, "--", path))
+            if not entries:
+                return {}
+            mode, object_type, oid, _ = entries[0]
+            if object_type == "blob":
+                return {path: oid} if mode != SYMLINK_MODE else {}
+            tree_args = [sha, "--", f"{path}/"]
+        return {
+            entry_path: oid
+            for mode, object_type, oid, entry_path in _parse_ls_tree(repo.git.ls_tree("-z", *tree_args))
+            if object_type == "blob" and mode != SYMLINK_MODE
+        }
+
+    def _get_missing_objects(self, repo: git.Repo, sha: str) -> typing.Set[str]:
+        # Lists the objects of the commit missing from a partial clone, without fetching them
+        output = repo.git.rev_list("--objects", "--missing=print", sha)
+        return {line[1:] for line in output.splitlines() if line.startswith("?")}
+
+    def extract(self, repo: git.Repo, sha: str, paths: typing.Iterable[str], directory: str):
+        """Writes the given files of the commit to ``directory``. For directories, only
+        the files directly in them are written, not their subdirectories. Missing paths
+        are ignored. The blobs which weren't fetched yet are fetched in one go."""
+        files = {}
+        for path in paths:
+            files.update(self._list_files(repo, sha, path))
+        missing = set(files.values()) & self._get_missing_objects(repo, sha)
+        if missing:
+            # Same as the lazy fetches of git: the wanted blobs are sent without negotiation
+            repo.git(c="fetch.negotiationAlgorithm=noop").fetch(
+                "--no-tags", "--filter=blob:none", "origin", *sorted(missing),
+                env=GIT_ENV, kill_after_timeout=self.timeout,
+            )
+        for path, oid in files.items():
+            file_path = Path(directory, path)
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            file_path.write_bytes(repo.git.cat_file("blob", oid, stdout_as_string=False))
+        logger.info("Extracted files from git mirror", sha=sha, files=len(files), fetched=len(missing))
+
+
+_git_mirrors: typing.Optional[GitMirrors] = None
+
+
+def get_git_mirrors() -> GitMirrors:
+    """Returns the git mirrors of this process, configured from JAppsConfig."""
+    global _git_mirrors
+    if _git_mirrors is None:
+        config = get_jupyterhub_config()
+        _git_mirrors = GitMirrors(
+            path=config.JAppsConfig.git_mirrors_path,
+            max_mirrors=config.JAppsConfig.git_mirrors_max,
+            timeout=config.JAppsConfig.repo_inspection_timeout,
+        )
+    return _git_mirrors
@@ -1,35 +1,74 @@
-from datetime import datetime, timezone
+import threading
+import typing
 
 from fastapi import APIRouter, FastAPI, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from starlette.responses import Response
 
 from jhub_apps import TEMPLATE_PATH, themes
-from jhub_apps.service.utils import get_jupyterhub_config, get_theme
+from jhub_apps.service.static_files import get_asset_url
+from jhub_apps.service.utils import etag_matches, get_etag, get_jupyterhub_config, get_theme
+from jhub_apps.version import get_version
 
 app = FastAPI()
 
 templates = Jinja2Templates(directory=TEMPLATE_PATH)
 router = APIRouter(prefix="/services/japps")
 
+# The shell references fingerprinted assets, it only has to be revalidated
+SPA_SHELL_CACHE_CONTROL = "no-cache"
+# Installed once per process, an upgrade restarts the service
+PACKAGE_VERSION = str(get_version())
 
-@router.get("/create-app", response_class=HTMLResponse)
-@router.get("/edit-app", response_class=HTMLResponse)
-@router.get("/server-types", response_class=HTMLResponse)
-@router.get("/success", response_class=HTMLResponse)
-async def handle_apps(request: Request):
-    now = datetime.now(timezone.utc)
-    config = get_jupyterhub_config()
+
+class SpaShell(typing.NamedTuple):
+    content: str
+    etag: str
+
+
+_lock = threading.Lock()
+_rendered: typing.Optional[typing.Tuple[typing.Any, SpaShell]] = None
+
+
+def render_spa_shell(config) -> SpaShell:
     theme = get_theme(config)
     if not theme:
         theme = themes.DEFAULT_THEME
-    return templates.TemplateResponse(
-        request,
-        "japps_custom.html",
+    content = templates.get_template("japps_custom.html").render(
         {
-            "version_hash": now.strftime("%Y%m%d%H%M%S"),
+            "index_css_url": get_asset_url("css/index.css"),
+            "index_js_url": get_asset_url("js/index.js"),
             "hub_title": config.get("hub_title", "JupyterHub"),
             "favicon": theme.get("favicon", "/service/japps/static/favicon.ico"),
             **theme,
-        },
+        }
     )
+    return SpaShell(content=content, etag=get_etag(PACKAGE_VERSION, content))
+
+
+def get_spa_shell(config) -> SpaShell:
+    """Returns the SPA shell, rendered once per config. The config provider returns
+    the same object until the config is reloaded and the package version can only
+    change with a restart."""
+    global _rendered
+    rendered = _rendered
+    if rendered is None or rendered[0] is not config:
+        with _lock:
+            rendered = _rendered
+            if rendered is None or rendered[0] is not config:
+                rendered = (config, render_spa_shell(config))
+                _rendered = rendered
+    return rendered[1]
+
+
+@router.get("/create-app", response_class=HTMLResponse)
+@router.get("/edit-app", response_class=HTMLResponse)
+@router.get("/server-types", response_class=HTMLResponse)
+@router.get("/success", response_class=HTMLResponse)
+async def handle_apps(request: Request):
+    shell = get_spa_shell(get_jupyterhub_config())
+    headers = {"ETag": shell.etag, "Cache-Control": SPA_SHELL_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), shell.etag):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content=shell.content, headers=headers)
@@ -0,0 +1,345 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import typing
+import uuid
+from datetime import datetime, timezone
+
+import structlog
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+
+from jhub_apps.service.models import Job
+from jhub_apps.service.utils import get_jupyterhub_config
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_JOBS_DB_PATH = "jhub_apps_jobs.sqlite"
+DEFAULT_JOBS_CONCURRENCY = 4
+# Each worker marks its jobs as alive every interval. The jobs of a worker which
+# missed a few intervals (e.g. it was restarted) are recovered by the others.
+JOB_HEARTBEAT_INTERVAL = 10
+JOB_HEARTBEAT_TIMEOUT = 3 * JOB_HEARTBEAT_INTERVAL
+# Finished jobs are deleted after a week
+JOB_RETENTION = 7 * 24 * 3600
+# Seconds between two checks for updates of a watched job
+JOB_EVENTS_INTERVAL = 0.5
+
+ACTIVE_STATUSES = ("queued", "running")
+
+JobHandler = typing.Callable[[str, dict], typing.Awaitable[typing.Any]]
+# Handlers of each kind of job, registered with job_handler
+JOB_HANDLERS: typing.Dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str):
+    """Registers the coroutine running the jobs of the given kind. It's called with
+    the owner of the job and its parameters, and returns its result. Both must be
+    JSON serializable, so that jobs can be run again after a restart."""
+    def register(handler: JobHandler) -> JobHandler:
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+def _to_datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+class JobStore:
+    """Jobs persisted in a SQLite database, which can be shared by all the service
+    workers (each worker runs its own jobs, any of them can report on all jobs)."""
+
+    def __init__(self, path: str = DEFAULT_JOBS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                status TEXT NOT NULL,
+                params TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                worker TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                heartbeat_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner, created_at)")
+
+    def _execute(self, query: str, parameters: typing.Sequence = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._connection.execute(query, parameters)
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Job:
+        return Job(
+            id=row["id"],
+            kind=row["kind"],
+            owner=row["owner"],
+            status=row["status"],
+            created_at=_to_datetime(row["created_at"]),
+            updated_at=_to_datetime(row["updated_at"]),
+            result=json.loads(row["result"]) if row["result"] is not None else None,
+            error=row["error"],
+        )
+
+    def create(self, kind: str, owner: str, params: dict, worker: str) -> Job:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, kind, owner, status, params, worker, created_at, updated_at, heartbeat_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?)",
+            (job_id, kind, owner, json.dumps(params), worker, now, now, now),
+        )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> typing.Optional[Job]:
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def get_with_params(self, job_id: str) -> typing.Optional[typing.Tuple[Job, dict]]:
+        """Returns a job with its parameters, in a single query."""
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return (self._to_job(row), json.loads(row["params"])) if row is not None else None
+
+    def list(self, owner: str, limit: int = 50) -> typing.List[Job]:
+        rows = self._execute(
+            "SELECT * FROM jobs WHERE owner = ? ORDER BY created_at DESC LIMIT ?", (owner, limit)
+        ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def update(
+            self,
+            job_id: str,
+            status: str,
+            result: typing.Any = None,
+            error: typing.Optional[str] = None,
+            from_statuses: typing.Sequence[str] = (),
+            worker: typing.Optional[str] = None,
+    ) -> bool:
+        """Updates the status of a job, only if its current status is in
+        ``from_statuses`` (when given). Returns whether it was updated."""
+        now = time.time()
+        query = "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, heartbeat_at = ?"
+        parameters: typing.List[typing.Any] = [
+            status, json.dumps(result) if result is not None else None, error, now, now
+        ]
+        if worker is not None:
+            query += ", worker = ?"
+            parameters.append(worker)
+        query += " WHERE id = ?"
+        parameters.append(job_id)
+        if from_statuses:
+            query += f" AND status IN ({', '.join('?' * len(from_statuses))})"
+            parameters.extend(from_statuses)
+        return self._execute(query, parameters).rowcount == 1
+
+    def heartbeat(self, worker: str):
+        self._execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE worker = ? AND status IN ('queued', 'running')",
+            (time.time(), worker),
+        )
+
+    def get_stale(self, heartbeat_before: float) -> typing.List[typing.Tuple[str, str, str]]:
+        """Returns the (id, status, worker) of the active jobs of workers which are gone."""
+        rows = self._execute(
+            "SELECT id, status, worker FROM jobs WHERE status IN ('queued', 'running') AND heartbeat_at < ?",
+            (heartbeat_before,),
+        ).fetchall()
+        return [(row["id"], row["status"], row["worker"]) for row in rows]
+
+    def claim(self, job_id: str, status: str, previous_worker: str, worker: str) -> bool:
+        """Takes over a job from a worker which is gone, if no other worker did."""
+        return self._execute(
+            "UPDATE jobs SET worker = ?, heartbeat_at = ? WHERE id = ? AND status = ? AND worker = ?",
+            (worker, time.time(), job_id, status, previous_worker),
+        ).rowcount == 1
+
+    def delete_finished(self, updated_before: float) -> int:
+        return self._execute(
+            "DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND updated_at < ?", (updated_before,)
+        ).rowcount
+
+    def close(self):
+        self._connection.close()
+
+
+class JobRunner:
+    """Runs jobs on an asyncio queue, at most ``concurrency`` at a time per worker,
+    with their state persisted in a JobStore.
+
+    Jobs survive a restart of their worker: once its heartbeat is stale, another
+    worker (or the same one, restarted) runs its queued jobs again and marks its
+    running ones as interrupted, as they may have been partially applied. Those can
+    be retried by their owner.
+    """
+
+    def __init__(
+            self,
+            store: JobStore,
+            concurrency: int = DEFAULT_JOBS_CONCURRENCY,
+            heartbeat_interval: float = JOB_HEARTBEAT_INTERVAL,
+    ):
+        self.store = store
+        self.concurrency = concurrency
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_id = uuid.uuid4().hex
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._queue: typing.Optional[asyncio.Queue] = None
+        self._tasks: typing.List[asyncio.Task] = []
+
+    def start(self):
+        """Starts the consumers of the queue and the heartbeat, in the running loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+        logger.info("Started job runner", worker=self.worker_id, concurrency=self.concurrency)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+    def _enqueue(self, job_id: str):
+        self.start()
+        self._queue.put_nowait(job_id)
+
+    async def submit(self, kind: str, owner: str, params: dict) -> Job:
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = await run_in_threadpool(self.store.create, kind, owner, jsonable_encoder(params), worker=self.worker_id)
+        self._enqueue(job.id)
+        logger.info("Submitted job", job_id=job.id, kind=kind, owner=owner)
+        return job
+
+    async def retry(self, job_id: str) -> bool:
+        """Queues an interrupted or failed job again."""
+        if not await run_in_threadpool(
+                self.store.update, job_id, "queued", from_statuses=("interrupted", "failed"), worker=self.worker_id
+        ):
+            return False
+        self._enqueue(job_id)
+        return True
+
+    async def _consume(self):
+        while True:
+            job_id = await self._queue.get()
+            await self._run(job_id)
+
+    async def _run(self, job_id: str):
+        if not await run_in_threadpool(self.store.update, job_id, "running", from_statuses=("queued",)):
+            return
+        job_with_params = await run_in_threadpool(self.store.get_with_params, job_id)
+        if job_with_params is None:
+            logger.warning("Job deleted before it ran", job_id=job_id)
+            return
+        job, params = job_with_params
+        handler = JOB_HANDLERS.get(job.kind)
+        log = logger.bind(job_id=job_id, kind=job.kind, owner=job.owner)
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {job.kind}")
+            result = await handler(job.owner, params)
+        except asyncio.CancelledError:
+            # Shutting down: the job may have been partially applied. Recorded right
+            # away, as the task can't wait for the threadpool anymore
+            self.store.update(job_id, "interrupted", error="Interrupted by a restart of the service")
+            raise
+        except HTTPException as e:
+            log.warning("Job failed", error=e.detail)
+            await run_in_threadpool(self.store.update, job_id, "failed", error=str(e.detail))
+        except Exception as e:
+            log.exception("Job failed", error=str(e))
+            await run_in_threadpool(self.store.update, job_id, "failed", error=str(e))
+        else:
+            log.info("Job succeeded")
+            await run_in_threadpool(self.store.update, job_id, "succeeded", result=jsonable_encoder(result))
+
+    def _claim_stale_jobs(self) -> typing.List[str]:
+        """Claims the jobs of the workers which are gone, marks the running ones as
+        interrupted and returns the queued ones, to run."""
+        queued = []
+        for job_id, status, worker in self.store.get_stale(time.time() - JOB_HEARTBEAT_TIMEOUT):
+            if not self.store.claim(job_id, status, worker, self.worker_id):
+                continue
+            if status == "queued":
+                logger.info("Recovered queued job", job_id=job_id, previous_worker=worker)
+                queued.append(job_id)
+            else:
+                logger.warning("Job interrupted", job_id=job_id, previous_worker=worker)
+                self.store.update(
+                    job_id, "interrupted", error="Interrupted by a restart of the service", from_statuses=("running",)
+                )
+        return queued
+
+    async def recover(self):
+        """Takes over the jobs of the workers which are gone."""
+        for job_id in await run_in_threadpool(self._claim_stale_jobs):
+            self._enqueue(job_id)
+
+    async def _maintain(self):
+        while True:
+            try:
+                await run_in_threadpool(self.store.heartbeat, self.worker_id)
+                await self.recover()
+                await run_in_threadpool(self.store.delete_finished, time.time() - JOB_RETENTION)
+            except Exception as e:
+                logger.exception("Failed to maintain jobs", error=str(e))
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def watch(self, job_id: str, interval: float = JOB_EVENTS_INTERVAL) -> typing.AsyncIterator[typing.Tuple[str, dict]]:
+        """Yields a "job" event with the job whenever it changes, until it's finished
+        or interrupted. Reads the store, so jobs of any worker can be watched."""
+        sent = None
+        while True:
+            job = await run_in_threadpool(self.store.get, job_id)
+            if job is None:
+                return
+            if job != sent:
+                sent = job
+                yield "job", jsonable_encoder(job)
+            if job.status not in ACTIVE_STATUSES:
+                return
+            await asyncio.sleep(interval)
+
+
+_job_runner: typing.Optional[JobRunner] = None
+
+
+def get_job_runner() -> JobRunner:
+    """Returns the job runner of this process, configured from JAppsConfig."""
+    global _job_runner
+    if _job_runner is None:
+        config = get_jupyterhub_config()
+        _job_runner = JobRunner(
+            store=JobStore(config.JAppsConfig.jobs_db_path),
+            concurrency=config.JAppsConfig.jobs_concurrency,
+        )
+    return _job_runner
+
+
+async def close_job_runner():
+    """Stops the job runner, if it has been created. Its running jobs are interrupted."""
+    global _job_runner
+    if _job_runner is not None:
+        await _job_runner.close()
+        _job_runner.store.close()
+        _job_runner = None
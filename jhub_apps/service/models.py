@@ -23,6 +23,63 @@ class SharePermissions(BaseModel):
     groups: List[str]
 
 
+class ShareResult(BaseModel):
+    """Outcome of sharing a server with, or revoking it from, a user or a group"""
+    name: str
+    kind: typing.Literal["user", "group"]
+    action: typing.Literal["share", "revoke", "unchanged"]
+    success: bool = True
+    status_code: typing.Optional[int] = None
+    error: typing.Optional[str] = None
+
+
+class ShareUpdate(BaseModel):
+    servername: str
+    results: List[ShareResult]
+
+
+class ServerSummary(BaseModel):
+    """Data of a server shown on its card in the home grid, a subset of the Hub's
+    server model and of the app's user options. Every field but ``name`` and
+    ``owner`` can be left out with a ``fields`` projection."""
+    name: str
+    owner: str
+    shared: Optional[bool] = None
+    url: Optional[str] = None
+    ready: Optional[bool] = None
+    pending: Optional[str] = None
+    stopped: Optional[bool] = None
+    started: Optional[str] = None
+    last_activity: Optional[str] = None
+    jhub_app: Optional[bool] = None
+    display_name: Optional[str] = None
+    description: Optional[str] = None
+    framework: Optional[str] = None
+    thumbnail: Optional[str] = None
+    public: Optional[bool] = None
+    profile: Optional[str] = None
+
+
+class ServerList(BaseModel):
+    items: List[ServerSummary]
+    # Pass as ``cursor`` to get the next page, None on the last page
+    next_cursor: Optional[str] = None
+
+
+class Job(BaseModel):
+    """A long-running operation run in the background, see jhub_apps.service.jobs.
+    ``status`` is one of queued, running, succeeded, failed or interrupted (by a
+    restart of the service, it can then be retried)."""
+    id: str
+    kind: str
+    owner: str
+    status: typing.Literal["queued", "running", "succeeded", "failed", "interrupted"]
+    created_at: datetime
+    updated_at: datetime
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+
 class User(BaseModel):
     name: str
     admin: bool
@@ -0,0 +1,127 @@
+import asyncio
+import concurrent.futures
+import typing
+
+import structlog
+
+from jhub_apps.service.app_from_git import _get_app_configuration_from_git
+from jhub_apps.service.models import JHubAppConfig, Repository
+from jhub_apps.service.utils import get_jupyterhub_config
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_REPO_INSPECTION_WORKERS = 4
+DEFAULT_REPO_INSPECTION_MAX_QUEUED = 16
+DEFAULT_REPO_INSPECTION_TIMEOUT = 120
+
+
+class RepoInspectionQueueFull(Exception):
+    pass
+
+
+class RepoInspectionTimeout(Exception):
+    pass
+
+
+class _Job(typing.NamedTuple):
+    future: concurrent.futures.Future
+    # Mutable, to count the requests waiting for the job
+    waiters: typing.List[int]
+
+
+class RepoInspector:
+    """Runs the inspections of git repositories (fetch, conda-project parsing and
+    thumbnail encoding) in a pool of ``workers`` threads, off the event loop.
+
+    Concurrent requests for the same repository, ref and config directory share a
+    single job. When ``workers + max_queued`` jobs are already running or queued,
+    new ones are rejected right away. Requests stop waiting after ``timeout``
+    seconds, and a queued job is cancelled once no request waits for it anymore.
+    Running jobs can't be interrupted: their git commands are killed after
+    ``timeout`` seconds instead (see GitMirrors).
+    """
+
+    def __init__(
+            self,
+            inspect: typing.Callable[[Repository], JHubAppConfig] = _get_app_configuration_from_git,
+            workers: int = DEFAULT_REPO_INSPECTION_WORKERS,
+            max_queued: int = DEFAULT_REPO_INSPECTION_MAX_QUEUED,
+            timeout: float = DEFAULT_REPO_INSPECTION_TIMEOUT,
+    ):
+        self._inspect = inspect
+        self.workers = workers
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="repo-inspection"
+        )
+        self._jobs: typing.Dict[typing.Tuple[str, str, str], _Job] = {}
+
+    @property
+    def jobs(self) -> int:
+        """Number of jobs running or queued."""
+        return len(self._jobs)
+
+    def _submit(self, key: typing.Tuple[str, str, str], repository: Repository) -> _Job:
+        if len(self._jobs) >= self.workers + self.max_queued:
+            logger.warning("Repository inspection queue is full", jobs=len(self._jobs), repo_url=repository.url)
+            raise RepoInspectionQueueFull(f"Too many repositories being inspected ({len(self._jobs)})")
+        job = _Job(future=self._executor.submit(self._inspect, repository), waiters=[0])
+        self._jobs[key] = job
+        loop = asyncio.get_running_loop()
+
+        def forget(_):
+            # Called from the worker thread
+            loop.call_soon_threadsafe(lambda: self._jobs.pop(key, None) if self._jobs.get(key) is job else None)
+
+        job.future.add_done_callback(forget)
+        return job
+
+    async def inspect(self, repository: Repository) -> JHubAppConfig:
+        """Returns the app config of the repository, from the shared job inspecting it."""
+        key = (repository.url, repository.ref, repository.config_directory)
+        job = self._jobs.get(key)
+        if job is None:
+            job = self._submit(key, repository)
+        else:
+            logger.info("Joining repository inspection in progress", repo_url=repository.url)
+        job.waiters[0] += 1
+        try:
+            # Shielded: a request giving up mustn't cancel the job of the others
+            app_config = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), self.timeout)
+        except asyncio.TimeoutError:
+            raise RepoInspectionTimeout(f"Repository inspection timed out after {self.timeout}s")
+        finally:
+            job.waiters[0] -= 1
+            if not job.waiters[0] and job.future.cancel():
+                logger.info("Cancelled queued repository inspection", repo_url=repository.url)
+        # Each request gets its own copy, with the repository it asked for
+        return app_config.model_copy(update={"repository": repository}, deep=True)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_repo_inspector: typing.Optional[RepoInspector] = None
+
+
+def get_repo_inspector() -> RepoInspector:
+    """Returns the repository inspector of this process, configured from JAppsConfig."""
+    global _repo_inspector
+    if _repo_inspector is None:
+        config = get_jupyterhub_config()
+        _repo_inspector = RepoInspector(
+            workers=config.JAppsConfig.repo_inspection_workers,
+            max_queued=config.JAppsConfig.repo_inspection_max_queued,
+            timeout=config.JAppsConfig.repo_inspection_timeout,
+        )
+        logger.info("Created repository inspector", workers=_repo_inspector.workers)
+    return _repo_inspector
+
+
+def shutdown_repo_inspector():
+    """Cancels the queued inspections, if the inspector has been created."""
+    global _repo_inspector
+    if _repo_inspector is not None:
+        _repo_inspector.shutdown()
+        _repo_inspector = None
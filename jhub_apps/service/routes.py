@@ -2,7 +2,7 @@ import os
 import typing
 from datetime import timedelta
 
-import requests
+import httpx
 import structlog
 from fastapi import (
     APIRouter,
@@ -11,6 +11,7 @@ from fastapi import (
     File,
     Form,
     HTTPException,
+    Query,
     Request,
     UploadFile,
     status,
@@ -18,33 +19,78 @@ from fastapi import (
 from fastapi.encoders import jsonable_encoder
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel, ValidationError
-from starlette.responses import RedirectResponse, Response
-
-from jhub_apps.hub_client.hub_client import HubClient
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import RedirectResponse, Response, StreamingResponse
+
+from jhub_apps.hub_client.async_hub_client import AsyncHubClient
+from jhub_apps.hub_client.utils import is_jupyterhub_5
+from jhub_apps.service.app_metadata import (
+    UserOptionsChanges,
+    classify_changes,
+    get_app_metadata_store,
+    with_app_metadata,
+)
 from jhub_apps.service.auth import _create_access_token
 from jhub_apps.service.client import get_client
+from jhub_apps.service.events import SSE_HEADERS, get_server_events, progress_streams, sse_stream
+from jhub_apps.service.jobs import get_job_runner, job_handler
 from jhub_apps.service.models import (
     AuthorizationError,
     HubApiError,
+    Job,
     ServerCreation,
+    ServerList,
+    SharePermissions,
+    ShareUpdate,
     User,
+    UserOptions,
     Repository,
     JHubAppConfig,
 )
+from jhub_apps.service.repo_inspection import RepoInspectionQueueFull, RepoInspectionTimeout, get_repo_inspector
+from jhub_apps.service.runtime_artifacts import (
+    CONFIG_JSON,
+    THEME,
+    THEME_CSS,
+    artifact_response,
+    get_runtime_artifact,
+)
 from jhub_apps.service.security import get_current_user, JHUB_APPS_AUTH_COOKIE_NAME
+from jhub_apps.service.server_list import (
+    SERVER_LIST_MAX_LIMIT,
+    SUMMARY_FIELDS,
+    get_server_key,
+    paginate_servers,
+    parse_fields,
+    summarize_server,
+)
+from jhub_apps.service.share_permissions import get_share_permissions
+from jhub_apps.service.static_files import get_service_prefix
+from jhub_apps.service.thumbnail_processing import THUMBNAIL_SIZES
+from jhub_apps.service.thumbnails import (
+    THUMBNAIL_KEY_PATTERN,
+    THUMBNAILS_ROUTE,
+    decode_data_url,
+    get_thumbnail_reference,
+    get_thumbnail_store,
+    get_variant_key,
+    with_thumbnail_url,
+)
 from jhub_apps.service.utils import (
     get_conda_envs,
     get_jupyterhub_config,
+    get_jupyterhub_config_version,
     get_spawner_profiles,
-    get_thumbnail_data_url,
+    save_thumbnail,
+    save_thumbnail_contents,
     get_shared_servers,
-    get_runtime_config,
-    get_theme_css,
+    reload_jupyterhub_config,
+    etag_matches,
+    get_etag,
     _check_if_framework_allowed,
     _get_allowed_frameworks,
 )
-from jhub_apps.service.app_from_git import _get_app_configuration_from_git
-from jhub_apps.spawner.types import FRAMEWORKS
+from jhub_apps.spawner.types import FRAMEWORKS, Framework
 from jhub_apps.version import get_version
 
 app = FastAPI()
@@ -57,9 +103,11 @@ templates = Jinja2Templates(directory="jhub_apps/templates")
 
 # Expires in 7 days
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
+# Thumbnails are only served to authenticated users, but never change for a given URL
+SERVER_CACHE_CONTROL = "private, no-cache"
+THUMBNAIL_CACHE_CONTROL = "private, max-age=31536000, immutable"
 
-# APIRouter prefix cannot end in /
-service_prefix = os.getenv("JUPYTERHUB_SERVICE_PREFIX", "").rstrip("/")
+service_prefix = get_service_prefix()
 router = APIRouter(prefix=service_prefix)
 
 logger.info("Routes module initialized successfully", router_prefix=service_prefix)
@@ -73,18 +121,19 @@ async def get_token(code: str):
     # The only thing we need in this form post is the code
     # Everything else we can hardcode / pull from env
     logger.info(f"Getting token for code {code}")
-    async with get_client() as client:
-        redirect_uri = (
-            os.environ["PUBLIC_HOST"] + os.environ["JUPYTERHUB_OAUTH_CALLBACK_URL"],
-        )
-        data = {
-            "client_id": os.environ["JUPYTERHUB_CLIENT_ID"],
-            "client_secret": os.environ["JUPYTERHUB_API_TOKEN"],
-            "grant_type": "authorization_code",
-            "code": code,
-            "redirect_uri": redirect_uri,
-        }
-        resp = await client.post("/oauth2/token", data=data)
+    client = get_client()
+    redirect_uri = (
+        os.environ["PUBLIC_HOST"] + os.environ["JUPYTERHUB_OAUTH_CALLBACK_URL"],
+    )
+    data = {
+        "client_id": os.environ["JUPYTERHUB_CLIENT_ID"],
+        "client_secret": os.environ["JUPYTERHUB_API_TOKEN"],
+        "grant_type": "authorization_code",
+        "code": code,
+        "redirect_uri": redirect_uri,
+    }
+    headers = {"Authorization": f"Bearer {os.environ['JUPYTERHUB_API_TOKEN']}"}
+    resp = await client.post("/oauth2/token", data=data, headers=headers)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = _create_access_token(
         data={"sub": resp.json()}, expires_delta=access_token_expires
@@ -107,32 +156,145 @@ async def login(request: Request):
     return RedirectResponse(authorization_url, status_code=302)
 
 
+def _server_cache_headers(etag: str) -> typing.Dict[str, str]:
+    # Cached by the browser, but always revalidated: polling gets a 304 until something changes
+    return {"ETag": etag, "Cache-Control": SERVER_CACHE_CONTROL}
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_server_cache_headers(etag))
+
+
 @router.get("/server/", description="Get all servers")
-@router.get("/server/{server_name}", description="Get a server by server name")
-async def get_server(user: User = Depends(get_current_user), server_name=None):
-    """Get servers for the authenticated user"""
-    hub_client = HubClient(username=user.name)
-    hub_user = hub_client.get_user()
-    user_servers = hub_user["servers"]
+async def get_servers(
+    request: Request,
+    response: Response,
+    user: User = Depends(get_current_user),
+    fields: typing.Optional[str] = Query(
+        None, description=f"Comma separated fields of the servers to return, among: {', '.join(SUMMARY_FIELDS)}"
+    ),
+    limit: typing.Optional[int] = Query(None, ge=1, le=SERVER_LIST_MAX_LIMIT),
+    cursor: typing.Optional[str] = Query(None, description="next_cursor of the previous page"),
+):
+    """Get servers for the authenticated user.
 
-    # If server_name is 'lab' then it is the default user
+    Without ``fields``, ``limit`` or ``cursor``, returns the full Hub server models of
+    the user's own and shared apps. Otherwise returns a ServerList: a page of
+    ServerSummary, restricted to ``fields``, and the cursor of the next page.
+
+    The ETag is a hash of the Hub models the response is built from, when it matches
+    If-None-Match the response isn't built at all.
+    """
+    hub_client = AsyncHubClient(username=user.name)
+    hub_user = await hub_client.get_user()
+    app_metadata = await run_in_threadpool(get_app_metadata_store().get_all)
+    user_servers = {
+        name: with_app_metadata(server, app_metadata, owner=user.name)
+        for name, server in hub_user["servers"].items()
+    }
+
+    def with_thumbnail_urls(servers):
+        return [with_thumbnail_url(server) for server in servers]
+
+    if fields is None and limit is None and cursor is None:
+        shared_apps = await get_shared_servers(current_hub_user=hub_user)
+        etag = get_etag(user.name, list(user_servers.values()), shared_apps)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return _not_modified(etag)
+        response.headers.update(_server_cache_headers(etag))
+        return {
+            "shared_apps": await run_in_threadpool(with_thumbnail_urls, shared_apps),
+            "user_apps": await run_in_threadpool(with_thumbnail_urls, user_servers.values()),
+        }
+
+    try:
+        projected_fields = parse_fields(fields)
+        keyed_servers = [
+            (get_server_key(server, owner=user.name), server) for server in user_servers.values()
+        ]
+        page, next_cursor = paginate_servers(keyed_servers, cursor=cursor, limit=limit)
+        # Own servers come first, shared ones are only fetched if they can be on this page
+        if next_cursor is None:
+            shared_apps = await get_shared_servers(current_hub_user=hub_user)
+            keyed_servers.extend((get_server_key(server, shared=True), server) for server in shared_apps)
+            page, next_cursor = paginate_servers(keyed_servers, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(detail=str(e), status_code=status.HTTP_400_BAD_REQUEST)
+    page_servers = [server for _, server in page]
+    etag = get_etag(user.name, projected_fields, next_cursor, page)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return _not_modified(etag)
+    if "thumbnail" in projected_fields:
+        page_servers = await run_in_threadpool(with_thumbnail_urls, page_servers)
+    server_list = ServerList(
+        items=[
+            summarize_server(server, key, projected_fields)
+            for (key, _), server in zip(page, page_servers)
+        ],
+        next_cursor=next_cursor,
+    )
+    # Serialized by pydantic directly, leaving out the fields which weren't requested
+    return Response(
+        content=server_list.model_dump_json(exclude_unset=True),
+        media_type="application/json",
+        headers=_server_cache_headers(etag),
+    )
+
+
+@router.get("/server/events", description="Stream the changes to the servers of the user")
+async def get_server_events_stream(user: User = Depends(get_current_user)):
+    """Server-sent events: a "servers" event with the ServerSummary of the user's own
+    and shared servers, then a "changes" event whenever some of them change, or are
+    shared with or unshared from the user."""
+    events = get_server_events().watch(user.name)
+    return StreamingResponse(sse_stream(events), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.get("/server/{server_name}/progress", description="Stream the spawn progress of a server")
+async def get_server_progress_stream(server_name: str, user: User = Depends(get_current_user)):
+    """Server-sent events: the "progress" events of the Hub for the server, until it
+    is ready or failed. All the clients watching a server share one stream from the Hub."""
     if server_name == "lab" or server_name == "vscode":
         server_name = ""
-
-    if server_name is not None:
-        # Get a particular server
-        for s_name, server_details in user_servers.items():
-            if s_name == server_name:
-                return server_details
+    hub_user = await AsyncHubClient(username=user.name).get_user()
+    if server_name not in hub_user["servers"]:
         raise HTTPException(
             detail=f"server '{server_name}' not found",
             status_code=status.HTTP_404_NOT_FOUND,
         )
-    else:
-        return {
-            "shared_apps": get_shared_servers(current_hub_user=hub_user),
-            "user_apps": list(user_servers.values()),
-        }
+    events = progress_streams.watch(user.name, server_name)
+    return StreamingResponse(sse_stream(events), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.get("/server/{server_name}", description="Get a server by server name")
+async def get_server(
+    request: Request,
+    response: Response,
+    user: User = Depends(get_current_user),
+    server_name=None,
+):
+    """Get a server of the authenticated user"""
+    hub_client = AsyncHubClient(username=user.name)
+    hub_user = await hub_client.get_user()
+    user_servers = hub_user["servers"]
+
+    # If server_name is 'lab' then it is the default user
+    if server_name == "lab" or server_name == "vscode":
+        server_name = ""
+
+    for s_name, server_details in user_servers.items():
+        if s_name == server_name:
+            app_metadata = await run_in_threadpool(get_app_metadata_store().get_all)
+            server_details = with_app_metadata(server_details, app_metadata, owner=user.name)
+            etag = get_etag(user.name, server_details)
+            if etag_matches(request.headers.get("if-none-match"), etag):
+                return _not_modified(etag)
+            response.headers.update(_server_cache_headers(etag))
+            return await run_in_threadpool(with_thumbnail_url, server_details)
+    raise HTTPException(
+        detail=f"server '{server_name}' not found",
+        status_code=status.HTTP_404_NOT_FOUND,
+    )
 
 
 class Checker:
@@ -149,25 +311,52 @@ class Checker:
             )
 
 
+def _prefers_async(request: Request) -> bool:
+    """Whether the client asked for the operation to run as a job (RFC 7240)."""
+    preferences = request.headers.get("prefer", "").split(",")
+    return any(preference.split(";")[0].strip() == "respond-async" for preference in preferences)
+
+
+async def _submit_job(kind: str, user: User, params: dict) -> Response:
+    job = await get_job_runner().submit(kind, user.name, params)
+    return Response(
+        content=job.model_dump_json(),
+        media_type="application/json",
+        status_code=status.HTTP_202_ACCEPTED,
+        headers={"Location": f"{service_prefix}/jobs/{job.id}"},
+    )
+
+
+@job_handler("create_server")
+async def _create_server_job(username: str, params: dict):
+    hub_client = AsyncHubClient(username=username)
+    return await hub_client.create_server(
+        username=username,
+        servername=params["servername"],
+        user_options=UserOptions(**params["user_options"]),
+    )
+
+
 @router.post("/server")
 async def create_server(
+    request: Request,
     server: ServerCreation = Depends(Checker(ServerCreation)),
     thumbnail: typing.Optional[UploadFile] = File(None),
     user: User = Depends(get_current_user),
 ):
+    """Create a server. With a `Prefer: respond-async` header, the server is created
+    by a job and a 202 response with the job is returned right away."""
     # server.servername is not necessary to supply for create server
     _check_if_framework_allowed(server.user_options)
     server_name = server.user_options.display_name
     logger.info("Creating server", server_name=server_name, user=user.name)
-    server.user_options.thumbnail = await get_thumbnail_data_url(
+    server.user_options.thumbnail = await save_thumbnail(
         framework_name=server.user_options.framework, thumbnail=thumbnail
     )
-    hub_client = HubClient(username=user.name)
-    return hub_client.create_server(
-        username=user.name,
-        servername=server.servername,
-        user_options=server.user_options,
-    )
+    params = jsonable_encoder({"servername": server.servername, "user_options": server.user_options})
+    if _prefers_async(request):
+        return await _submit_job("create_server", user, params)
+    return await _create_server_job(user.name, params)
 
 
 @router.post("/server/")
@@ -179,15 +368,20 @@ async def start_server(
 ):
     """Start an already existing server."""
     logger.info("Starting server", server_name=server_name, user=user.name)
-    hub_client = HubClient(username=user.name)
+    hub_client = AsyncHubClient(username=user.name)
     # User could be starting a shared server, in which case the
     # user starting the server will not be the owner of the server
     server_owner = request.query_params.get("owner", user.name)
     try:
-        response = hub_client.start_server(
+        response = await hub_client.start_server(
             username=server_owner,
             servername=server_name,
         )
+        if response is None:
+            raise HTTPException(
+                detail=f"server '{server_name}' not found",
+                status_code=status.HTTP_404_NOT_FOUND,
+            )
         if response.status_code in [403, 404]:
             raise HTTPException(
                 detail=f"User doesn't have permissions to start server: '{server_name}' "
@@ -195,21 +389,80 @@ async def start_server(
                 status_code=status.HTTP_403_FORBIDDEN,
             )
         response.raise_for_status()
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         raise HTTPException(
             detail=f"Probably server '{server_name}' is already running: {e}",
             status_code=status.HTTP_400_BAD_REQUEST,
         )
-    if response is None:
-        raise HTTPException(
-            detail=f"server '{server_name}' not found",
-            status_code=status.HTTP_404_NOT_FOUND,
-        )
     return response.status_code
 
 
+def _get_user_options_changes(
+        server: typing.Optional[dict], app_metadata: dict, user_options: UserOptions
+) -> typing.Optional[UserOptionsChanges]:
+    """Returns the changes from the current user options of the server, None when
+    they can't be compared (e.g. the server doesn't exist or isn't an app)."""
+    if server is None:
+        return None
+    try:
+        current_user_options = UserOptions(**{**(server.get("user_options") or {}), **app_metadata})
+    except ValidationError:
+        return None
+    return classify_changes(current_user_options, user_options)
+
+
+@job_handler("update_server")
+async def _update_server_job(username: str, params: dict):
+    """Edits an app. Its display name, description, thumbnail and sharing are updated
+    in place, it's only restarted with the new user options when others changed."""
+    hub_client = AsyncHubClient(username=username)
+    servername = params["servername"]
+    user_options = UserOptions(**params["user_options"])
+    app_metadata_store = get_app_metadata_store()
+    server = await hub_client.get_server(username, servername)
+    app_metadata = await run_in_threadpool(app_metadata_store.get, username, servername)
+    changes = _get_user_options_changes(server, app_metadata, user_options)
+    if changes is None or changes.restart:
+        logger.info(
+            "Restarting server to apply changes",
+            server_name=servername,
+            changed=changes.restart if changes is not None else None,
+        )
+        edit_server_response = await hub_client.edit_server(
+            username=username,
+            servername=servername,
+            user_options=user_options,
+        )
+        # The Hub has all the user options now
+        await run_in_threadpool(app_metadata_store.delete, username, servername)
+        logger.info(f"Edit server response: {edit_server_response}")
+        return edit_server_response
+    logger.info(
+        "Updating server in place",
+        server_name=servername,
+        changed=list(changes.metadata),
+        sharing=changes.sharing,
+    )
+    in_place_user_options = dict(changes.metadata)
+    if changes.sharing:
+        in_place_user_options["share_with"] = jsonable_encoder(user_options.share_with)
+        if is_jupyterhub_5() and user_options.framework != Framework.jupyterlab.value:
+            results = await hub_client.update_server_sharing(username, servername, user_options.share_with) or []
+            failed = [result.name for result in results if not result.success]
+            if failed:
+                logger.warning("Failed to update sharing of server", server_name=servername, failed=failed)
+                # Record the shares actually in place
+                in_place_user_options["share_with"] = jsonable_encoder(
+                    await hub_client.get_server_shares(username, servername)
+                )
+    if in_place_user_options:
+        await run_in_threadpool(app_metadata_store.update, username, servername, in_place_user_options)
+    return status.HTTP_200_OK, servername
+
+
 @router.put("/server/{server_name}")
 async def update_server(
+    request: Request,
     server: ServerCreation = Depends(Checker(ServerCreation)),
     thumbnail: typing.Optional[UploadFile] = File(None),
     thumbnail_data_url: typing.Optional[str] = Form(None),
@@ -218,20 +471,64 @@ async def update_server(
 ):
     _check_if_framework_allowed(server.user_options)
     if thumbnail_data_url:
-        server.user_options.thumbnail = thumbnail_data_url
+        # The current thumbnail: its URL, or a data URL if the app predates the thumbnail store
+        decoded_thumbnail = decode_data_url(thumbnail_data_url)
+        if decoded_thumbnail is not None:
+            server.user_options.thumbnail = await save_thumbnail_contents(
+                f"thumbnail.{decoded_thumbnail.mime_type.split('/')[-1]}", decoded_thumbnail.content
+            )
+        else:
+            # Framework logos are stored as a reference rather than their URL
+            server.user_options.thumbnail = get_thumbnail_reference(thumbnail_data_url)
     else:
-        server.user_options.thumbnail = await get_thumbnail_data_url(
+        server.user_options.thumbnail = await save_thumbnail(
             framework_name=server.user_options.framework, thumbnail=thumbnail
         )
-    hub_client = HubClient(username=user.name)
     logger.info("Updating server", server_name=server.servername, user=user.name)
-    edit_server_response = hub_client.edit_server(
-        username=user.name,
-        servername=server_name,
-        user_options=server.user_options,
+    params = jsonable_encoder({"servername": server_name, "user_options": server.user_options})
+    if _prefers_async(request):
+        return await _submit_job("update_server", user, params)
+    return await _update_server_job(user.name, params)
+
+
+@router.put(
+    "/server/{server_name}/shares",
+    response_model=ShareUpdate,
+    description="Update the users and groups a server is shared with, without restarting it",
+)
+async def update_server_sharing(
+    server_name: str,
+    share_with: SharePermissions,
+    user: User = Depends(get_current_user),
+):
+    if not is_jupyterhub_5():
+        raise HTTPException(
+            detail="Sharing servers requires JupyterHub >= 5",
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    hub_client = AsyncHubClient(username=user.name)
+    server = await hub_client.get_server(user.name, server_name)
+    if server is None:
+        raise HTTPException(
+            detail=f"server '{server_name}' not found",
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+    framework = (server.get("user_options") or {}).get("framework")
+    if framework == Framework.jupyterlab.value:
+        raise HTTPException(
+            detail="Sharing JupyterLab servers is not allowed",
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    logger.info("Updating server sharing", server_name=server_name, user=user.name)
+    results = await hub_client.update_server_sharing(user.name, server_name, share_with) or []
+    if not all(result.success for result in results):
+        # Record the shares actually in place
+        share_with = await hub_client.get_server_shares(user.name, server_name)
+    # Shown by the listings and the edit form, as for sharing edited with PUT /server/{server_name}
+    await run_in_threadpool(
+        get_app_metadata_store().update, user.name, server_name, {"share_with": jsonable_encoder(share_with)}
     )
-    logger.info(f"Edit server response: {edit_server_response}")
-    return edit_server_response
+    return ShareUpdate(servername=server_name, results=results)
 
 
 @router.delete("/server/{server_name}")
@@ -242,9 +539,12 @@ async def delete_server(
     remove: bool = False,
 ):
     """Delete or stop server. Delete if remove is True otherwise stop the server"""
-    hub_client = HubClient(username=user.name)
+    hub_client = AsyncHubClient(username=user.name)
     logger.info("Deleting server", server_name=server_name, user=user.name)
-    return hub_client.delete_server(user.name, server_name=server_name, remove=remove)
+    response = await hub_client.delete_server(user.name, server_name=server_name, remove=remove)
+    if remove and server_name:
+        await run_in_threadpool(get_app_metadata_store().delete, user.name, server_name)
+    return response
 
 
 @router.get(
@@ -254,9 +554,62 @@ async def delete_server(
 )
 async def me(user: User = Depends(get_current_user)):
     """Authenticated function that returns the User model"""
+    if is_jupyterhub_5():
+        user.share_permissions = await get_share_permissions(user)
     return user
 
 
+@router.get(
+    "/share-permissions/",
+    response_model=SharePermissions,
+    description="Get users and groups the user is allowed to share apps with",
+)
+async def share_permissions(user: User = Depends(get_current_user)):
+    if not is_jupyterhub_5():
+        return SharePermissions(users=[], groups=[])
+    return await get_share_permissions(user)
+
+
+@router.get(THUMBNAILS_ROUTE + "/{key}", description="Get an app thumbnail by its content hash")
+async def get_thumbnail(
+    key: str,
+    request: Request,
+    size: typing.Optional[int] = None,
+    user: User = Depends(get_current_user),
+):
+    """Returns a thumbnail, or its smallest rendition at least ``size`` pixels wide and high"""
+    thumbnail_store = get_thumbnail_store()
+    thumbnail = None
+    served_key = key
+    if size and THUMBNAIL_KEY_PATTERN.match(key):
+        for variant_size in sorted(s for s in THUMBNAIL_SIZES if s >= size):
+            variant_key = get_variant_key(key, variant_size)
+            thumbnail = await run_in_threadpool(thumbnail_store.get, variant_key)
+            if thumbnail is not None:
+                served_key = variant_key
+                break
+    if thumbnail is None:
+        # The largest rendition, and thumbnails without renditions (e.g. SVG or
+        # small images), are stored under the key itself
+        thumbnail = await run_in_threadpool(thumbnail_store.get, key)
+    if thumbnail is None:
+        raise HTTPException(
+            detail=f"thumbnail '{key}' not found",
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+    # Thumbnails are content-addressed, their URL changes whenever they change
+    headers = {
+        "Cache-Control": THUMBNAIL_CACHE_CONTROL,
+        "ETag": f'"{served_key}"',
+        # SVG thumbnails must not run scripts when opened directly
+        "Content-Security-Policy": "default-src 'none'; style-src 'unsafe-inline'; sandbox",
+        "X-Content-Type-Options": "nosniff",
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=thumbnail.content, media_type=thumbnail.mime_type, headers=headers)
+
+
 @router.get("/frameworks/", description="Get all frameworks")
 async def get_frameworks(user: User = Depends(get_current_user)):
     logger.info("Getting all the frameworks")
@@ -270,8 +623,8 @@ async def get_frameworks(user: User = Depends(get_current_user)):
 async def conda_environments(user: User = Depends(get_current_user)):
     logger.info("Getting conda environments", user=user.name)
     config = get_jupyterhub_config()
-    hclient = HubClient(username=user.name)
-    user_from_service = hclient.get_user(user.name)
+    hclient = AsyncHubClient(username=user.name)
+    user_from_service = await hclient.get_user(user.name)
     conda_envs = get_conda_envs(config, user_from_service)
     logger.info(f"Found conda environments: {conda_envs}")
     return conda_envs
@@ -279,8 +632,8 @@ async def conda_environments(user: User = Depends(get_current_user)):
 
 @router.get("/spawner-profiles/", description="Get all spawner profiles")
 async def spawner_profiles(user: User = Depends(get_current_user)):
-    hclient = HubClient(username=user.name)
-    user_from_service = hclient.get_user(user.name)
+    hclient = AsyncHubClient(username=user.name)
+    user_from_service = await hclient.get_user(user.name)
     auth_state = user_from_service.get("auth_state")
     logger.info("Getting spawner profiles", user=user.name)
     config = get_jupyterhub_config()
@@ -292,32 +645,71 @@ async def spawner_profiles(user: User = Depends(get_current_user)):
 @router.get("/services/", description="Get all services")
 async def hub_services(user: User = Depends(get_current_user)):
     logger.info(f"Getting hub services for user: {user}")
-    hub_client = HubClient(username=user.name)
-    return hub_client.get_services()
+    hub_client = AsyncHubClient(username=user.name)
+    return await hub_client.get_services()
 
 
 @router.get("/config.json", description="Get JHub Apps runtime configuration")
-async def runtime_config():
+async def runtime_config(request: Request):
     config = get_jupyterhub_config()
-    return get_runtime_config(config)
+    return artifact_response(request, get_runtime_artifact(config, CONFIG_JSON))
 
 
 @router.get("/theme", description="Get JHub Apps runtime theme configuration")
-async def theme_config():
-    return (await runtime_config())["theme"]
+async def theme_config(request: Request):
+    config = get_jupyterhub_config()
+    return artifact_response(request, get_runtime_artifact(config, THEME))
 
 
 @router.get(
     "/theme.css",
     description="Get JHub Apps theme as a CSS stylesheet for server-rendered pages",
 )
-async def theme_css():
+async def theme_css(request: Request):
     config = get_jupyterhub_config()
-    return Response(content=get_theme_css(config), media_type="text/css")
+    return artifact_response(request, get_runtime_artifact(config, THEME_CSS))
+
+
+@router.post("/config/reload", description="Reload the JupyterHub config, admins only")
+async def reload_config(user: User = Depends(get_current_user)):
+    """Reloads the JupyterHub config of the service worker handling the request. The
+    config is otherwise reloaded by each worker when its file changes."""
+    if not user.admin:
+        raise HTTPException(
+            detail="Only admins can reload the config",
+            status_code=status.HTTP_403_FORBIDDEN,
+        )
+    logger.info("Reloading JupyterHub config", user=user.name)
+    try:
+        await run_in_threadpool(reload_jupyterhub_config)
+    except Exception as e:
+        raise HTTPException(
+            detail=f"Failed to reload the config: {e}",
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+    return {"version": get_jupyterhub_config_version()}
+
+
+@job_handler("app_from_git")
+async def _app_from_git_job(username: str, params: dict) -> JHubAppConfig:
+    try:
+        return await get_repo_inspector().inspect(Repository(**params["repository"]))
+    except RepoInspectionQueueFull as e:
+        raise HTTPException(
+            detail=str(e),
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": "5"},
+        )
+    except RepoInspectionTimeout as e:
+        raise HTTPException(
+            detail=str(e),
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        )
 
 
 @router.post("/app-config-from-git/",)
 async def app_from_git(
+        request: Request,
         repo: Repository,
         user: User = Depends(get_current_user)
 ) -> JHubAppConfig:
@@ -328,10 +720,57 @@ async def app_from_git(
     requesting the server to process some data, in this case, to fetch
     a repository, read its conda project config, and return specific values,
     which is a processing action.
+
+    With a `Prefer: respond-async` header, the configuration is fetched by a job
+    and a 202 response with the job is returned right away.
     """
     logger.info("Getting app configuration from git repository")
-    response = _get_app_configuration_from_git(repo)
-    return response
+    params = {"repository": repo.model_dump()}
+    if _prefers_async(request):
+        return await _submit_job("app_from_git", user, params)
+    return await _app_from_git_job(user.name, params)
+
+
+async def _get_job(job_id: str, user: User) -> Job:
+    job = await run_in_threadpool(get_job_runner().store.get, job_id)
+    # Other users' jobs are not disclosed, but to admins
+    if job is None or (job.owner != user.name and not user.admin):
+        raise HTTPException(
+            detail=f"job '{job_id}' not found",
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+    return job
+
+
+@router.get("/jobs/", response_model=typing.List[Job], description="Get the latest jobs of the user")
+async def list_jobs(user: User = Depends(get_current_user)):
+    return await run_in_threadpool(get_job_runner().store.list, user.name)
+
+
+@router.get("/jobs/{job_id}", response_model=Job, description="Get the status of a job")
+async def get_job(job_id: str, user: User = Depends(get_current_user)):
+    return await _get_job(job_id, user)
+
+
+@router.get("/jobs/{job_id}/events", description="Stream the status of a job, until it's finished")
+async def job_events(job_id: str, user: User = Depends(get_current_user)):
+    await _get_job(job_id, user)
+    return StreamingResponse(
+        sse_stream(get_job_runner().watch(job_id)),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@router.post("/jobs/{job_id}/retry", response_model=Job, description="Run an interrupted or failed job again")
+async def retry_job(job_id: str, user: User = Depends(get_current_user)):
+    await _get_job(job_id, user)
+    if not await get_job_runner().retry(job_id):
+        raise HTTPException(
+            detail=f"job '{job_id}' is not interrupted or failed",
+            status_code=status.HTTP_409_CONFLICT,
+        )
+    return await _get_job(job_id, user)
 
 
 @router.get("/")
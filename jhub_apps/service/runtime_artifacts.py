@@ -0,0 +1,138 @@
+import gzip
+import hashlib
+import json
+import threading
+import typing
+
+import structlog
+from starlette.requests import Request
+from starlette.responses import Response
+
+from jhub_apps.service.utils import etag_matches, get_runtime_config, get_theme_css
+
+try:
+    # Optional: brotli variants are only served when the package is installed
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+logger = structlog.get_logger(__name__)
+
+# Served by every server-rendered Hub page (through hub.css). Browsers reuse them for
+# an hour and then revalidate them with their ETag, so a theme change reaches them
+# within the hour while most page loads don't hit the service at all.
+RUNTIME_ARTIFACT_CACHE_CONTROL = "public, max-age=3600, must-revalidate"
+
+CONFIG_JSON = "config.json"
+THEME = "theme"
+THEME_CSS = "theme.css"
+
+
+class RuntimeArtifact(typing.NamedTuple):
+    """A response body rendered once per config, with its precompressed variants
+    keyed by content coding."""
+
+    content: bytes
+    media_type: str
+    etag: str
+    encodings: typing.Dict[str, bytes]
+
+
+def _compress(content: bytes) -> typing.Dict[str, bytes]:
+    encodings = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encodings["br"] = brotli.compress(content)
+    # Tiny bodies may not be worth compressing
+    return {coding: body for coding, body in encodings.items() if len(body) < len(content)}
+
+
+def build_artifact(content: bytes, media_type: str) -> RuntimeArtifact:
+    return RuntimeArtifact(
+        content=content,
+        media_type=media_type,
+        # Weak: the compressed variants are the same representation, with the same tag
+        etag=f'W/"{hashlib.sha256(content).hexdigest()[:32]}"',
+        encodings=_compress(content),
+    )
+
+
+def _dump_json(value) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def render_runtime_artifacts(config) -> typing.Dict[str, RuntimeArtifact]:
+    runtime_config = get_runtime_config(config)
+    return {
+        CONFIG_JSON: build_artifact(_dump_json(runtime_config), "application/json"),
+        THEME: build_artifact(_dump_json(runtime_config["theme"]), "application/json"),
+        THEME_CSS: build_artifact(get_theme_css(config).encode(), "text/css; charset=utf-8"),
+    }
+
+
+_lock = threading.Lock()
+_rendered: typing.Optional[typing.Tuple[typing.Any, typing.Dict[str, RuntimeArtifact]]] = None
+
+
+def get_runtime_artifact(config, name: str) -> RuntimeArtifact:
+    """Returns an artifact of the given config, rendered on first use.
+
+    The config provider returns the same object until the config is reloaded, so
+    the artifacts are rendered once per config version.
+    """
+    global _rendered
+    rendered = _rendered
+    if rendered is None or rendered[0] is not config:
+        with _lock:
+            rendered = _rendered
+            if rendered is None or rendered[0] is not config:
+                rendered = (config, render_runtime_artifacts(config))
+                _rendered = rendered
+                logger.info("Rendered runtime config artifacts")
+    return rendered[1][name]
+
+
+def _parse_accept_encoding(accept_encoding: str) -> typing.Dict[str, float]:
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            qualities[coding.strip().lower()] = quality
+    return qualities
+
+
+def select_encoding(accept_encoding: typing.Optional[str], available: typing.Iterable[str]) -> typing.Optional[str]:
+    """Returns the best of the available content codings accepted by the client,
+    brotli first, or None for the identity coding."""
+    if not accept_encoding:
+        return None
+    qualities = _parse_accept_encoding(accept_encoding)
+    best, best_quality = None, 0.0
+    for coding in ("br", "gzip"):
+        if coding not in available:
+            continue
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def artifact_response(request: Request, artifact: RuntimeArtifact) -> Response:
+    headers = {
+        "ETag": artifact.etag,
+        "Cache-Control": RUNTIME_ARTIFACT_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request.headers.get("if-none-match"), artifact.etag):
+        return Response(status_code=304, headers=headers)
+    coding = select_encoding(request.headers.get("accept-encoding"), artifact.encodings)
+    if coding is None:
+        return Response(content=artifact.content, media_type=artifact.media_type, headers=headers)
+    headers["Content-Encoding"] = coding
+    return Response(content=artifact.encodings[coding], media_type=artifact.media_type, headers=headers)
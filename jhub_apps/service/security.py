@@ -5,10 +5,10 @@ from fastapi import HTTPException, Security, status
 from fastapi.security import OAuth2AuthorizationCodeBearer, APIKeyCookie
 from fastapi.security.api_key import APIKeyQuery
 
-from jhub_apps.hub_client.hub_client import get_users_and_group_allowed_to_share_with, is_jupyterhub_5
 from .auth import _get_jhub_token_from_jwt_token
 from .client import get_client
 from .models import User
+from .user_cache import get_user_cache
 
 ### Endpoints can require authentication using Depends(get_current_user)
 ### get_current_user will look for a token in url params or
@@ -39,8 +39,8 @@ else:
     access_scopes = ["access:services"]
 
 
-### For consideration: optimize performance with a cache instead of
-### always hitting the Hub api?
+### The resolved user is cached per token for a short time (see user_cache.py),
+### so that a page load fanning out to several endpoints hits the Hub api once.
 async def get_current_user(
     auth_param: str = Security(auth_by_param),
     auth_header: str = Security(auth_by_header),
@@ -56,27 +56,32 @@ async def get_current_user(
 
     token = _get_jhub_token_from_jwt_token(token)
 
-    async with get_client() as client:
-        endpoint = "/user"
-        # normally we auth to Hub API with service api token,
-        # but this time auth as the user token to get user model
-        headers = {"Authorization": f"Bearer {token}"}
-        resp = await client.get(endpoint, headers=headers)
-        if resp.is_error:
-            raise HTTPException(
-                status.HTTP_401_UNAUTHORIZED,
-                detail={
-                    "msg": "Error getting user info from token",
-                    "request_url": str(resp.request.url),
-                    "token": token,
-                    "response_code": resp.status_code,
-                    "hub_response": resp.json(),
-                },
-            )
+    user_cache = get_user_cache()
+    cached_user = user_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+
+    client = get_client()
+    endpoint = "/user"
+    # normally we auth to Hub API with service api token,
+    # but this time auth as the user token to get user model
+    headers = {"Authorization": f"Bearer {token}"}
+    resp = await client.get(endpoint, headers=headers)
+    if resp.is_error:
+        user_cache.evict_token(token)
+        raise HTTPException(
+            status.HTTP_401_UNAUTHORIZED,
+            detail={
+                "msg": "Error getting user info from token",
+                "request_url": str(resp.request.url),
+                "token": token,
+                "response_code": resp.status_code,
+                "hub_response": resp.json(),
+            },
+        )
     user = User(**resp.json())
-    if is_jupyterhub_5():
-        user.share_permissions = get_users_and_group_allowed_to_share_with(user)
     if any(scope in user.scopes for scope in access_scopes):
+        user_cache.set(token, user)
         return user
     else:
         raise HTTPException(
@@ -0,0 +1,88 @@
+import base64
+import binascii
+import json
+import typing
+
+from jhub_apps.service.models import ServerSummary
+
+# Fields of the Hub's server model and of the app's user options in a ServerSummary
+SERVER_FIELDS = ("url", "ready", "pending", "stopped", "started", "last_activity")
+USER_OPTIONS_FIELDS = ("jhub_app", "display_name", "description", "framework", "thumbnail", "public", "profile")
+# Always returned, they identify the server
+KEY_FIELDS = ("name", "owner", "shared")
+SUMMARY_FIELDS = KEY_FIELDS + SERVER_FIELDS + USER_OPTIONS_FIELDS
+SERVER_LIST_MAX_LIMIT = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def parse_fields(fields: typing.Optional[str]) -> typing.Tuple[str, ...]:
+    """Returns the fields of a comma separated projection, all of them if None."""
+    if fields is None:
+        return SUMMARY_FIELDS
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(SUMMARY_FIELDS)
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(sorted(unknown))}, expected some of: {', '.join(SUMMARY_FIELDS)}"
+        )
+    return tuple(field for field in SUMMARY_FIELDS if field in requested or field in KEY_FIELDS)
+
+
+def get_server_key(
+        server: dict, owner: typing.Optional[str] = None, shared: bool = False
+) -> typing.Tuple[bool, str, str]:
+    """Returns the key ordering the servers of a listing: own servers first, then
+    the shared ones, by owner and name."""
+    if owner is None:
+        owner = server.get("full_name", "").split("/")[0]
+    return shared, owner, server["name"]
+
+
+def encode_cursor(key: typing.Tuple[bool, str, str]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> typing.Tuple[bool, str, str]:
+    try:
+        shared, owner, name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+    return bool(shared), str(owner), str(name)
+
+
+def paginate_servers(
+        servers: typing.Iterable[typing.Tuple[typing.Tuple[bool, str, str], dict]],
+        cursor: typing.Optional[str] = None,
+        limit: typing.Optional[int] = None,
+) -> typing.Tuple[typing.List[typing.Tuple[typing.Tuple[bool, str, str], dict]], typing.Optional[str]]:
+    """Returns the page of (key, server) pairs following ``cursor`` and the cursor
+    of the next page. Pages are keyed rather than offset, so that servers created
+    or deleted between two requests don't shift the following pages."""
+    servers = sorted(servers, key=lambda key_server: key_server[0])
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        servers = [(key, server) for key, server in servers if key > after]
+    if limit is None or len(servers) <= limit:
+        return servers, None
+    page = servers[:limit]
+    return page, encode_cursor(page[-1][0])
+
+
+def summarize_server(
+        server: dict,
+        key: typing.Tuple[bool, str, str],
+        fields: typing.Sequence[str] = SUMMARY_FIELDS,
+) -> ServerSummary:
+    """Returns the projection of a Hub server model on the given fields."""
+    shared, owner, name = key
+    summary = {"name": name, "owner": owner, "shared": shared}
+    user_options = server.get("user_options") or {}
+    for field in fields:
+        if field in SERVER_FIELDS:
+            summary[field] = server.get(field)
+        elif field in USER_OPTIONS_FIELDS:
+            summary[field] = user_options.get(field)
+    return ServerSummary(**summary)
@@ -0,0 +1,123 @@
+import asyncio
+import time
+import typing
+
+import structlog
+from starlette.concurrency import run_in_threadpool
+
+from jhub_apps.hub_client.async_hub_client import AsyncHubClient
+from jhub_apps.service.thumbnails import with_users_thumbnail_urls
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_SERVER_SNAPSHOT_TTL = 10
+# A snapshot older than ttl is served while it is refreshed in the background,
+# one older than ttl * MAX_STALENESS_FACTOR is refreshed before being served.
+MAX_STALENESS_FACTOR = 6
+
+
+class UsersPage(typing.NamedTuple):
+    etag: typing.Optional[str]
+    users: typing.List[dict]
+    next_offset: typing.Optional[int]
+
+
+class ServerSnapshot:
+    """Process wide snapshot of all the users of the Hub with their servers.
+
+    The snapshot is refreshed at most once per ``ttl`` seconds, in the background
+    when a request finds it stale, so that requests don't wait for the Hub. Each page
+    of users is requested with the ETag of its previous version, unchanged pages are
+    not transferred again. Concurrent refreshes are coalesced into a single one.
+    A ``ttl`` of 0 means that every call fetches the users from the Hub.
+    """
+
+    def __init__(self, ttl: int = DEFAULT_SERVER_SNAPSHOT_TTL):
+        self.ttl = ttl
+        self._pages: typing.List[UsersPage] = []
+        self._users: typing.Optional[typing.Dict[str, dict]] = None
+        self._refreshed_at = 0.0
+        self._refresh_lock: typing.Optional[asyncio.Lock] = None
+        self._refresh_task: typing.Optional[asyncio.Task] = None
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self._refreshed_at
+
+    @property
+    def users(self) -> typing.Optional[typing.Dict[str, dict]]:
+        """The users of the last refresh, as is. A new mapping is built whenever a
+        refresh finds that users changed, so an identical one means no changes."""
+        return self._users
+
+    async def get_users(self) -> typing.Dict[str, dict]:
+        """Returns a mapping of user name to user model, including all the servers."""
+        if self._users is None or not self.ttl or self.age > self.ttl * MAX_STALENESS_FACTOR:
+            await self.refresh()
+        elif self.age > self.ttl and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self.refresh())
+        return self._users
+
+    async def refresh(self):
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        requested_at = time.monotonic()
+        async with self._refresh_lock:
+            if self._refreshed_at > requested_at:
+                # Refreshed by a concurrent request while waiting for the lock
+                return
+            try:
+                await self._refresh()
+            except Exception as e:
+                if self._users is None:
+                    raise
+                logger.warning("Failed to refresh server snapshot, serving the previous one", error=str(e))
+
+    async def _refresh(self):
+        started_at = time.monotonic()
+        hub_client = AsyncHubClient()
+        pages = []
+        offset = 0
+        changed_pages = 0
+        while offset is not None:
+            previous_page = self._pages[len(pages)] if len(pages) < len(self._pages) else None
+            etag = previous_page.etag if previous_page and self.ttl else None
+            rjson = await hub_client.get_users_page(offset=offset, etag=etag)
+            if rjson is None:
+                page = previous_page
+            else:
+                changed_pages += 1
+                next_page = rjson["_pagination"]["next"]
+                page = UsersPage(
+                    etag=rjson["etag"],
+                    # Keep thumbnail URLs rather than the data URLs of apps created by previous versions
+                    users=await run_in_threadpool(with_users_thumbnail_urls, rjson["items"]),
+                    next_offset=next_page["offset"] if next_page else None,
+                )
+            pages.append(page)
+            offset = page.next_offset
+        self._pages = pages
+        if changed_pages or self._users is None:
+            self._users = {user["name"]: user for page in pages for user in page.users}
+        self._refreshed_at = time.monotonic()
+        logger.info(
+            "Refreshed server snapshot",
+            users=len(self._users),
+            pages=len(pages),
+            changed_pages=changed_pages,
+            duration=round(self._refreshed_at - started_at, 3),
+        )
+
+
+_server_snapshot: typing.Optional[ServerSnapshot] = None
+
+
+def get_server_snapshot() -> ServerSnapshot:
+    """Returns the process wide server snapshot, configured from JAppsConfig."""
+    global _server_snapshot
+    if _server_snapshot is None:
+        # Imported here to avoid circular imports, as utils uses the snapshot
+        from jhub_apps.service.utils import get_jupyterhub_config
+        config = get_jupyterhub_config()
+        _server_snapshot = ServerSnapshot(ttl=config.JAppsConfig.server_snapshot_ttl)
+    return _server_snapshot
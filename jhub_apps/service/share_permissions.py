@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import json
+import typing
+
+import structlog
+from cachetools import TTLCache
+
+from jhub_apps.hub_client.async_hub_client import AsyncHubClient
+from jhub_apps.hub_client.hub_client import ScopeFilter
+from jhub_apps.service.models import SharePermissions, User
+from jhub_apps.service.utils import get_jupyterhub_config
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_SHARE_PERMISSIONS_CACHE_TTL = 60
+SHARE_PERMISSIONS_CACHE_MAXSIZE = 1024
+
+
+class ShareableEntities(typing.NamedTuple):
+    users: typing.List[str]
+    groups: typing.List[str]
+    # Mapping of user name to the names of the groups it is a member of
+    user_groups: typing.Dict[str, typing.Set[str]]
+    # Changes whenever a user or a group is added to or removed from the Hub
+    version: str
+
+
+class SharePermissionsCache:
+    """Caches the users and groups each user is allowed to share apps with.
+
+    The list of all users and groups (with their members) in the Hub is fetched once
+    per ``ttl`` and shared by all the users. The per-user results are dropped as soon as
+    a refreshed listing shows that users or groups have changed.
+    """
+
+    def __init__(self, ttl: int = DEFAULT_SHARE_PERMISSIONS_CACHE_TTL):
+        self.ttl = ttl
+        self._entities: TTLCache = TTLCache(maxsize=1, ttl=ttl)
+        self._permissions: TTLCache = TTLCache(maxsize=SHARE_PERMISSIONS_CACHE_MAXSIZE, ttl=ttl)
+        self._entities_version = None
+        self._entities_lock: typing.Optional[asyncio.Lock] = None
+
+    async def _fetch_shareable_entities(self) -> ShareableEntities:
+        hub_client = AsyncHubClient()
+        user_names, groups = await asyncio.gather(
+            hub_client.get_user_names(), hub_client.get_groups()
+        )
+        group_names = [group["name"] for group in groups]
+        user_groups = {}
+        for group in groups:
+            for member in group.get("users", []):
+                user_groups.setdefault(member, set()).add(group["name"])
+        version = hashlib.sha256(json.dumps([
+            sorted(user_names),
+            sorted(group_names),
+            sorted((member, sorted(names)) for member, names in user_groups.items()),
+        ]).encode()).hexdigest()
+        return ShareableEntities(
+            users=user_names, groups=group_names, user_groups=user_groups, version=version
+        )
+
+    async def get_shareable_entities(self) -> ShareableEntities:
+        entities = self._entities.get("entities")
+        if entities is not None:
+            return entities
+        if self._entities_lock is None:
+            self._entities_lock = asyncio.Lock()
+        # Only one request refreshes the listing, concurrent requests wait for it
+        async with self._entities_lock:
+            entities = self._entities.get("entities")
+            if entities is not None:
+                return entities
+            entities = await self._fetch_shareable_entities()
+            if entities.version != self._entities_version:
+                logger.info("Users or groups changed, invalidating share permissions")
+                self._permissions.clear()
+                self._entities_version = entities.version
+            if self.ttl:
+                self._entities["entities"] = entities
+            return entities
+
+    async def get(self, user: User) -> SharePermissions:
+        entities = await self.get_shareable_entities()
+        share_permissions = self._permissions.get(user.name)
+        if share_permissions is not None:
+            return share_permissions
+        user_scopes = await AsyncHubClient(username=user.name).get_user_scopes()
+        share_permissions = SharePermissions(
+            users=ScopeFilter(user_scopes).filter(
+                [name for name in entities.users if name != user.name],
+                entity_groups=entities.user_groups,
+            ),
+            groups=ScopeFilter(user_scopes, entity_key="group").filter(entities.groups),
+        )
+        if self.ttl:
+            self._permissions[user.name] = share_permissions
+        return share_permissions
+
+
+_share_permissions_cache: typing.Optional[SharePermissionsCache] = None
+
+
+def get_share_permissions_cache() -> SharePermissionsCache:
+    global _share_permissions_cache
+    if _share_permissions_cache is None:
+        config = get_jupyterhub_config()
+        _share_permissions_cache = SharePermissionsCache(
+            ttl=config.JAppsConfig.share_permissions_cache_ttl
+        )
+    return _share_permissions_cache
+
+
+async def get_share_permissions(user: User) -> SharePermissions:
+    """Returns the users and groups the given user is allowed to share apps with."""
+    return await get_share_permissions_cache().get(user)
@@ -0,0 +1,67 @@
+import functools
+import hashlib
+import os
+import typing
+from pathlib import Path
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import QueryParams
+from starlette.responses import Response
+from starlette.types import Scope
+
+STATIC_DIR = Path(__file__).parent.parent / "static"
+# Static files are served from <service prefix>/static
+STATIC_ROUTE = "/static"
+# Fingerprinted asset URLs change with their content, browsers can keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Assets requested without (or with a stale) fingerprint are revalidated on every use
+STATIC_CACHE_CONTROL = "no-cache"
+
+
+def get_service_prefix() -> str:
+    """Returns the URL prefix of the JHub Apps service, e.g. /services/japps"""
+    # APIRouter prefix cannot end in /
+    return os.getenv("JUPYTERHUB_SERVICE_PREFIX", "").rstrip("/")
+
+
+@functools.lru_cache(maxsize=64)
+def _get_file_hash(path: str, mtime_ns: int, size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as asset:
+        for chunk in iter(lambda: asset.read(1 << 20), b""):
+            digest.update(chunk)
+    # Same length as the fingerprints of the framework logo URLs
+    return digest.hexdigest()[:12]
+
+
+def get_file_hash(path: typing.Union[str, os.PathLike]) -> str:
+    """Returns the content hash of a file, computed once per file modification."""
+    stat = os.stat(path)
+    return _get_file_hash(str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def get_asset_url(relative_path: str) -> str:
+    """Returns the URL of a static asset, fingerprinted with its content hash."""
+    return f"{get_service_prefix()}{STATIC_ROUTE}/{relative_path}?v={get_file_hash(STATIC_DIR / relative_path)}"
+
+
+class FingerprintedStaticFiles(StaticFiles):
+    """Static files which are cached forever when requested through their
+    fingerprinted URL (see get_asset_url) and revalidated otherwise."""
+
+    def file_response(
+            self,
+            full_path: typing.Union[str, os.PathLike],
+            stat_result: os.stat_result,
+            scope: Scope,
+            status_code: int = 200,
+    ) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        fingerprint = QueryParams(scope["query_string"]).get("v")
+        if fingerprint and fingerprint == _get_file_hash(
+                str(full_path), stat_result.st_mtime_ns, stat_result.st_size
+        ):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["Cache-Control"] = STATIC_CACHE_CONTROL
+        return response
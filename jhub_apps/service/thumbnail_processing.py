@@ -0,0 +1,97 @@
+import asyncio
+import io
+import os
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+import structlog
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from jhub_apps.service.thumbnails import Thumbnail, store_thumbnail
+
+logger = structlog.get_logger(__name__)
+
+# Maximum width/height of the renditions of each thumbnail, the first one is the
+# one referenced by the app, the others are served with /thumbnails/<key>?size=<size>
+THUMBNAIL_SIZES = (640, 320, 160)
+# Encoded size budget of a rendition, the quality and then the dimensions are
+# lowered until it fits
+THUMBNAIL_MAX_BYTES = 100 * 1024
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_MIN_QUALITY = 50
+THUMBNAIL_QUALITY_STEP = 10
+# Uploads larger than this are rejected before being decoded
+THUMBNAIL_MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+THUMBNAIL_MAX_PIXELS = 50_000_000
+THUMBNAIL_MIME_TYPE = "image/webp"
+
+# Decoding and encoding images is CPU bound, so it runs in a small dedicated
+# pool instead of the event loop (or the default pool, shared with I/O)
+_executor = ThreadPoolExecutor(
+    max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="thumbnails"
+)
+
+
+class InvalidThumbnail(ValueError):
+    pass
+
+
+def _open_image(content: bytes) -> Image.Image:
+    if len(content) > THUMBNAIL_MAX_UPLOAD_BYTES:
+        raise InvalidThumbnail(f"Thumbnail is larger than {THUMBNAIL_MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    try:
+        image = Image.open(io.BytesIO(content))
+        if image.width * image.height > THUMBNAIL_MAX_PIXELS:
+            raise InvalidThumbnail(f"Thumbnail has more than {THUMBNAIL_MAX_PIXELS} pixels")
+        # Animated images keep their first frame only
+        image.seek(0)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise InvalidThumbnail(f"Thumbnail is not a valid image: {e}") from e
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    return image.convert("RGBA" if has_alpha else "RGB")
+
+
+def _encode(image: Image.Image, max_size: int) -> bytes:
+    rendition = image.copy()
+    rendition.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    while True:
+        for quality in range(THUMBNAIL_QUALITY, THUMBNAIL_MIN_QUALITY - 1, -THUMBNAIL_QUALITY_STEP):
+            output = io.BytesIO()
+            # Nothing but the pixels is kept: no EXIF, XMP or ICC profile
+            rendition.save(output, format="WEBP", quality=quality, method=4)
+            if output.tell() <= THUMBNAIL_MAX_BYTES:
+                return output.getvalue()
+        if max(rendition.size) <= min(THUMBNAIL_SIZES):
+            return output.getvalue()
+        rendition.thumbnail(
+            (int(rendition.width * 0.75), int(rendition.height * 0.75)), Image.Resampling.LANCZOS
+        )
+
+
+def render_thumbnails(content: bytes) -> typing.Dict[int, Thumbnail]:
+    """Returns the renditions of an uploaded image for each of THUMBNAIL_SIZES,
+    downscaled (never upscaled), stripped of metadata and re-encoded to WebP."""
+    image = _open_image(content)
+    renditions = {}
+    for max_size in THUMBNAIL_SIZES:
+        if max_size < max(image.size) or not renditions:
+            renditions[max_size] = Thumbnail(_encode(image, max_size), THUMBNAIL_MIME_TYPE)
+    return renditions
+
+
+def store_thumbnail_renditions(content: bytes) -> str:
+    """Stores the renditions of an image and returns the URL of the largest one,
+    the others are stored as its variants."""
+    renditions = render_thumbnails(content)
+    largest_size, *smaller_sizes = renditions
+    return store_thumbnail(
+        renditions[largest_size].content,
+        renditions[largest_size].mime_type,
+        variants={size: renditions[size].content for size in smaller_sizes},
+    )
+
+
+async def run_in_thumbnail_executor(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
@@ -0,0 +1,278 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import threading
+import typing
+from pathlib import Path
+
+import structlog
+from cachetools import cached, LRUCache
+
+from jhub_apps.service.static_files import get_service_prefix
+from jhub_apps.spawner.types import FRAMEWORKS, FRAMEWORKS_MAPPING
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_THUMBNAIL_STORE_PATH = "jhub_apps_thumbnails"
+# Thumbnails are served from <service prefix>/thumbnails/<key>
+THUMBNAILS_ROUTE = "/thumbnails"
+THUMBNAIL_KEY_PATTERN = re.compile(r"^(?P<hash>[0-9a-f]{64})(_(?P<size>[0-9]+))?\.(?P<extension>[a-z]+)$")
+THUMBNAIL_MIME_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "avif": "image/avif",
+    "svg": "image/svg+xml",
+}
+THUMBNAIL_EXTENSIONS = {
+    **{mime_type: extension for extension, mime_type in THUMBNAIL_MIME_TYPES.items()},
+    # Produced by encode_file_to_data_url for files with a .jpg extension in older versions
+    "image/jpg": "jpg",
+}
+DATA_URL_PATTERN = re.compile(r"^data:(?P<mime_type>[\w.+-]+/[\w.+-]+);base64,(?P<data>.*)$", re.DOTALL)
+# Apps without a thumbnail of their own reference their framework's logo, e.g.
+# "framework:panel", which is resolved to the URL of the bundled logo when listed
+FRAMEWORK_THUMBNAIL_PREFIX = "framework:"
+FRAMEWORK_LOGOS_ROUTE = "/static/img/logos"
+# Hash of each framework logo, computed once: it versions the logo URLs and
+# recognizes copies of the logos stored by previous versions
+FRAMEWORK_LOGO_HASHES = {
+    framework.name: hashlib.sha256(framework.logo_path.read_bytes()).hexdigest()
+    for framework in FRAMEWORKS
+}
+FRAMEWORKS_BY_LOGO_HASH = {logo_hash: name for name, logo_hash in FRAMEWORK_LOGO_HASHES.items()}
+
+
+class Thumbnail(typing.NamedTuple):
+    content: bytes
+    mime_type: str
+
+
+def get_thumbnail_key(content: bytes, mime_type: str) -> str:
+    """Returns the content-addressed key of a thumbnail: sha256 of the content
+    followed by the extension of its mime type."""
+    extension = THUMBNAIL_EXTENSIONS.get(mime_type)
+    if extension is None:
+        raise ValueError(f"Unsupported thumbnail type: {mime_type}")
+    return f"{hashlib.sha256(content).hexdigest()}.{extension}"
+
+
+def get_variant_key(key: str, size: int) -> str:
+    """Returns the key of the rendition of the given thumbnail for a smaller size."""
+    match = THUMBNAIL_KEY_PATTERN.match(key)
+    return f"{match.group('hash')}_{size}.{match.group('extension')}"
+
+
+class ThumbnailStore:
+    """Base class of the stores of app thumbnails.
+
+    Thumbnails are immutable and keyed by a hash of their content (see
+    ``get_thumbnail_key``), so identical images are only stored once. Subclasses
+    implement ``_read``, ``_write`` and ``exists`` for a storage backend.
+    """
+
+    def put(
+            self,
+            content: bytes,
+            mime_type: str,
+            variants: typing.Optional[typing.Dict[int, bytes]] = None,
+    ) -> str:
+        """Stores a thumbnail, if not already stored, and returns its key.
+
+        ``variants`` are renditions of the thumbnail for smaller sizes (keyed by size),
+        in the same format, stored under ``get_variant_key(key, size)``.
+        """
+        key = get_thumbnail_key(content, mime_type)
+        if self.exists(key):
+            return key
+        # The thumbnail itself is written last, so that its variants exist once it does
+        for size, variant_content in (variants or {}).items():
+            self._write(get_variant_key(key, size), variant_content)
+        self._write(key, content)
+        logger.info("Stored thumbnail", key=key, size=len(content), variants=list(variants or {}))
+        return key
+
+    def get(self, key: str) -> typing.Optional[Thumbnail]:
+        match = THUMBNAIL_KEY_PATTERN.match(key)
+        if not match or match.group("extension") not in THUMBNAIL_MIME_TYPES:
+            return None
+        content = self._read(key)
+        if content is None:
+            return None
+        return Thumbnail(content=content, mime_type=THUMBNAIL_MIME_TYPES[match.group("extension")])
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def _read(self, key: str) -> typing.Optional[bytes]:
+        raise NotImplementedError
+
+    def _write(self, key: str, content: bytes):
+        raise NotImplementedError
+
+
+class LocalThumbnailStore(ThumbnailStore):
+    """Stores thumbnails as files in a local directory, shared by all the service workers."""
+
+    def __init__(self, path: str = DEFAULT_THUMBNAIL_STORE_PATH):
+        self.path = Path(path).absolute()
+
+    def _path(self, key: str) -> Path:
+        # Spread the files over subdirectories, as for git objects
+        return self.path / key[:2] / key
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def _read(self, key: str) -> typing.Optional[bytes]:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, content: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so that concurrent readers (and
+        # workers writing the same thumbnail) never see a partial file
+        temp_path = path.with_name(f".{key}.{os.getpid()}.tmp")
+        temp_path.write_bytes(content)
+        os.replace(temp_path, path)
+
+
+_thumbnail_store: typing.Optional[ThumbnailStore] = None
+
+
+def get_thumbnail_store() -> ThumbnailStore:
+    """Returns the thumbnail store of this process, configured from JAppsConfig."""
+    global _thumbnail_store
+    if _thumbnail_store is None:
+        # Imported here to avoid circular imports, as utils uses the store
+        from jhub_apps.service.utils import get_jupyterhub_config
+        japps_config = get_jupyterhub_config().JAppsConfig
+        _thumbnail_store = japps_config.thumbnail_store_class(japps_config.thumbnail_store_path)
+        logger.info("Created thumbnail store", store=type(_thumbnail_store).__name__)
+    return _thumbnail_store
+
+
+def get_thumbnail_url(key: str) -> str:
+    return f"{get_service_prefix()}{THUMBNAILS_ROUTE}/{key}"
+
+
+def get_framework_thumbnail(framework_name: str) -> typing.Optional[str]:
+    """Returns the reference to the logo of a framework, stored as the thumbnail
+    of apps which don't have one of their own."""
+    if framework_name not in FRAMEWORK_LOGO_HASHES:
+        return None
+    return f"{FRAMEWORK_THUMBNAIL_PREFIX}{framework_name}"
+
+
+def get_framework_logo_url(framework_name: str) -> str:
+    """Returns the URL of the logo of a framework, versioned by its content."""
+    return (
+        f"{get_service_prefix()}{FRAMEWORK_LOGOS_ROUTE}/{FRAMEWORKS_MAPPING[framework_name].logo_path.name}"
+        f"?v={FRAMEWORK_LOGO_HASHES[framework_name][:12]}"
+    )
+
+
+def resolve_thumbnail(thumbnail: typing.Optional[str]) -> typing.Optional[str]:
+    """Returns the URL of a framework logo reference, other thumbnails are returned unchanged."""
+    if thumbnail and thumbnail.startswith(FRAMEWORK_THUMBNAIL_PREFIX):
+        framework_name = thumbnail[len(FRAMEWORK_THUMBNAIL_PREFIX):]
+        if framework_name in FRAMEWORK_LOGO_HASHES:
+            return get_framework_logo_url(framework_name)
+    return thumbnail
+
+
+def get_thumbnail_reference(thumbnail: typing.Optional[str]) -> typing.Optional[str]:
+    """Inverse of ``resolve_thumbnail``: returns the reference to a framework logo
+    given its URL (as sent back by the UI on edit), other thumbnails unchanged."""
+    for framework_name in FRAMEWORK_LOGO_HASHES:
+        if thumbnail == get_framework_logo_url(framework_name):
+            return get_framework_thumbnail(framework_name)
+    return thumbnail
+
+
+def decode_data_url(data_url: str) -> typing.Optional[Thumbnail]:
+    """Returns the content of a base64 data URL, None if it isn't one."""
+    match = DATA_URL_PATTERN.match(data_url or "")
+    if not match:
+        return None
+    try:
+        content = base64.b64decode(match.group("data"), validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return Thumbnail(content=content, mime_type=match.group("mime_type"))
+
+
+def store_thumbnail(
+        content: bytes,
+        mime_type: str,
+        variants: typing.Optional[typing.Dict[int, bytes]] = None,
+) -> str:
+    """Stores a thumbnail and returns the URL it is served from."""
+    return get_thumbnail_url(get_thumbnail_store().put(content, mime_type, variants=variants))
+
+
+@cached(
+    cache=LRUCache(maxsize=4096),
+    # Keyed by a hash of the data URL, so that the cache doesn't hold the images
+    key=lambda data_url: hashlib.sha256(data_url.encode()).hexdigest(),
+    lock=threading.Lock(),
+)
+def _store_data_url(data_url: str) -> typing.Optional[str]:
+    # Imported here to avoid circular imports, as thumbnail_processing uses the store
+    from jhub_apps.service.thumbnail_processing import InvalidThumbnail, store_thumbnail_renditions
+    decoded = decode_data_url(data_url)
+    if decoded is None or decoded.mime_type not in THUMBNAIL_EXTENSIONS:
+        return None
+    # Copies of the default framework logos are served from the bundled logo
+    framework_name = FRAMEWORKS_BY_LOGO_HASH.get(hashlib.sha256(decoded.content).hexdigest())
+    if framework_name is not None:
+        return get_framework_logo_url(framework_name)
+    if decoded.mime_type == "image/svg+xml":
+        return store_thumbnail(decoded.content, decoded.mime_type)
+    try:
+        # Downscaled and re-encoded, as uploaded thumbnails
+        return store_thumbnail_renditions(decoded.content)
+    except InvalidThumbnail as e:
+        logger.warning("Failed to migrate thumbnail, keeping it as data url", error=str(e))
+        return None
+
+
+def migrate_thumbnail(thumbnail: typing.Optional[str]) -> typing.Optional[str]:
+    """Moves a thumbnail stored as a data URL (as done by previous versions) to the
+    thumbnail store and returns its URL. Framework logo references are resolved to
+    their URL, other thumbnails are returned unchanged.
+
+    Each data URL is only decoded and stored once per process.
+    """
+    if not thumbnail or not thumbnail.startswith("data:"):
+        return resolve_thumbnail(thumbnail)
+    return _store_data_url(thumbnail) or thumbnail
+
+
+def with_thumbnail_url(server: dict) -> dict:
+    """Returns a copy of a Hub server model with its thumbnail migrated or resolved to a URL."""
+    user_options = server.get("user_options") or {}
+    thumbnail = user_options.get("thumbnail")
+    migrated_thumbnail = migrate_thumbnail(thumbnail)
+    if migrated_thumbnail == thumbnail:
+        return server
+    return {**server, "user_options": {**user_options, "thumbnail": migrated_thumbnail}}
+
+
+def with_users_thumbnail_urls(users: typing.List[dict]) -> typing.List[dict]:
+    """Returns copies of Hub user models with the thumbnails of their servers migrated to URLs."""
+    return [
+        {
+            **user,
+            "servers": {
+                name: with_thumbnail_url(server) for name, server in (user.get("servers") or {}).items()
+            },
+        }
+        for user in users
+    ]
@@ -0,0 +1,81 @@
+import hashlib
+import typing
+
+import structlog
+from cachetools import TTLCache
+
+from jhub_apps.service.models import User
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_USER_CACHE_TTL = 30
+DEFAULT_USER_CACHE_MAXSIZE = 1024
+
+
+def _token_key(token: str) -> str:
+    # The raw token is never kept in memory as a key
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class UserCache:
+    """Per-process cache of users resolved from a Hub token.
+
+    Entries expire after ``ttl`` seconds and the least recently used entries are
+    dropped once ``maxsize`` is reached. This is only accessed from the event loop,
+    so no locking is required.
+    """
+
+    def __init__(self, ttl: int = DEFAULT_USER_CACHE_TTL, maxsize: int = DEFAULT_USER_CACHE_MAXSIZE):
+        self.ttl = ttl
+        self._users: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, token: str) -> typing.Optional[User]:
+        if not self.ttl:
+            return None
+        user = self._users.get(_token_key(token))
+        # Return a copy, so that callers can't modify the cached user
+        return user.model_copy() if user is not None else None
+
+    def set(self, token: str, user: User):
+        if not self.ttl:
+            return
+        self._users[_token_key(token)] = user.model_copy()
+
+    def evict_token(self, token: str):
+        self._users.pop(_token_key(token), None)
+
+    def evict_user(self, username: str):
+        """Evicts all the cached entries of the given user, e.g. when the Hub
+        rejected a request made on behalf of the user"""
+        keys = [key for key, user in list(self._users.items()) if user.name == username]
+        for key in keys:
+            self._users.pop(key, None)
+        if keys:
+            logger.info("Evicted user from cache", username=username, entries=len(keys))
+
+    def clear(self):
+        self._users.clear()
+
+
+_user_cache: typing.Optional[UserCache] = None
+
+
+def get_user_cache() -> UserCache:
+    """Returns the process wide user cache, configured from JAppsConfig."""
+    global _user_cache
+    if _user_cache is None:
+        # Imported here to avoid circular imports, as utils imports the hub client
+        from jhub_apps.service.utils import get_jupyterhub_config
+        config = get_jupyterhub_config()
+        _user_cache = UserCache(
+            ttl=config.JAppsConfig.user_cache_ttl,
+            maxsize=config.JAppsConfig.user_cache_maxsize,
+        )
+        logger.info("Created user cache", ttl=_user_cache.ttl)
+    return _user_cache
+
+
+def evict_user_from_cache(username: str):
+    """Evicts the given user from the user cache, if it has been created."""
+    if _user_cache is not None:
+        _user_cache.evict_user(username)
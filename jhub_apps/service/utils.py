@@ -1,25 +1,35 @@
 import base64
-import itertools
+import hashlib
+import json
 
 import structlog
-import os
+import typing
 
-from cachetools import cached, TTLCache
 from unittest.mock import Mock
 
 from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
 from jupyterhub.app import JupyterHub
 from traitlets.config import LazyConfigValue
 
 from jhub_apps.config_utils import JAppsConfig
-from jhub_apps.hub_client.hub_client import HubClient
+from jhub_apps.hub_client.async_hub_client import AsyncHubClient
+from jhub_apps.service.app_metadata import get_app_metadata_store, with_app_metadata
+from jhub_apps.service.config_provider import JupyterHubConfigProvider
 from jhub_apps.service.models import UserOptions
-from jhub_apps.spawner.types import FrameworkConf, FRAMEWORKS_MAPPING, FRAMEWORKS
+from jhub_apps.service.server_snapshot import get_server_snapshot
+from jhub_apps.service.thumbnail_processing import (
+    THUMBNAIL_MAX_UPLOAD_BYTES,
+    InvalidThumbnail,
+    run_in_thumbnail_executor,
+    store_thumbnail_renditions,
+)
+from jhub_apps.service.thumbnails import get_framework_thumbnail, store_thumbnail
+from jhub_apps.spawner.types import FRAMEWORKS
 from jhub_apps import themes
 from slugify import slugify
 
 
-CACHE_JUPYTERHUB_CONFIG_TIMEOUT = 180
 logger = structlog.get_logger(__name__)
 
 def _replace_JAppsConfig_config_with_validated_config(config, validated_config):
@@ -38,20 +48,37 @@ def _replace_JAppsConfig_config_with_validated_config(config, validated_config):
         setattr(config, trait_name, getattr(validated_config, trait_name))
 
 
-# Cache JupyterHub config as it might be an expensive operation
-@cached(cache=TTLCache(maxsize=1024, ttl=CACHE_JUPYTERHUB_CONFIG_TIMEOUT))
-def get_jupyterhub_config():
+def _load_jupyterhub_config(jhub_config_file_path):
     hub = JupyterHub()
-    jhub_config_file_path = os.environ["JHUB_JUPYTERHUB_CONFIG"]
     logger.info(f"Getting JHub config from file: {jhub_config_file_path}")
     hub.load_config_file(jhub_config_file_path)
-    japps_config = JAppsConfig.instance(config=hub.config)
+    # A new instance rather than the singleton, which would keep the values of the first load
+    japps_config = JAppsConfig(config=hub.config)
     _replace_JAppsConfig_config_with_validated_config(hub.config.JAppsConfig, japps_config)
     config = hub.config
     logger.debug(f"JHub Apps config: {config.JAppsConfig}")
     return config
 
 
+# Loading the JupyterHub config executes jupyterhub_config.py, it is only done again
+# when the file changes or on an explicit reload
+jupyterhub_config_provider = JupyterHubConfigProvider(loader=_load_jupyterhub_config)
+
+
+def get_jupyterhub_config():
+    return jupyterhub_config_provider.get()
+
+
+def get_jupyterhub_config_version() -> str:
+    """Returns the version of the JupyterHub config (hash of its file), which changes when it is reloaded."""
+    get_jupyterhub_config()
+    return jupyterhub_config_provider.version
+
+
+def reload_jupyterhub_config():
+    return jupyterhub_config_provider.reload()
+
+
 def get_conda_envs(config, user):
     """This will extract conda environment from the JupyterHub config"""
     if isinstance(config.JAppsConfig.conda_envs, list):
@@ -120,45 +147,73 @@ async def get_spawner_profiles(config, auth_state=None):
         )
 
 
-def encode_file_to_data_url(filename, file_contents) -> str:
-    """Converts image file to data url to display in browser."""
-    base64_encoded = base64.b64encode(file_contents)
+def get_mime_type(filename) -> str:
     filename_ = filename.lower()
     if filename_.endswith(".jpg") or filename_.endswith(".jpeg"):
-        mime_type = "image/jpeg"
+        return "image/jpeg"
     elif filename_.endswith('.svg'):
-        mime_type = "image/svg+xml"
+        return "image/svg+xml"
     else:
         file_extension = filename_.split('.')[-1]
-        mime_type = f"image/{file_extension}"
+        return f"image/{file_extension}"
+
+
+def encode_file_to_data_url(filename, file_contents) -> str:
+    """Converts image file to data url to display in browser."""
+    base64_encoded = base64.b64encode(file_contents)
+    mime_type = get_mime_type(filename)
     data_url = f"data:{mime_type};base64,{base64_encoded.decode('utf-8')}"
     return data_url
 
 
-def get_default_thumbnail(framework_name) -> str:
-    framework: FrameworkConf = FRAMEWORKS_MAPPING.get(framework_name)
-    thumbnail_path = framework.logo_path
-    return encode_file_to_data_url(
-        filename=thumbnail_path.name, file_contents=thumbnail_path.read_bytes()
-    )
+async def save_thumbnail_contents(filename, thumbnail_contents) -> str:
+    """Saves an image to the thumbnail store and returns the URL it is served from.
+    Raster images are downscaled and re-encoded first, vector images are kept as is."""
+    mime_type = get_mime_type(filename)
+    if mime_type == "image/svg+xml":
+        if len(thumbnail_contents) > THUMBNAIL_MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                detail=f"Thumbnail is larger than {THUMBNAIL_MAX_UPLOAD_BYTES // (1024 * 1024)} MB",
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return await run_in_thumbnail_executor(store_thumbnail, thumbnail_contents, mime_type)
+    try:
+        return await run_in_thumbnail_executor(store_thumbnail_renditions, thumbnail_contents)
+    except InvalidThumbnail as e:
+        raise HTTPException(
+            detail=str(e),
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
 
 
-async def get_thumbnail_data_url(framework_name, thumbnail):
-    logger.info("Getting thumbnail data url", framework=framework_name)
-    if thumbnail:
-        logger.info("Got user provided thumbnail")
-        thumbnail_contents = await thumbnail.read()
-        thumbnail_data_url = encode_file_to_data_url(
-            thumbnail.filename, thumbnail_contents
-        )
-    else:
-        logger.info("Getting default thumbnail")
-        framework: FrameworkConf = FRAMEWORKS_MAPPING.get(framework_name)
-        thumbnail_path = framework.logo_path
-        thumbnail_data_url = encode_file_to_data_url(
-            filename=thumbnail_path.name, file_contents=thumbnail_path.read_bytes()
-        )
-    return thumbnail_data_url
+async def save_thumbnail(framework_name, thumbnail) -> str:
+    """Saves the uploaded thumbnail to the thumbnail store and returns the URL it is
+    served from. Without one, returns a reference to the framework's logo."""
+    logger.info("Saving thumbnail", framework=framework_name)
+    if not thumbnail:
+        logger.info("Using default thumbnail")
+        return get_framework_thumbnail(framework_name)
+    logger.info("Got user provided thumbnail")
+    return await save_thumbnail_contents(thumbnail.filename, await thumbnail.read())
+
+
+def get_etag(*values) -> str:
+    """Returns a strong ETag of JSON serializable values, e.g. the Hub models a
+    response is built from, so that it can be compared before building the response."""
+    serialized = json.dumps(values, sort_keys=True, separators=(",", ":"), default=str)
+    return f'"{hashlib.sha256(serialized.encode()).hexdigest()}"'
+
+
+def etag_matches(if_none_match: typing.Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match request header matches the ETag of the current response."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    return etag.removeprefix("W/") in {
+        candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")
+    }
 
 
 def get_theme(config):
@@ -276,25 +331,46 @@ def get_theme_css(config):
     return "\n".join(lines) + "\n"
 
 
-def get_shared_servers(current_hub_user):
-    # Filter servers shared with the user
-    hub_client_service = HubClient()
-    all_users_servers = list(itertools.chain.from_iterable([
-        list(user['servers'].values()) for user in hub_client_service.get_users()
-    ]))
-    user_servers_without_default_jlab = list(filter(lambda server: server["name"] != "", all_users_servers))
-    hub_client_user = HubClient(username=current_hub_user['name'])
-    shared_servers = hub_client_user.get_shared_servers()
-    shared_server_names = {
-        shared_server["server"]["name"] for shared_server in shared_servers
-        # remove shared apps by current user
-        if shared_server["server"]["user"]["name"] != current_hub_user['name']
-    }
-    shared_servers_rich = [
-        server for server in user_servers_without_default_jlab
-        if server["name"] in shared_server_names
+async def get_shared_server_keys(username: str) -> typing.List[typing.Tuple[str, str]]:
+    """Returns the (owner, servername) pairs of the servers shared with the given user
+    by other users, leaving out default JupyterLab servers."""
+    shared_servers = await AsyncHubClient(username=username).get_shared_servers()
+    return list(dict.fromkeys(
+        (shared_server["server"]["user"]["name"], shared_server["server"]["name"])
+        for shared_server in shared_servers
+        # remove shared apps by current user and default JupyterLab servers
+        if shared_server["server"]["user"]["name"] != username
+        and shared_server["server"]["name"] != ""
+    ))
+
+
+async def get_shared_servers(current_hub_user):
+    """Returns the servers shared with the given user by other users.
+
+    Only the (owner, servername) pairs of the share listing are resolved: from the
+    server snapshot when it is enabled, the owners of the servers missing from it
+    (e.g. just created) are fetched from the Hub. The servers include the user
+    options edited in place.
+    """
+    shared_server_keys = await get_shared_server_keys(current_hub_user['name'])
+    if not shared_server_keys:
+        return []
+    servers = {}
+    server_snapshot = get_server_snapshot()
+    if server_snapshot.ttl:
+        users = await server_snapshot.get_users()
+        for owner, servername in shared_server_keys:
+            server = users.get(owner, {}).get("servers", {}).get(servername)
+            if server is not None:
+                servers[(owner, servername)] = server
+    missing_server_keys = [key for key in shared_server_keys if key not in servers]
+    if missing_server_keys:
+        servers.update(await AsyncHubClient().get_servers(missing_server_keys))
+    app_metadata = await run_in_threadpool(get_app_metadata_store().get_all)
+    return [
+        with_app_metadata(servers[key], app_metadata, owner=key[0])
+        for key in shared_server_keys if key in servers
     ]
-    return shared_servers_rich
 
 
 def _check_if_framework_allowed(user_options: UserOptions):
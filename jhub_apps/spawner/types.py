@@ -4,7 +4,7 @@ from pathlib import Path
 
 HERE = Path(__file__).parent.parent.resolve()
 
-LOGO_BASE_PATH = "/services/japps/static/img/logos/",
+LOGO_BASE_PATH = "/services/japps/static/img/logos"
 STATIC_PATH = HERE.joinpath("static/img/logos")
 
 
@@ -3,7 +3,8 @@ from itertools import groupby
 import signal
 import structlog
 
-from jhub_apps.hub_client.hub_client import HubClient
+from jhub_apps.hub_client.async_hub_client import AsyncHubClient
+from jhub_apps.service.client import close_client, init_client
 from jhub_apps.service.logging_utils import setup_logging
 from jhub_apps.service.models import StartupApp
 from jhub_apps.service.utils import get_jupyterhub_config
@@ -22,6 +23,7 @@ async def async_main():
             loop.add_signal_handler(sig, lambda s=sig: asyncio.create_task(shutdown(s)))
   
         config = get_jupyterhub_config()
+        init_client(config)
         startup_apps_list = config.JAppsConfig.startup_apps
 
         # Group user options by username
@@ -52,6 +54,8 @@ async def async_main():
 
     except asyncio.CancelledError:
         logger.info("Shutdown requested")
+    finally:
+        await close_client()
 
 
 async def instantiate_startup_apps(
@@ -60,8 +64,8 @@ async def instantiate_startup_apps(
     # Let FastAPI continue to set up
     await asyncio.sleep(1)
 
-    hub_client = HubClient(username=username)
-    existing_servers = hub_client.get_server(username=username)
+    hub_client = AsyncHubClient(username=username)
+    existing_servers = await hub_client.get_server(username=username)
     for startup_app in user_apps_list:
         user_options = startup_app.user_options
         normalized_servername = startup_app.normalized_servername
@@ -69,34 +73,34 @@ async def instantiate_startup_apps(
         # delete server if it exists
         while normalized_servername in existing_servers:
             logger.info(f"Deleting server {normalized_servername}")
-            hub_client.delete_server(
+            await hub_client.delete_server(
                 username, normalized_servername, remove=True
             )
             await asyncio.sleep(1)
-            existing_servers = hub_client.get_server(username=username)
+            existing_servers = await hub_client.get_server(username=username)
 
         # create the server
         logger.info(f"Creating server {normalized_servername}")
         while normalized_servername not in existing_servers:
-            hub_client.create_server(
+            await hub_client.create_server(
                 username=username,
                 servername=normalized_servername,
                 user_options=user_options,
             )
             await asyncio.sleep(1)
-            existing_servers = hub_client.get_server(username=username)
+            existing_servers = await hub_client.get_server(username=username)
 
         # turn off the server
         logger.info(f"Stopping server {normalized_servername}")
         while not existing_servers[normalized_servername]["stopped"]:
-            status_code = hub_client.delete_server(
+            status_code = await hub_client.delete_server(
                 username, normalized_servername, remove=False
             )
             if status_code == 204:
                 # server stopped successfully
                 break
             await asyncio.sleep(1)
-            existing_servers = hub_client.get_server(username=username)
+            existing_servers = await hub_client.get_server(username=username)
 
 
 async def shutdown(sig):
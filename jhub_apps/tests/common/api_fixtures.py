@@ -25,3 +25,22 @@ def client():
     app.dependency_overrides[get_current_user] = mock_get_user_name
     return TestClient(app=app)
 
+
+
+@pytest.fixture
+def thumbnail_store(tmp_path, monkeypatch):
+    from jhub_apps.service import thumbnails
+    store = thumbnails.LocalThumbnailStore(str(tmp_path / "thumbnails"))
+    monkeypatch.setattr(thumbnails, "_thumbnail_store", store)
+    # Data URLs migrated by previous tests are in their stores
+    thumbnails._store_data_url.cache_clear()
+    return store
+
+
+@pytest.fixture(autouse=True)
+def app_metadata_store(tmp_path, monkeypatch):
+    from jhub_apps.service import app_metadata
+    store = app_metadata.AppMetadataStore(str(tmp_path / "app_metadata.sqlite"))
+    monkeypatch.setattr(app_metadata, "_app_metadata_store", store)
+    yield store
+    store.close()
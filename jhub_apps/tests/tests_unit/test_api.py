@@ -1,13 +1,23 @@
+import asyncio
+import base64
 import io
 import json
 from unittest.mock import patch, Mock
 
 import pytest
-
-from jhub_apps.hub_client.hub_client import HubClient
-from jhub_apps.service.models import UserOptions, ServerCreation, Repository
+from PIL import Image
+from traitlets.config import Config
+
+from jhub_apps.hub_client.async_hub_client import AsyncHubClient
+from jhub_apps.service.app_metadata import UserOptionsChanges, classify_changes
+from jhub_apps.service.models import UserOptions, ServerCreation, Repository, SharePermissions, ShareResult
+from jhub_apps.service.server_snapshot import ServerSnapshot
+from jhub_apps.service.thumbnail_processing import THUMBNAIL_SIZES, render_thumbnails
+from jhub_apps.service.thumbnails import get_framework_logo_url, get_thumbnail_key, get_thumbnail_url
+from jhub_apps.service.runtime_artifacts import render_runtime_artifacts, select_encoding
+from jhub_apps.service.static_files import IMMUTABLE_CACHE_CONTROL, STATIC_CACHE_CONTROL, get_asset_url
 from jhub_apps.service.utils import get_runtime_config, get_shared_servers, get_theme_css
-from jhub_apps.spawner.types import FRAMEWORKS, Framework
+from jhub_apps.spawner.types import FRAMEWORKS, FRAMEWORKS_MAPPING, Framework
 from jhub_apps.tests.common.constants import MOCK_USER
 
 MOCK_ALLOW_ALL_FRAMEWORKS_CONFIG = Mock(
@@ -18,6 +28,17 @@ MOCK_ALLOW_ALL_FRAMEWORKS_CONFIG = Mock(
 )
 
 
+def image_bytes(width, height, image_format="PNG"):
+    output = io.BytesIO()
+    Image.linear_gradient("L").resize((width, height)).convert("RGB").save(output, format=image_format)
+    return output.getvalue()
+
+
+def expected_thumbnail_url(content):
+    largest_rendition = render_thumbnails(content)[THUMBNAIL_SIZES[0]]
+    return get_thumbnail_url(get_thumbnail_key(largest_rendition.content, largest_rendition.mime_type))
+
+
 def mock_user_options():
     user_options = {
         "jhub_app": True,
@@ -43,7 +64,7 @@ def mock_user_options():
     return user_options
 
 
-@patch.object(HubClient, "get_user")
+@patch.object(AsyncHubClient, "get_user")
 def test_api_get_server(get_user, client):
     server_data = {"panel-app": {}}
     get_users_response = {'name': 'jovyan', 'servers': server_data}
@@ -54,7 +75,7 @@ def test_api_get_server(get_user, client):
     assert response.json() == server_data["panel-app"]
 
 
-@patch.object(HubClient, "get_user")
+@patch.object(AsyncHubClient, "get_user")
 def test_api_get_server_not_found(get_user, client):
     server_data = {"panel-app": {}}
     get_users_response = {'name': 'jovyan', 'servers': server_data}
@@ -68,14 +89,14 @@ def test_api_get_server_not_found(get_user, client):
 
 
 @patch("jhub_apps.service.utils.get_jupyterhub_config")
-@patch.object(HubClient, "create_server")
-def test_api_create_server(create_server, get_jupyterhub_config, client):
+@patch.object(AsyncHubClient, "create_server")
+def test_api_create_server(create_server, get_jupyterhub_config, client, thumbnail_store):
     from jhub_apps.service.models import UserOptions
     get_jupyterhub_config.return_value = MOCK_ALLOW_ALL_FRAMEWORKS_CONFIG
     create_server_response = {"user": "jovyan"}
     create_server.return_value = create_server_response
     user_options = mock_user_options()
-    thumbnail = b"contents of thumbnail"
+    thumbnail = image_bytes(800, 600, "JPEG")
     in_memory_file = io.BytesIO(thumbnail)
     response = client.post(
         "/server",
@@ -83,7 +104,8 @@ def test_api_create_server(create_server, get_jupyterhub_config, client):
         files={'thumbnail': ('image.jpeg', in_memory_file)}
     )
     final_user_options = UserOptions(**user_options)
-    final_user_options.thumbnail = "data:image/jpeg;base64,Y29udGVudHMgb2YgdGh1bWJuYWls"
+    final_user_options.thumbnail = expected_thumbnail_url(thumbnail)
+    assert thumbnail_store.exists(final_user_options.thumbnail.split("/")[-1])
     create_server.assert_called_once_with(
         username=MOCK_USER.name,
         servername="panel-app",
@@ -93,7 +115,7 @@ def test_api_create_server(create_server, get_jupyterhub_config, client):
     assert response.json() == create_server_response
 
 
-@patch.object(HubClient, "start_server")
+@patch.object(AsyncHubClient, "start_server")
 def test_api_start_server(create_server, client):
     start_server_response = Mock(status_code=200)
     create_server.return_value = start_server_response
@@ -108,7 +130,7 @@ def test_api_start_server(create_server, client):
     assert response.status_code == 200
 
 
-@patch.object(HubClient, "start_server")
+@patch.object(AsyncHubClient, "start_server")
 def test_api_start_server_404(start_server, client):
     start_server_response = Mock(status_code=404)
     start_server.return_value = start_server_response
@@ -127,7 +149,7 @@ def test_api_start_server_404(start_server, client):
     ('delete', True,),
     ('stop', False,),
 ])
-@patch.object(HubClient, "delete_server")
+@patch.object(AsyncHubClient, "delete_server")
 def test_api_delete_server(delete_server, name, remove, client):
     create_server_response = {"user": "jovyan"}
     delete_server.return_value = create_server_response
@@ -142,14 +164,15 @@ def test_api_delete_server(delete_server, name, remove, client):
 
 
 @patch("jhub_apps.service.utils.get_jupyterhub_config")
-@patch.object(HubClient, "edit_server")
-def test_api_update_server(edit_server, get_jupyterhub_config, client):
+@patch.object(AsyncHubClient, "get_server", return_value=None)
+@patch.object(AsyncHubClient, "edit_server")
+def test_api_update_server(edit_server, get_server, get_jupyterhub_config, client, thumbnail_store):
     from jhub_apps.service.models import UserOptions
     get_jupyterhub_config.return_value = MOCK_ALLOW_ALL_FRAMEWORKS_CONFIG
     create_server_response = {"user": "jovyan"}
     edit_server.return_value = create_server_response
     user_options = mock_user_options()
-    thumbnail = b"contents of thumbnail"
+    thumbnail = image_bytes(800, 600, "JPEG")
     in_memory_file = io.BytesIO(thumbnail)
     response = client.put(
         "/server/panel-app",
@@ -157,7 +180,7 @@ def test_api_update_server(edit_server, get_jupyterhub_config, client):
         files={'thumbnail': ('image.jpeg', in_memory_file)}
     )
     final_user_options = UserOptions(**user_options)
-    final_user_options.thumbnail = "data:image/jpeg;base64,Y29udGVudHMgb2YgdGh1bWJuYWls"
+    final_user_options.thumbnail = expected_thumbnail_url(thumbnail)
     edit_server.assert_called_once_with(
         username=MOCK_USER.name,
         servername="panel-app",
@@ -167,43 +190,70 @@ def test_api_update_server(edit_server, get_jupyterhub_config, client):
     assert response.json() == create_server_response
 
 
-@patch.object(HubClient, "get_users")
-@patch.object(HubClient, "get_shared_servers")
-def test_shared_server_filtering(hub_get_shared_servers, get_users):
+@patch("jhub_apps.service.utils.get_server_snapshot", new=lambda: ServerSnapshot())
+@patch.object(AsyncHubClient, "get_users_page")
+@patch.object(AsyncHubClient, "get_shared_servers")
+def test_shared_server_filtering(hub_get_shared_servers, get_users_page):
     current_hub_user = {"name": "fakeuser"}
-    get_users.return_value = [
+    users = [
         {
+            "name": "fakeuser",
             "servers": {
                 '': {'name': ''},
                 "panel-12": {"name": "panel-12"}
             }
         },
         {
+            "name": "another-user",
             "servers": {
                 '': {'name': ''},
                 "panel-34": {"name": "panel-34", "fullname": "panel shared 34"}
             }
         },
         {
+            "name": "third-user",
             "servers": {
                 '': {'name': ''},
-                "panel-56": {"name": "panel-56", "fullname": "panel shared server"}
+                "panel-56": {"name": "panel-56", "fullname": "panel shared server"},
+                # Same name as a server shared by another-user, but not shared
+                "panel-34": {"name": "panel-34", "fullname": "not shared"},
             }
         }
     ]
+    get_users_page.return_value = {"items": users, "_pagination": {"next": None}, "etag": None}
     hub_get_shared_servers.return_value = [
-        {"server": {"name": "panel-56", "user": {"name": "another-user"}}},
+        {"server": {"name": "panel-56", "user": {"name": "third-user"}}},
         {"server": {"name": "panel-34", "user": {"name": "another-user"}}},
         {"server": {"name": "panel-23", "user": {"name": "fakeuser"}}},
         {"server": {"name": "panel-42", "user": {"name": "fakeuser"}}},
     ]
-    shared_servers = get_shared_servers(current_hub_user)
+    shared_servers = asyncio.run(get_shared_servers(current_hub_user))
     assert shared_servers == [
+        {"name": "panel-56", "fullname": "panel shared server"},
         {"name": "panel-34", "fullname": "panel shared 34"},
-        {"name": "panel-56", "fullname": "panel shared server"}
     ]
     hub_get_shared_servers.assert_called_once_with()
-    get_users.assert_called_once_with()
+    get_users_page.assert_called_once_with(offset=0, etag=None)
+
+
+@patch("jhub_apps.service.utils.get_server_snapshot", new=lambda: ServerSnapshot(ttl=0))
+@patch.object(AsyncHubClient, "_get_user_model")
+@patch.object(AsyncHubClient, "get_users_page")
+@patch.object(AsyncHubClient, "get_shared_servers")
+def test_shared_servers_fetches_only_owners(hub_get_shared_servers, get_users_page, get_user_model):
+    owners = {
+        "another-user": {"name": "another-user", "servers": {"panel-34": {"name": "panel-34"}}},
+        "third-user": {"name": "third-user", "servers": {"panel-34": {"name": "panel-34", "fullname": "3"}}},
+    }
+    get_user_model.side_effect = lambda owner: owners.get(owner)
+    hub_get_shared_servers.return_value = [
+        {"server": {"name": "panel-34", "user": {"name": "third-user"}}},
+        {"server": {"name": "deleted-app", "user": {"name": "deleted-user"}}},
+    ]
+    shared_servers = asyncio.run(get_shared_servers({"name": "fakeuser"}))
+    assert shared_servers == [{"name": "panel-34", "fullname": "3"}]
+    assert sorted(call.args[0] for call in get_user_model.call_args_list) == ["deleted-user", "third-user"]
+    get_users_page.assert_not_called()
 
 
 @pytest.mark.parametrize("allowed_frameworks, blocked_frameworks,", [
@@ -313,11 +363,12 @@ def test_open_api_docs(client):
 
 
 @patch("jhub_apps.service.utils.get_jupyterhub_config")
-@patch.object(HubClient, "create_server")
+@patch.object(AsyncHubClient, "create_server")
 def test_create_server_with_git_repository(
         hub_create_server,
         get_jupyterhub_config,
         client,
+        thumbnail_store,
 ):
     get_jupyterhub_config.return_value = Mock(
         JAppsConfig=Mock(
@@ -337,13 +388,435 @@ def test_create_server_with_git_repository(
         )
     )
     server_data = ServerCreation(servername="test server", user_options=user_options)
-    files = {"thumbnail": ("test.png", b"dummy image data", "image/png")}
+    files = {"thumbnail": ("test.png", image_bytes(100, 100), "image/png")}
     data = {"data": server_data.model_dump_json()}
     hub_create_server.return_value = (201, 'test-server-abcdef')
     response = client.post("/server", data=data, files=files)
     assert response.status_code == 200
     assert response.json() == [201, 'test-server-abcdef']
+    user_options.thumbnail = expected_thumbnail_url(image_bytes(100, 100))
     hub_create_server.assert_called_once_with(
         username="jovyan", servername=server_data.servername,
         user_options=user_options
     )
+
+
+@patch("jhub_apps.service.routes.is_jupyterhub_5", new=lambda: True)
+@patch.object(AsyncHubClient, "update_server_sharing")
+@patch.object(AsyncHubClient, "get_server")
+def test_api_update_server_sharing(get_server, update_server_sharing, client):
+    get_server.return_value = {"name": "panel-app", "user_options": {"framework": "panel"}}
+    update_server_sharing.return_value = [
+        ShareResult(name="alice", kind="user", action="share", status_code=200),
+    ]
+    response = client.put("/server/panel-app/shares", json={"users": ["alice"], "groups": []})
+    assert response.status_code == 200
+    assert response.json()["results"] == [{
+        "name": "alice", "kind": "user", "action": "share",
+        "success": True, "status_code": 200, "error": None,
+    }]
+    update_server_sharing.assert_called_once_with(
+        MOCK_USER.name, "panel-app", SharePermissions(users=["alice"], groups=[])
+    )
+
+
+@patch("jhub_apps.service.routes.is_jupyterhub_5", new=lambda: True)
+@patch.object(AsyncHubClient, "get_user")
+@patch.object(AsyncHubClient, "get_server_shares")
+@patch.object(AsyncHubClient, "update_server_sharing")
+@patch.object(AsyncHubClient, "get_server")
+def test_api_update_server_sharing_shown_in_user_options(
+        get_server, update_server_sharing, get_server_shares, get_user, client,
+):
+    server = {
+        "name": "panel-app",
+        "user_options": {"framework": "panel", "share_with": {"users": ["bob"], "groups": []}},
+    }
+    get_server.return_value = server
+    get_user.return_value = {"name": MOCK_USER.name, "servers": {"panel-app": server}}
+    update_server_sharing.return_value = [
+        ShareResult(name="alice", kind="user", action="share", status_code=200),
+        ShareResult(name="bob", kind="user", action="revoke", status_code=204),
+    ]
+    response = client.put("/server/panel-app/shares", json={"users": ["alice"], "groups": ["alpha"]})
+    assert response.status_code == 200
+    user_options = client.get("/server/panel-app").json()["user_options"]
+    assert user_options["share_with"] == {"users": ["alice"], "groups": ["alpha"]}
+    get_server_shares.assert_not_called()
+    # When some shares fail, the ones actually in place are shown
+    update_server_sharing.return_value = [
+        ShareResult(name="carol", kind="user", action="share", success=False, status_code=404),
+    ]
+    get_server_shares.return_value = SharePermissions(users=["alice"], groups=["alpha"])
+    client.put("/server/panel-app/shares", json={"users": ["alice", "carol"], "groups": ["alpha"]})
+    user_options = client.get("/server/panel-app").json()["user_options"]
+    assert user_options["share_with"] == {"users": ["alice"], "groups": ["alpha"]}
+
+
+@patch("jhub_apps.service.routes.is_jupyterhub_5", new=lambda: True)
+@patch.object(AsyncHubClient, "get_server")
+def test_api_update_server_sharing_not_found(get_server, client):
+    get_server.return_value = None
+    response = client.put("/server/missing-app/shares", json={"users": ["alice"], "groups": []})
+    assert response.status_code == 404
+
+
+def test_api_get_thumbnail(client, thumbnail_store):
+    key = thumbnail_store.put(b"png contents", "image/png")
+    response = client.get(f"/thumbnails/{key}")
+    assert response.status_code == 200
+    assert response.content == b"png contents"
+    assert response.headers["content-type"] == "image/png"
+    assert "immutable" in response.headers["cache-control"]
+    cached_response = client.get(f"/thumbnails/{key}", headers={"If-None-Match": response.headers["etag"]})
+    assert cached_response.status_code == 304
+    assert client.get("/thumbnails/" + "0" * 64 + ".png").status_code == 404
+
+
+@patch.object(AsyncHubClient, "get_user")
+def test_api_get_server_migrates_data_url_thumbnails(get_user, client, thumbnail_store):
+    content = image_bytes(1000, 500)
+    get_user.return_value = {
+        "name": MOCK_USER.name,
+        "servers": {
+            "panel-app": {
+                "name": "panel-app",
+                "user_options": {"thumbnail": f"data:image/png;base64,{base64.b64encode(content).decode()}"},
+            },
+        },
+    }
+    with patch.object(thumbnail_store, "put", wraps=thumbnail_store.put) as put:
+        for _ in range(3):
+            response = client.get("/server/panel-app")
+            assert response.status_code == 200
+            # Downscaled and re-encoded, as uploaded thumbnails
+            assert response.json()["user_options"]["thumbnail"] == expected_thumbnail_url(content)
+    # Stored on the first request only
+    put.assert_called_once()
+
+
+@patch.object(AsyncHubClient, "get_user")
+def test_api_get_server_keeps_invalid_data_url_thumbnails(get_user, client, thumbnail_store):
+    thumbnail = "data:image/png;base64,cG5n"
+    get_user.return_value = {
+        "name": MOCK_USER.name,
+        "servers": {"panel-app": {"name": "panel-app", "user_options": {"thumbnail": thumbnail}}},
+    }
+    response = client.get("/server/panel-app")
+    assert response.status_code == 200
+    assert response.json()["user_options"]["thumbnail"] == thumbnail
+
+
+def test_api_get_thumbnail_rendition(client, thumbnail_store):
+    key = thumbnail_store.put(b"large", "image/webp", variants={320: b"medium", 160: b"small"})
+    assert client.get(f"/thumbnails/{key}?size=200").content == b"medium"
+    assert client.get(f"/thumbnails/{key}?size=100").content == b"small"
+    assert client.get(f"/thumbnails/{key}?size=1000").content == b"large"
+    # The largest rendition is stored under the key itself, not as a variant
+    response = client.get(f"/thumbnails/{key}?size=400")
+    assert response.status_code == 200
+    assert response.content == b"large"
+    assert response.headers["ETag"] == f'"{key}"'
+    assert client.get(f"/thumbnails/{key}?size=200").headers["ETag"] == f'"{key.replace(".", "_320.")}"'
+
+
+def test_api_get_thumbnail_without_renditions(client, thumbnail_store):
+    key = thumbnail_store.put(b"<svg></svg>", "image/svg+xml")
+    for size in (100, 200, 500, 1000):
+        response = client.get(f"/thumbnails/{key}?size={size}")
+        assert response.status_code == 200
+        assert response.content == b"<svg></svg>"
+
+
+@patch("jhub_apps.service.utils.get_jupyterhub_config")
+@patch.object(AsyncHubClient, "create_server")
+def test_api_create_server_rejects_invalid_thumbnail(create_server, get_jupyterhub_config, client, thumbnail_store):
+    get_jupyterhub_config.return_value = MOCK_ALLOW_ALL_FRAMEWORKS_CONFIG
+    response = client.post(
+        "/server",
+        data={'data': json.dumps({"servername": "panel-app", "user_options": mock_user_options()})},
+        files={'thumbnail': ('image.png', io.BytesIO(b"not an image"))}
+    )
+    assert response.status_code == 422
+    create_server.assert_not_called()
+
+
+@patch("jhub_apps.service.utils.get_jupyterhub_config")
+@patch.object(AsyncHubClient, "create_server")
+def test_api_create_server_rejects_large_svg_thumbnail(
+        create_server, get_jupyterhub_config, client, thumbnail_store
+):
+    get_jupyterhub_config.return_value = MOCK_ALLOW_ALL_FRAMEWORKS_CONFIG
+    with patch("jhub_apps.service.utils.THUMBNAIL_MAX_UPLOAD_BYTES", 16):
+        response = client.post(
+            "/server",
+            data={'data': json.dumps({"servername": "panel-app", "user_options": mock_user_options()})},
+            files={'thumbnail': ('image.svg', io.BytesIO(b'<svg xmlns="http://www.w3.org/2000/svg"/>'))}
+        )
+    assert response.status_code == 422
+    create_server.assert_not_called()
+
+
+@patch("jhub_apps.service.utils.get_jupyterhub_config")
+@patch.object(AsyncHubClient, "create_server")
+def test_api_create_server_references_framework_logo(create_server, get_jupyterhub_config, client, thumbnail_store):
+    get_jupyterhub_config.return_value = MOCK_ALLOW_ALL_FRAMEWORKS_CONFIG
+    create_server.return_value = {"user": "jovyan"}
+    response = client.post(
+        "/server",
+        data={'data': json.dumps({"servername": "panel-app", "user_options": mock_user_options()})},
+    )
+    assert response.status_code == 200
+    assert create_server.call_args.kwargs["user_options"].thumbnail == "framework:panel"
+    assert not thumbnail_store.path.exists()
+
+
+@patch("jhub_apps.service.routes.get_shared_servers", return_value=[])
+@patch.object(AsyncHubClient, "get_user")
+def test_api_get_server_resolves_framework_logos(get_user, get_shared_servers, client, thumbnail_store):
+    logo_data_url = "data:image/png;base64," + base64.b64encode(
+        FRAMEWORKS_MAPPING["bokeh"].logo_path.read_bytes()
+    ).decode()
+    get_user.return_value = {
+        "name": MOCK_USER.name,
+        "servers": {
+            "panel-app": {"name": "panel-app", "user_options": {"thumbnail": "framework:panel"}},
+            # A copy of the logo stored by a previous version
+            "bokeh-app": {"name": "bokeh-app", "user_options": {"thumbnail": logo_data_url}},
+        },
+    }
+    servers = client.get("/server/").json()["user_apps"]
+    assert [server["user_options"]["thumbnail"] for server in servers] == [
+        get_framework_logo_url("panel"),
+        get_framework_logo_url("bokeh"),
+    ]
+    logo_response = client.get(get_framework_logo_url("panel"))
+    assert logo_response.status_code == 200
+    assert logo_response.content == FRAMEWORKS_MAPPING["panel"].logo_path.read_bytes()
+
+
+@patch("jhub_apps.service.utils.get_jupyterhub_config")
+@patch.object(AsyncHubClient, "get_server", return_value=None)
+@patch.object(AsyncHubClient, "edit_server")
+def test_api_update_server_keeps_framework_logo_reference(edit_server, get_server, get_jupyterhub_config, client):
+    get_jupyterhub_config.return_value = MOCK_ALLOW_ALL_FRAMEWORKS_CONFIG
+    edit_server.return_value = {"user": "jovyan"}
+    response = client.put(
+        "/server/panel-app",
+        data={
+            'data': json.dumps({"servername": "panel-app", "user_options": mock_user_options()}),
+            'thumbnail_data_url': get_framework_logo_url("panel"),
+        },
+    )
+    assert response.status_code == 200
+    assert edit_server.call_args.kwargs["user_options"].thumbnail == "framework:panel"
+
+
+def test_classify_changes():
+    current = UserOptions(**{**mock_user_options(), "thumbnail": "framework:panel"})
+    changes = classify_changes(current, current.model_copy(update={
+        "description": "new description",
+        "share_with": SharePermissions(users=["alice"], groups=[]),
+    }))
+    assert changes == UserOptionsChanges(metadata={"description": "new description"}, sharing=True, restart=())
+    changes = classify_changes(current, current.model_copy(update={
+        "display_name": "New name", "env": {"KEY": "value"}, "profile": "gpu",
+    }))
+    assert changes.metadata == {"display_name": "New name"}
+    assert not changes.sharing
+    assert changes.restart == ("env", "profile")
+
+
+@patch("jhub_apps.service.routes.is_jupyterhub_5", return_value=True)
+@patch("jhub_apps.service.utils.get_jupyterhub_config")
+@patch.object(AsyncHubClient, "get_user")
+@patch.object(AsyncHubClient, "update_server_sharing")
+@patch.object(AsyncHubClient, "get_server")
+@patch.object(AsyncHubClient, "edit_server")
+def test_api_update_server_metadata_and_sharing_in_place(
+        edit_server, get_server, update_server_sharing, get_user, get_jupyterhub_config, is_jupyterhub_5, client,
+):
+    get_jupyterhub_config.return_value = MOCK_ALLOW_ALL_FRAMEWORKS_CONFIG
+    current_user_options = {**mock_user_options(), "thumbnail": "framework:panel"}
+    server = {"name": "panel-app", "full_name": "jovyan/panel-app", "user_options": current_user_options}
+    get_server.return_value = server
+    update_server_sharing.return_value = []
+    user_options = {
+        **mock_user_options(),
+        "description": "new description",
+        "share_with": {"users": ["alice"], "groups": []},
+    }
+    response = client.put(
+        "/server/panel-app",
+        data={
+            'data': json.dumps({"servername": "panel-app", "user_options": user_options}),
+            'thumbnail_data_url': get_framework_logo_url("panel"),
+        },
+    )
+    assert response.status_code == 200
+    assert response.json() == [200, "panel-app"]
+    edit_server.assert_not_called()
+    update_server_sharing.assert_called_once_with(
+        MOCK_USER.name, "panel-app", SharePermissions(users=["alice"], groups=[])
+    )
+    # The listings show the options edited in place, though the Hub still has the previous ones
+    get_user.return_value = {"name": MOCK_USER.name, "servers": {"panel-app": server}}
+    server_user_options = client.get("/server/panel-app").json()["user_options"]
+    assert server_user_options["description"] == "new description"
+    assert server_user_options["share_with"] == {"users": ["alice"], "groups": []}
+    assert server_user_options["env"] == current_user_options["env"]
+
+
+@patch("jhub_apps.service.utils.get_jupyterhub_config")
+@patch.object(AsyncHubClient, "get_server")
+@patch.object(AsyncHubClient, "edit_server")
+def test_api_update_server_restarts_on_env_change(
+        edit_server, get_server, get_jupyterhub_config, client, app_metadata_store,
+):
+    get_jupyterhub_config.return_value = MOCK_ALLOW_ALL_FRAMEWORKS_CONFIG
+    edit_server.return_value = [201, "panel-app"]
+    app_metadata_store.update(MOCK_USER.name, "panel-app", {"description": "edited in place"})
+    get_server.return_value = {
+        "name": "panel-app", "user_options": {**mock_user_options(), "thumbnail": "framework:panel"}
+    }
+    user_options = {**mock_user_options(), "env": {"ENV_VAR_KEY_1": "new value"}}
+    response = client.put(
+        "/server/panel-app",
+        data={
+            'data': json.dumps({"servername": "panel-app", "user_options": user_options}),
+            'thumbnail_data_url': get_framework_logo_url("panel"),
+        },
+    )
+    assert response.status_code == 200
+    assert edit_server.call_args.kwargs["user_options"].env == {"ENV_VAR_KEY_1": "new value"}
+    # The Hub has all the user options after the restart
+    assert app_metadata_store.get(MOCK_USER.name, "panel-app") == {}
+
+
+@patch("jhub_apps.service.routes.get_shared_servers")
+@patch.object(AsyncHubClient, "get_user")
+def test_api_get_servers_compact_pages(get_user, get_shared_servers, client):
+    get_user.return_value = {
+        "name": MOCK_USER.name,
+        "servers": {
+            name: {"name": name, "ready": True, "state": {}, "user_options": {"display_name": name.upper()}}
+            for name in ["c-app", "a-app", "b-app"]
+        },
+    }
+    get_shared_servers.return_value = [
+        {"name": "shared-app", "full_name": "alice/shared-app", "user_options": {"display_name": "Shared"}},
+    ]
+    response = client.get("/server/", params={"fields": "display_name", "limit": 2})
+    assert response.status_code == 200
+    first_page = response.json()
+    assert first_page["items"] == [
+        {"name": "a-app", "owner": MOCK_USER.name, "shared": False, "display_name": "A-APP"},
+        {"name": "b-app", "owner": MOCK_USER.name, "shared": False, "display_name": "B-APP"},
+    ]
+    # The page is full of the user's own apps, the shared ones aren't needed yet
+    get_shared_servers.assert_not_called()
+
+    response = client.get("/server/", params={"fields": "display_name,ready", "limit": 2, "cursor": first_page["next_cursor"]})
+    second_page = response.json()
+    assert [(item["name"], item["shared"]) for item in second_page["items"]] == [("c-app", False), ("shared-app", True)]
+    assert second_page["items"][1] == {
+        "name": "shared-app", "owner": "alice", "shared": True, "display_name": "Shared", "ready": None,
+    }
+    assert second_page["next_cursor"] is None
+
+
+@pytest.mark.parametrize("params", [{"fields": "state"}, {"cursor": "not-a-cursor"}, {"limit": 0}])
+@patch.object(AsyncHubClient, "get_user")
+def test_api_get_servers_compact_invalid_parameters(get_user, params, client):
+    get_user.return_value = {"name": MOCK_USER.name, "servers": {}}
+    response = client.get("/server/", params=params)
+    assert response.status_code in (400, 422)
+
+
+@patch("jhub_apps.service.routes.get_shared_servers", return_value=[])
+@patch.object(AsyncHubClient, "get_user")
+def test_api_get_servers_not_modified(get_user, get_shared_servers, client):
+    servers = {"panel-app": {"name": "panel-app", "last_activity": "2024-01-01T00:00:00Z", "user_options": {}}}
+    get_user.return_value = {"name": MOCK_USER.name, "servers": servers}
+    etags = {}
+    for url in ["/server/", "/server/?limit=10", "/server/panel-app"]:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "private, no-cache"
+        etag = etags[url] = response.headers["etag"]
+        cached_response = client.get(url, headers={"If-None-Match": etag})
+        assert cached_response.status_code == 304
+        assert cached_response.content == b""
+        assert cached_response.headers["etag"] == etag
+
+    # Any change to the servers changes the ETag
+    servers["panel-app"]["last_activity"] = "2024-01-02T00:00:00Z"
+    for url, etag in etags.items():
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+
+@patch("jhub_apps.service.runtime_artifacts.render_runtime_artifacts", wraps=render_runtime_artifacts)
+@patch("jhub_apps.service.routes.get_jupyterhub_config")
+def test_api_runtime_artifacts_are_cached_and_revalidated(get_jupyterhub_config, render, client):
+    get_jupyterhub_config.return_value = Mock(
+        JupyterHub=Mock(template_vars={"primary_color": "#123456", "font_family": "'Custom', sans-serif" * 20})
+    )
+
+    response = client.get("/theme.css", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert "max-age" in response.headers["cache-control"]
+    assert "--primary-color: #123456;" in response.text
+    etag = response.headers["etag"]
+
+    response = client.get("/theme.css", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert client.get("/config.json").json()["theme"]["colors"]["primary"] == "#123456"
+    # Rendered once for the config
+    render.assert_called_once()
+
+    # A reloaded config is rendered again, with a new ETag
+    get_jupyterhub_config.return_value = Mock(JupyterHub=Mock(template_vars={"primary_color": "#654321"}))
+    response = client.get("/theme.css", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert "--primary-color: #654321;" in response.text
+
+
+def test_select_encoding():
+    assert select_encoding(None, ["gzip", "br"]) is None
+    assert select_encoding("gzip, deflate, br", ["gzip", "br"]) == "br"
+    assert select_encoding("gzip, br;q=0", ["gzip", "br"]) == "gzip"
+    assert select_encoding("br", ["gzip"]) is None
+    assert select_encoding("*", ["gzip"]) == "gzip"
+
+
+@patch("jhub_apps.service.japps_routes.get_jupyterhub_config")
+def test_spa_shell_is_cached_and_references_fingerprinted_assets(get_jupyterhub_config, client):
+    get_jupyterhub_config.return_value = Config({"hub_title": "My Hub"})
+
+    response = client.get("/services/japps/create-app")
+    assert response.status_code == 200
+    assert "<title>My Hub</title>" in response.text
+    js_url = get_asset_url("js/index.js")
+    assert js_url in response.text
+    etag = response.headers["etag"]
+
+    response = client.get("/services/japps/edit-app", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    # Fingerprinted assets are immutable, others are revalidated
+    response = client.get(js_url)
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    response = client.get("/static/js/index.js?v=outdated")
+    assert response.headers["cache-control"] == STATIC_CACHE_CONTROL
+
+
+def test_asset_urls_follow_the_service_prefix(monkeypatch):
+    monkeypatch.setenv("JUPYTERHUB_SERVICE_PREFIX", "/services/my-apps/")
+    assert get_asset_url("js/index.js").startswith("/services/my-apps/static/js/index.js?v=")
+    assert get_framework_logo_url("panel").startswith("/services/my-apps/")
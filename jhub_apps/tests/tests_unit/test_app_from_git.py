@@ -1,6 +1,19 @@
-from unittest.mock import Mock
+import asyncio
+import os
+import pathlib
+import threading
+from unittest.mock import Mock, patch
 
-from jhub_apps.service.app_from_git import _extract_jhub_apps_config_from_conda_project_config
+import git
+import pytest
+
+from jhub_apps.service.app_from_git import (
+    _extract_jhub_apps_config_from_conda_project_config,
+    _get_app_configuration_from_git,
+)
+from jhub_apps.service.git_mirrors import GitMirrors, RefNotFound, ResolvedRef, resolve_ref
+from jhub_apps.service.models import JHubAppConfig, Repository
+from jhub_apps.service.repo_inspection import RepoInspectionQueueFull, RepoInspectionTimeout, RepoInspector
 
 
 def test_extract_jhub_apps_config_from_conda_project_config():
@@ -29,3 +42,180 @@ def test_extract_jhub_apps_config_from_conda_project_config():
             "SOMETHING_BAR": "beta",
         }
     }
+
+
+def _commit_app(repo_path, name):
+    if (repo_path / ".git").exists():
+        repo = git.Repo(repo_path)
+    else:
+        repo = git.Repo.init(repo_path, initial_branch="main")
+        with repo.config_writer() as config:
+            config.set_value("user", "name", "jovyan")
+            config.set_value("user", "email", "jovyan@example.com")
+    (repo_path / "conda-project.yml").write_text(f"name: {name}\n")
+    (repo_path / "app.py").write_text("print('hello')\n")
+    repo.index.add(["conda-project.yml", "app.py"])
+    return repo.index.commit(f"App {name}").hexsha
+
+
+def _get_conda_project_config_yaml(directory):
+    name = (pathlib.Path(directory) / "conda-project.yml").read_text().split(":")[1].strip()
+    return Mock(variables={
+        "JHUB_APP_CONFIG_display_name": name,
+        "JHUB_APP_CONFIG_description": "An app from git",
+    })
+
+
+@patch("jhub_apps.service.app_from_git._get_conda_project_config_yaml", _get_conda_project_config_yaml)
+def test_app_configuration_from_git_is_cached_by_commit(tmp_path):
+    repo_path = tmp_path / "repo"
+    repo_path.mkdir()
+    _commit_app(repo_path, "first")
+    repository = Repository(url=f"file://{repo_path}", ref="main")
+    git_mirrors = GitMirrors(path=str(tmp_path / "mirrors"), max_mirrors=2)
+
+    with patch("jhub_apps.service.app_from_git.get_git_mirrors", return_value=git_mirrors), \
+            patch.object(GitMirrors, "fetch", autospec=True, side_effect=GitMirrors.fetch) as fetch:
+        assert _get_app_configuration_from_git(repository).display_name == "first"
+        # Unchanged repository: only its ref is resolved
+        assert _get_app_configuration_from_git(repository).display_name == "first"
+        assert fetch.call_count == 1
+
+        sha = _commit_app(repo_path, "second")
+        assert _get_app_configuration_from_git(repository).display_name == "second"
+        assert fetch.call_count == 2
+        app_config = _get_app_configuration_from_git(Repository(url=repository.url, ref=sha))
+        assert app_config.display_name == "second"
+        assert app_config.repository.ref == sha
+        assert fetch.call_count == 2
+    # A single mirror, which got the new commit
+    assert len(list((tmp_path / "mirrors").glob("*.git"))) == 1
+
+
+def test_resolve_ref(tmp_path):
+    sha = _commit_app(tmp_path, "app")
+    git.Repo(tmp_path).create_tag("v1", message="Annotated tag")
+    url = f"file://{tmp_path}"
+    assert resolve_ref(url, "main") == ResolvedRef(sha=sha, name="refs/heads/main")
+    assert resolve_ref(url, "v1") == ResolvedRef(sha=sha, name="refs/tags/v1")
+    assert resolve_ref(url, sha) == ResolvedRef(sha=sha, name=None)
+    with pytest.raises(RefNotFound):
+        resolve_ref(url, "missing")
+
+
+def test_git_mirrors_evict_least_recently_used(tmp_path):
+    git_mirrors = GitMirrors(path=str(tmp_path), max_mirrors=2)
+    for i, url in enumerate(["https://a.example", "https://b.example", "https://c.example"]):
+        with git_mirrors.open(url):
+            pass
+        # Distinct modification times, whatever the resolution of the filesystem
+        os.utime(git_mirrors._get_mirror_path(url), (i, i))
+    with git_mirrors.open("https://a.example"):
+        pass
+    assert sorted(tmp_path.glob("*.git")) == sorted([
+        git_mirrors._get_mirror_path("https://a.example"),
+        git_mirrors._get_mirror_path("https://c.example"),
+    ])
+
+
+def test_git_mirrors_fetch_only_the_requested_files(tmp_path):
+    repo_path = tmp_path / "repo"
+    (repo_path / "config" / "nested").mkdir(parents=True)
+    (repo_path / "data").mkdir()
+    repo = git.Repo.init(repo_path, initial_branch="main")
+    (repo_path / "config" / "conda-project.yml").write_text("name: app\n")
+    (repo_path / "config" / "nested" / "notebook.ipynb").write_text("{}")
+    (repo_path / "data" / "dataset.csv").write_text("a,b\n" * 1000)
+    (repo_path / "thumbnail.png").write_bytes(b"png")
+    repo.index.add(["config/conda-project.yml", "config/nested/notebook.ipynb", "data/dataset.csv", "thumbnail.png"])
+    sha = repo.index.commit("App").hexsha
+    # Partial clones must be allowed by the server
+    with repo.config_writer() as config:
+        config.set_value("uploadpack", "allowFilter", "true")
+
+    git_mirrors = GitMirrors(path=str(tmp_path / "mirrors"))
+    checkout = tmp_path / "checkout"
+    with git_mirrors.open(f"file://{repo_path}") as mirror:
+        git_mirrors.fetch(mirror, ResolvedRef(sha=sha, name="refs/heads/main"))
+        git_mirrors.extract(mirror, sha, ["config", "thumbnail.png", "missing.png"], str(checkout))
+        missing = git_mirrors._get_missing_objects(mirror, sha)
+
+    assert sorted(str(path.relative_to(checkout)) for path in checkout.rglob("*") if path.is_file()) == [
+        "config/conda-project.yml",
+        "thumbnail.png",
+    ]
+    # The other files were never fetched
+    assert missing == {
+        repo.commit(sha).tree["data/dataset.csv"].hexsha,
+        repo.commit(sha).tree["config/nested/notebook.ipynb"].hexsha,
+    }
+
+
+def _app_config(repository):
+    return JHubAppConfig(display_name="App", description="An app from git", repository=repository)
+
+
+def test_repo_inspector_shares_jobs_and_rejects_when_full():
+    started, release = threading.Event(), threading.Event()
+    inspected = []
+
+    def inspect(repository):
+        inspected.append(repository.url)
+        started.set()
+        release.wait()
+        return _app_config(repository)
+
+    async def run():
+        inspector = RepoInspector(inspect=inspect, workers=1, max_queued=1)
+        repository = Repository(url="https://example.com/app.git")
+        first = asyncio.create_task(inspector.inspect(repository))
+        second = asyncio.create_task(inspector.inspect(repository))
+        queued = asyncio.create_task(inspector.inspect(Repository(url="https://example.com/other.git")))
+        await asyncio.sleep(0.01)
+        with pytest.raises(RepoInspectionQueueFull):
+            await inspector.inspect(Repository(url="https://example.com/rejected.git"))
+        release.set()
+        results = await asyncio.gather(first, second, queued)
+        await asyncio.sleep(0.01)
+        inspector.shutdown()
+        return results, inspector.jobs
+
+    (first, second, queued), jobs = asyncio.run(run())
+    assert inspected == ["https://example.com/app.git", "https://example.com/other.git"]
+    assert first == second
+    assert first is not second
+    assert queued.repository.url == "https://example.com/other.git"
+    assert jobs == 0
+
+
+def test_repo_inspector_times_out_and_cancels_queued_jobs():
+    release = threading.Event()
+    inspected = []
+
+    def inspect(repository):
+        inspected.append(repository.url)
+        release.wait()
+        return _app_config(repository)
+
+    async def run():
+        inspector = RepoInspector(inspect=inspect, workers=1, timeout=0.05)
+        running = asyncio.create_task(inspector.inspect(Repository(url="https://example.com/app.git")))
+        await asyncio.sleep(0.01)
+        with pytest.raises(RepoInspectionTimeout):
+            await inspector.inspect(Repository(url="https://example.com/queued.git"))
+        release.set()
+        with pytest.raises(RepoInspectionTimeout):
+            await running
+        inspector.shutdown()
+
+    asyncio.run(run())
+    # The queued job was cancelled when its only request gave up
+    assert inspected == ["https://example.com/app.git"]
+
+
+@patch("jhub_apps.service.routes.get_repo_inspector")
+def test_api_app_config_from_git_rejects_when_busy(get_repo_inspector, client):
+    get_repo_inspector.return_value.inspect.side_effect = RepoInspectionQueueFull("Too many repositories")
+    response = client.post("/app-config-from-git/", json={"url": "https://example.com/app.git"})
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "5"
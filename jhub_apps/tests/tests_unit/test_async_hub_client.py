@@ -0,0 +1,226 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from jhub_apps.hub_client.async_hub_client import AsyncHubClient, UserTokenBroker
+from jhub_apps.service.models import SharePermissions
+
+HUB_API_URL = "http://hub.test/hub/api"
+
+
+def _mock_hub_http_client(requests_seen):
+    def handler(request: httpx.Request):
+        requests_seen.append((request.method, request.url.path))
+        path = request.url.path.removeprefix("/hub/api")
+        if request.method == "POST" and path.endswith("/tokens"):
+            return httpx.Response(201, json={"id": "a1", "token": "user-token", "scopes": []})
+        if request.method == "GET" and path == "/users/jovyan":
+            return httpx.Response(200, json={"name": "jovyan", "servers": {}})
+        if request.method == "POST" and path.startswith("/shares/"):
+            return httpx.Response(200, json=json.loads(request.content))
+        return httpx.Response(204)
+
+    return httpx.AsyncClient(base_url=HUB_API_URL, transport=httpx.MockTransport(handler))
+
+
+def test_get_user_reuses_user_token():
+    requests_seen = []
+
+    async def get_user_twice():
+        broker = UserTokenBroker()
+        async with _mock_hub_http_client(requests_seen) as http_client:
+            hub_client = AsyncHubClient(username="jovyan", http_client=http_client, user_token_broker=broker)
+            users = [await hub_client.get_user(), await hub_client.get_user()]
+            await broker.close(http_client)
+            return users
+
+    users = asyncio.run(get_user_twice())
+    assert users == [{"name": "jovyan", "servers": {}}] * 2
+    assert requests_seen == [
+        ("POST", "/hub/api/users/jovyan/tokens"),
+        ("GET", "/hub/api/users/jovyan"),
+        ("GET", "/hub/api/users/jovyan"),
+        # Revoked on shutdown
+        ("DELETE", "/hub/api/users/jovyan/tokens/a1"),
+    ]
+
+
+def test_token_broker_creates_one_token_for_concurrent_requests():
+    requests_seen = []
+
+    async def get_tokens():
+        broker = UserTokenBroker()
+        async with _mock_hub_http_client(requests_seen) as http_client:
+            return await asyncio.gather(*[
+                broker.get_token("jovyan", http_client) for _ in range(10)
+            ])
+
+    tokens = asyncio.run(get_tokens())
+    assert {token.token for token in tokens} == {"user-token"}
+    assert requests_seen == [("POST", "/hub/api/users/jovyan/tokens")]
+
+
+def test_token_broker_replaces_expiring_token():
+    requests_seen = []
+
+    async def get_tokens():
+        broker = UserTokenBroker(lifetime=300, refresh_margin=60, revoke_delay=0)
+        async with _mock_hub_http_client(requests_seen) as http_client:
+            first = await broker.get_token("jovyan", http_client)
+            # Pretend the token is about to expire
+            broker._tokens["jovyan"] = first._replace(refresh_at=time.monotonic() - 1)
+            second = await broker.get_token("jovyan", http_client)
+            # Let the background revocation of the replaced token run
+            await asyncio.sleep(0.01)
+            return first, second
+
+    first, second = asyncio.run(get_tokens())
+    assert second.refresh_at > first.refresh_at
+    assert requests_seen == [
+        ("POST", "/hub/api/users/jovyan/tokens"),
+        ("POST", "/hub/api/users/jovyan/tokens"),
+        ("DELETE", "/hub/api/users/jovyan/tokens/a1"),
+    ]
+
+
+def test_rejected_user_token_is_not_reused():
+    requests_seen = []
+
+    def handler(request: httpx.Request):
+        requests_seen.append((request.method, request.url.path))
+        if request.method == "POST":
+            return httpx.Response(201, json={"id": "a1", "token": "user-token", "scopes": []})
+        if request.method == "GET":
+            return httpx.Response(401)
+        return httpx.Response(204)
+
+    async def get_user():
+        broker = UserTokenBroker()
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(base_url=HUB_API_URL, transport=transport) as http_client:
+            hub_client = AsyncHubClient(username="jovyan", http_client=http_client, user_token_broker=broker)
+            with pytest.raises(httpx.HTTPStatusError):
+                await hub_client.get_user()
+            await asyncio.sleep(0.01)
+            return broker
+
+    broker = asyncio.run(get_user())
+    assert broker._tokens == {}
+    assert ("DELETE", "/hub/api/users/jovyan/tokens/a1") in requests_seen
+
+
+def test_share_server_applies_only_the_difference():
+    requests_seen = []
+    current_shares = [
+        {"user": {"name": "alice"}, "group": None},
+        {"user": {"name": "carol"}, "group": None},
+        {"user": None, "group": {"name": "beta"}},
+    ]
+
+    def handler(request: httpx.Request):
+        if request.method == "GET":
+            return httpx.Response(200, json={"items": current_shares, "_pagination": {"next": None}})
+        body = json.loads(request.content)
+        requests_seen.append((request.method, body))
+        if body.get("user") == "dave":
+            return httpx.Response(403, json={"status": 403, "message": "Not allowed to share with dave"})
+        return httpx.Response(200, json=body)
+
+    async def share():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(base_url=HUB_API_URL, transport=transport) as http_client:
+            hub_client = AsyncHubClient(username="jovyan", http_client=http_client)
+            return await hub_client._share_server_with_multiple_entities(
+                "jovyan", "panel-app",
+                share_with=SharePermissions(users=["alice", "bob", "dave"], groups=["alpha"]),
+            )
+
+    results = asyncio.run(share())
+    assert sorted(requests_seen, key=str) == sorted([
+        ("POST", {"user": "bob"}),
+        ("POST", {"user": "dave"}),
+        ("PATCH", {"user": "carol"}),
+        ("POST", {"group": "alpha"}),
+        ("PATCH", {"group": "beta"}),
+    ], key=str)
+    assert [(r.kind, r.name, r.action, r.success) for r in results] == [
+        ("user", "alice", "unchanged", True),
+        ("user", "bob", "share", True),
+        ("user", "dave", "share", False),
+        ("user", "carol", "revoke", True),
+        ("group", "alpha", "share", True),
+        ("group", "beta", "revoke", True),
+    ]
+    assert results[2].error == "Not allowed to share with dave"
+
+
+def test_get_user_names_fetches_all_pages():
+    pages = {
+        "0": {"items": [{"name": "alice"}, {"name": "bob"}],
+              "_pagination": {"next": {"offset": 2, "limit": 2}}},
+        "2": {"items": [{"name": "carol"}], "_pagination": {"next": None}},
+    }
+
+    def handler(request: httpx.Request):
+        assert request.headers["Accept"] == "application/jupyterhub-pagination+json"
+        return httpx.Response(200, json=pages[request.url.params.get("offset", "0")])
+
+    async def get_user_names():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(base_url=HUB_API_URL, transport=transport) as http_client:
+            return await AsyncHubClient(http_client=http_client).get_user_names()
+
+    assert asyncio.run(get_user_names()) == ["alice", "bob", "carol"]
+
+
+def test_get_server_fetches_single_user():
+    requests_seen = []
+
+    def handler(request: httpx.Request):
+        requests_seen.append((request.method, request.url.path))
+        if request.method == "POST":
+            return httpx.Response(201, json={"id": "a1", "token": "user-token", "scopes": []})
+        if request.url.path == "/hub/api/users/jovyan":
+            return httpx.Response(200, json={"name": "jovyan", "servers": {"panel-app": {"name": "panel-app"}}})
+        return httpx.Response(404)
+
+    async def get_servers():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(base_url=HUB_API_URL, transport=transport) as http_client:
+            hub_client = AsyncHubClient(
+                username="jovyan", http_client=http_client, user_token_broker=UserTokenBroker()
+            )
+            return (
+                await hub_client.get_server("jovyan", "panel-app"),
+                await hub_client.get_server("jovyan", "missing-app"),
+                await hub_client.get_server("nobody"),
+            )
+
+    assert asyncio.run(get_servers()) == ({"name": "panel-app"}, None, None)
+    # The list of all users is never fetched
+    assert ("GET", "/hub/api/users") not in requests_seen
+
+
+def test_stream_server_progress_parses_events():
+    def handler(request):
+        assert request.url.path == "/hub/api/users/jovyan/servers/panel-app/progress"
+        body = (
+            'data: {"progress": 10, "message": "Spawning"}\n\n'
+            ': keepalive\n\n'
+            'data: {"progress": 100, "ready": true, "message": "Ready"}\n\n'
+        )
+        return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+    async def stream():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(base_url=HUB_API_URL, transport=transport) as http_client:
+            hub_client = AsyncHubClient(http_client=http_client)
+            return [event async for event in hub_client.stream_server_progress("jovyan", "panel-app")]
+
+    assert asyncio.run(stream()) == [
+        {"progress": 10, "message": "Spawning"},
+        {"progress": 100, "ready": True, "message": "Ready"},
+    ]
@@ -0,0 +1,33 @@
+import asyncio
+from unittest.mock import Mock
+
+from jhub_apps.hub_client.async_hub_client import configure_http_client
+from jhub_apps.service.client import close_client, get_client, init_client
+
+
+def test_client_is_shared_and_configured_from_config(monkeypatch):
+    monkeypatch.setenv("JUPYTERHUB_API_URL", "http://hub.test/hub/api")
+    config = Mock(JAppsConfig=Mock(
+        hub_api_max_connections=7,
+        hub_api_max_keepalive_connections=3,
+        hub_api_keepalive_expiry=5.0,
+        hub_api_timeout=10.0,
+        hub_api_connect_timeout=2.0,
+    ))
+
+    async def get_clients():
+        client = init_client(config)
+        clients = [get_client(), get_client()]
+        timeout = client.timeout
+        await close_client()
+        return client, clients, timeout
+
+    try:
+        client, clients, timeout = asyncio.run(get_clients())
+    finally:
+        # Restore the default limits and timeouts
+        configure_http_client()
+    assert all(other is client for other in clients)
+    assert timeout.connect == 2.0
+    assert timeout.read == 10.0
+    assert client.is_closed
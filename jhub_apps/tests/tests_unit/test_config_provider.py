@@ -0,0 +1,84 @@
+import os
+import threading
+from unittest.mock import patch
+
+from jhub_apps.service.config_provider import JupyterHubConfigProvider
+from jhub_apps.tests.common.constants import MOCK_USER
+
+
+def _provider(config_path, loads, started=None, release=None):
+    def loader(path):
+        if started is not None and loads:
+            started.set()
+            release.wait()
+        content = open(path).read()
+        if "raise" in content:
+            raise SyntaxError("invalid config")
+        loads.append(content)
+        return content
+
+    return JupyterHubConfigProvider(loader=loader, path_getter=lambda: str(config_path), check_interval=0)
+
+
+def _wait_for_reload(provider):
+    if provider._reload_thread is not None:
+        provider._reload_thread.join()
+
+
+def test_config_is_loaded_once(tmp_path):
+    config_path = tmp_path / "jupyterhub_config.py"
+    config_path.write_text("c = 1")
+    loads = []
+    provider = _provider(config_path, loads)
+    assert [provider.get() for _ in range(3)] == ["c = 1"] * 3
+    # Touched but unchanged
+    os.utime(config_path, ns=(0, 0))
+    provider.get()
+    _wait_for_reload(provider)
+    assert provider.get() == "c = 1"
+    assert loads == ["c = 1"]
+
+
+def test_changed_config_is_reloaded_in_the_background(tmp_path):
+    config_path = tmp_path / "jupyterhub_config.py"
+    config_path.write_text("c = 1")
+    loads = []
+    started, release = threading.Event(), threading.Event()
+    provider = _provider(config_path, loads, started, release)
+    assert provider.get() == "c = 1"
+    first_version = provider.version
+
+    config_path.write_text("c = 22")
+    assert provider.get() == "c = 1"
+    started.wait()
+    # The previous config is served while the new one is loaded
+    assert provider.get() == "c = 1"
+    release.set()
+    _wait_for_reload(provider)
+    assert provider.get() == "c = 22"
+    assert provider.version != first_version
+
+
+def test_invalid_config_keeps_the_previous_one(tmp_path):
+    config_path = tmp_path / "jupyterhub_config.py"
+    config_path.write_text("c = 1")
+    provider = _provider(config_path, [])
+    provider.get()
+    config_path.write_text("raise")
+    provider.get()
+    _wait_for_reload(provider)
+    assert provider.get() == "c = 1"
+
+
+@patch("jhub_apps.service.routes.get_jupyterhub_config_version", return_value="abc")
+@patch("jhub_apps.service.routes.reload_jupyterhub_config")
+def test_api_reload_config(reload_jupyterhub_config, get_jupyterhub_config_version, client):
+    with patch.object(MOCK_USER, "admin", False):
+        response = client.post("/config/reload")
+    assert response.status_code == 403
+    reload_jupyterhub_config.assert_not_called()
+    with patch.object(MOCK_USER, "admin", True):
+        response = client.post("/config/reload")
+    assert response.status_code == 200
+    assert response.json() == {"version": "abc"}
+    reload_jupyterhub_config.assert_called_once_with()
@@ -0,0 +1,238 @@
+import asyncio
+from unittest.mock import Mock, patch
+
+import httpx
+
+from jhub_apps.hub_client.async_hub_client import AsyncHubClient
+from jhub_apps.service.events import Broadcaster, ProgressStreams, ServerEvents
+
+
+def test_broadcaster_shares_one_source_and_replays_to_late_subscribers():
+    runs = []
+    closed = []
+
+    async def source():
+        runs.append(1)
+        try:
+            for i in range(3):
+                yield i
+                await asyncio.sleep(0.01)
+            # Stays open until the last subscriber leaves
+            await asyncio.Event().wait()
+        finally:
+            closed.append(1)
+
+    async def collect(subscription, count):
+        events = [await subscription.__anext__() for _ in range(count)]
+        await subscription.aclose()
+        return events
+
+    async def run():
+        broadcaster = Broadcaster(source, replay=2)
+        first = asyncio.create_task(collect(broadcaster.subscribe(), 3))
+        await asyncio.sleep(0.05)
+        # Joins after all the events were sent: gets the last two
+        late = await collect(broadcaster.subscribe(), 2)
+        events = await first
+        await asyncio.sleep(0)
+        return events, late, broadcaster.subscribers
+
+    events, late, subscribers = asyncio.run(run())
+    assert events == [0, 1, 2]
+    assert late == [1, 2]
+    assert subscribers == 0
+    assert runs == [1]
+    assert closed == [1]
+
+
+def test_server_events_push_changes_of_watched_servers():
+    users = {
+        "jovyan": {"servers": {"panel-app": {"name": "panel-app", "ready": False, "user_options": {}}}},
+        "alice": {"servers": {
+            "shared-app": {"name": "shared-app", "ready": True, "user_options": {}},
+            "private-app": {"name": "private-app", "ready": True, "user_options": {}},
+        }},
+    }
+    snapshot = Mock(users=users)
+
+    async def refresh():
+        pass
+
+    snapshot.refresh = refresh
+
+    async def get_shared_server_keys(username):
+        return [("alice", "shared-app")]
+
+    async def run():
+        server_events = ServerEvents(interval=0.01)
+        watch = server_events.watch("jovyan")
+        received = [await watch.__anext__()]
+        # Changes to watched and unwatched servers
+        snapshot.users = {
+            "jovyan": {"servers": {"panel-app": {"name": "panel-app", "ready": True, "user_options": {}}}},
+            "alice": {"servers": {"private-app": {"name": "private-app", "ready": False, "user_options": {}}}},
+        }
+        received.append(await watch.__anext__())
+        await watch.aclose()
+        return received
+
+    with patch("jhub_apps.service.events.get_server_snapshot", return_value=snapshot), \
+            patch("jhub_apps.service.events.get_shared_server_keys", get_shared_server_keys):
+        (initial_event, initial), (changes_event, changes) = asyncio.run(run())
+
+    assert initial_event == "servers"
+    assert [(item["owner"], item["name"], item["ready"]) for item in initial["items"]] == [
+        ("jovyan", "panel-app", False),
+        ("alice", "shared-app", True),
+    ]
+    assert changes_event == "changes"
+    assert [(item["name"], item["ready"]) for item in changes["changed"]] == [("panel-app", True)]
+    assert changes["removed"] == [{"owner": "alice", "name": "shared-app"}]
+
+
+def test_server_events_follow_sharing_changes():
+    users = {
+        "jovyan": {"servers": {}},
+        "alice": {"servers": {"shared-app": {"name": "shared-app", "ready": True, "user_options": {}}}},
+    }
+    snapshot = Mock(users=users)
+
+    async def refresh():
+        pass
+
+    snapshot.refresh = refresh
+    # The users of the snapshot don't change when servers are shared or unshared
+    shared_server_keys = []
+
+    async def get_shared_server_keys(username):
+        return list(shared_server_keys)
+
+    async def run():
+        watch = ServerEvents(interval=0.01).watch("jovyan")
+        received = [await watch.__anext__()]
+        shared_server_keys.append(("alice", "shared-app"))
+        received.append(await watch.__anext__())
+        shared_server_keys.clear()
+        received.append(await watch.__anext__())
+        await watch.aclose()
+        return received
+
+    with patch("jhub_apps.service.events.get_server_snapshot", return_value=snapshot), \
+            patch("jhub_apps.service.events.get_shared_server_keys", get_shared_server_keys):
+        (_, initial), (_, shared), (_, unshared) = asyncio.run(run())
+
+    assert initial == {"items": []}
+    assert [(item["owner"], item["name"]) for item in shared["changed"]] == [("alice", "shared-app")]
+    assert unshared == {"changed": [], "removed": [{"owner": "alice", "name": "shared-app"}]}
+
+
+def test_server_events_list_shared_servers_once_per_user():
+    users = {
+        "jovyan": {"servers": {}},
+        "alice": {"servers": {"shared-app": {"name": "shared-app", "ready": True, "user_options": {}}}},
+    }
+    snapshot = Mock(users=users)
+
+    async def refresh():
+        pass
+
+    snapshot.refresh = refresh
+    listings = []
+
+    async def get_shared_server_keys(username):
+        listings.append(username)
+        await asyncio.sleep(0.01)
+        return [("alice", "shared-app")]
+
+    async def run():
+        server_events = ServerEvents(interval=0.05)
+        # Several tabs of the same user
+        watches = [server_events.watch("jovyan") for _ in range(3)]
+        initial = await asyncio.gather(*[watch.__anext__() for watch in watches])
+        initial_listings = len(listings)
+        pending = [asyncio.ensure_future(watch.__anext__()) for watch in watches]
+        await asyncio.sleep(0.5)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        return initial, initial_listings, server_events
+
+    with patch("jhub_apps.service.events.get_server_snapshot", return_value=snapshot), \
+            patch("jhub_apps.service.events.get_shared_server_keys", get_shared_server_keys):
+        initial, initial_listings, server_events = asyncio.run(run())
+
+    assert all(
+        [(item["owner"], item["name"]) for item in event["items"]] == [("alice", "shared-app")]
+        for _, event in initial
+    )
+    assert initial_listings == 1
+    # About one listing per interval for all the subscribers, rather than one per subscriber
+    assert len(listings) <= 0.5 / 0.05 + 2
+    assert not server_events._shared_keys and not server_events._user_subscribers
+
+
+@patch("jhub_apps.service.routes.get_server_events")
+def test_api_server_events_stream(get_server_events, client):
+    async def watch(username):
+        yield "servers", {"items": []}
+
+    get_server_events.return_value.watch = watch
+    response = client.get("/server/events")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == 'event: servers\ndata: {"items": []}\n\n'
+
+
+def test_progress_streams_share_one_upstream_stream():
+    upstream_calls = []
+    spawn_done = asyncio.Event()
+
+    async def stream_server_progress(self, username, servername):
+        upstream_calls.append((username, servername))
+        yield {"progress": 10, "message": "Spawning"}
+        await spawn_done.wait()
+        yield {"progress": 100, "ready": True, "message": "Ready"}
+
+    async def collect(watch):
+        return [event async for _, event in watch]
+
+    async def run():
+        progress_streams = ProgressStreams(replay=10)
+        first = asyncio.create_task(collect(progress_streams.watch("jovyan", "panel-app")))
+        await asyncio.sleep(0.01)
+        # Joins after the first event, which is replayed
+        second = asyncio.create_task(collect(progress_streams.watch("jovyan", "panel-app")))
+        await asyncio.sleep(0.01)
+        spawn_done.set()
+        return await first, await second, progress_streams._broadcasters
+
+    with patch.object(AsyncHubClient, "stream_server_progress", stream_server_progress):
+        first, second, broadcasters = asyncio.run(run())
+    assert upstream_calls == [("jovyan", "panel-app")]
+    assert first == second == [
+        {"progress": 10, "message": "Spawning"},
+        {"progress": 100, "ready": True, "message": "Ready"},
+    ]
+    # Dropped once the stream ended and its clients left
+    assert broadcasters == {}
+
+
+def test_progress_streams_report_upstream_errors():
+    async def stream_server_progress(self, username, servername):
+        raise httpx.ConnectError("Hub is down")
+        yield
+
+    async def run():
+        return [event async for _, event in ProgressStreams().watch("jovyan", "panel-app")]
+
+    with patch.object(AsyncHubClient, "stream_server_progress", stream_server_progress):
+        events = asyncio.run(run())
+    assert len(events) == 1
+    assert events[0]["failed"] is True
+
+
+@patch.object(AsyncHubClient, "get_user")
+def test_api_server_progress_stream_not_found(get_user, client):
+    get_user.return_value = {"name": "jovyan", "servers": {}}
+    response = client.get("/server/missing-app/progress")
+    assert response.status_code == 404
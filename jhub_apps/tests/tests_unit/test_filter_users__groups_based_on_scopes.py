@@ -1,6 +1,6 @@
 import pytest
 
-from jhub_apps.hub_client.hub_client import filter_entity_based_on_scopes
+from jhub_apps.hub_client.hub_client import ScopeFilter, filter_entity_based_on_scopes
 from jhub_apps.hub_client.utils import is_jupyterhub_5
 
 
@@ -56,3 +56,20 @@ def test_filter_users_based_on_scopes(name, entity_key, scopes, entities, expect
         entity_key=entity_key
     )
     assert set(filtered_entities) == set(expected_entities)
+
+
+@pytest.mark.skipif(not is_jupyterhub_5(), reason="requires jupyterhub>=5")
+def test_scope_filter_allows_users_via_groups():
+    scope_filter = ScopeFilter(
+        ["read:users:name!user=user_a", "read:users:name!group=group-x"],
+        entity_key="user",
+    )
+    assert not scope_filter.wildcard
+    assert scope_filter.allowed_names == {"user_a"}
+    assert scope_filter.allowed_groups == {"group-x"}
+    filtered_entities = scope_filter.filter(
+        ["user_a", "user_b", "user_c"],
+        entity_groups={"user_b": ["group-y"], "user_c": ["group-x", "group-y"]},
+    )
+    # order of the given entities is preserved
+    assert filtered_entities == ["user_a", "user_c"]
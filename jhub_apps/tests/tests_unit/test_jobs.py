@@ -0,0 +1,130 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+
+from jhub_apps.service.jobs import JOB_HANDLERS, JobRunner, JobStore
+from jhub_apps.service.models import JHubAppConfig, Repository
+from jhub_apps.tests.common.constants import MOCK_USER
+
+
+async def _wait_for_jobs(store, job_ids):
+    while any(store.get(job_id).status in ("queued", "running") for job_id in job_ids):
+        await asyncio.sleep(0.01)
+    return [store.get(job_id) for job_id in job_ids]
+
+
+def test_job_runner_runs_jobs_with_bounded_concurrency(tmp_path):
+    running = []
+    max_running = []
+
+    async def echo(owner, params):
+        running.append(params)
+        max_running.append(len(running))
+        await asyncio.sleep(0.02)
+        running.remove(params)
+        if params.get("fail"):
+            raise ValueError("Invalid app")
+        return {"owner": owner, **params}
+
+    async def run():
+        runner = JobRunner(JobStore(str(tmp_path / "jobs.sqlite")), concurrency=1)
+        jobs = [await runner.submit("echo", "jovyan", {"value": i}) for i in range(2)]
+        jobs.append(await runner.submit("echo", "jovyan", {"fail": True}))
+        assert jobs[0].status == "queued"
+        finished = await _wait_for_jobs(runner.store, [job.id for job in jobs])
+        await runner.close()
+        return finished
+
+    with patch.dict(JOB_HANDLERS, {"echo": echo}):
+        first, second, failed = asyncio.run(run())
+    assert max(max_running) == 1
+    assert (first.status, first.result) == ("succeeded", {"owner": "jovyan", "value": 0})
+    assert (second.status, second.result) == ("succeeded", {"owner": "jovyan", "value": 1})
+    assert (failed.status, failed.error) == ("failed", "Invalid app")
+
+
+def test_job_runner_recovers_jobs_of_workers_which_are_gone(tmp_path):
+    calls = []
+
+    async def echo(owner, params):
+        calls.append(params)
+        return params
+
+    async def run():
+        store = JobStore(str(tmp_path / "jobs.sqlite"))
+        queued = store.create("echo", "jovyan", {"value": "queued"}, worker="gone")
+        running = store.create("echo", "jovyan", {"value": "running"}, worker="gone")
+        store.update(running.id, "running")
+        alive = store.create("echo", "jovyan", {"value": "alive"}, worker="alive")
+        # The worker "gone" stopped sending heartbeats
+        store._execute("UPDATE jobs SET heartbeat_at = ? WHERE worker = 'gone'", (time.time() - 60,))
+
+        runner = JobRunner(store)
+        await runner.recover()
+        recovered, interrupted = await _wait_for_jobs(store, [queued.id, running.id])
+        assert await runner.retry(interrupted.id)
+        assert not await runner.retry(recovered.id)
+        retried, = await _wait_for_jobs(store, [interrupted.id])
+        await runner.close()
+        return recovered, interrupted, retried, store.get(alive.id)
+
+    with patch.dict(JOB_HANDLERS, {"echo": echo}):
+        recovered, interrupted, retried, alive = asyncio.run(run())
+    assert recovered.status == "succeeded"
+    assert interrupted.status == "interrupted"
+    assert retried.status == "succeeded"
+    # Left to its worker
+    assert alive.status == "queued"
+    assert calls == [{"value": "queued"}, {"value": "running"}]
+
+
+def test_job_runner_skips_jobs_deleted_before_they_run(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    job = store.create("echo", "jovyan", {}, worker="alive")
+    get_with_params = store.get_with_params
+
+    def delete_then_get(job_id):
+        store._execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        return get_with_params(job_id)
+
+    runner = JobRunner(store)
+    with patch.object(store, "get_with_params", side_effect=delete_then_get):
+        asyncio.run(runner._run(job.id))
+    assert store.get(job.id) is None
+
+
+def test_job_runner_rejects_unknown_kinds(tmp_path):
+    runner = JobRunner(JobStore(str(tmp_path / "jobs.sqlite")))
+    with pytest.raises(ValueError):
+        asyncio.run(runner.submit("unknown", "jovyan", {}))
+
+
+@patch("jhub_apps.service.routes.get_repo_inspector")
+def test_api_app_config_from_git_as_job(get_repo_inspector, tmp_path, client):
+    async def inspect(repository):
+        return JHubAppConfig(display_name="App", description="An app from git", repository=repository)
+
+    get_repo_inspector.return_value.inspect = inspect
+    runner = JobRunner(JobStore(str(tmp_path / "jobs.sqlite")))
+    with patch("jhub_apps.service.routes.get_job_runner", return_value=runner):
+        response = client.post(
+            "/app-config-from-git/",
+            json={"url": "https://example.com/app.git"},
+            headers={"Prefer": "respond-async"},
+        )
+        assert response.status_code == 202
+        job = response.json()
+        assert response.headers["location"] == f"/jobs/{job['id']}"
+        assert (job["kind"], job["owner"]) == ("app_from_git", MOCK_USER.name)
+
+        assert client.get(f"/jobs/{job['id']}").json()["id"] == job["id"]
+        assert [listed["id"] for listed in client.get("/jobs/").json()] == [job["id"]]
+        with patch.object(MOCK_USER, "name", "alice"), patch.object(MOCK_USER, "admin", False):
+            assert client.get(f"/jobs/{job['id']}").status_code == 404
+
+        # Without the header, the config is returned right away
+        response = client.post("/app-config-from-git/", json={"url": "https://example.com/app.git"})
+        assert response.status_code == 200
+        assert response.json()["repository"] == Repository(url="https://example.com/app.git").model_dump()
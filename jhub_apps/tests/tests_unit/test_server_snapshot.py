@@ -0,0 +1,86 @@
+import asyncio
+from unittest.mock import patch
+
+from jhub_apps.hub_client.async_hub_client import AsyncHubClient
+from jhub_apps.service.server_snapshot import ServerSnapshot
+from jhub_apps.service.thumbnails import get_thumbnail_key, get_thumbnail_url
+
+
+def _page(users, etag, next_offset=None):
+    return {
+        "items": [{"name": name, "servers": {"app": {"name": "app"}}} for name in users],
+        "_pagination": {"next": {"offset": next_offset, "limit": 2} if next_offset else None},
+        "etag": etag,
+    }
+
+
+@patch.object(AsyncHubClient, "get_users_page")
+def test_snapshot_is_shared_by_concurrent_callers(get_users_page):
+    get_users_page.return_value = _page(["alice", "bob"], etag='"v1"')
+    snapshot = ServerSnapshot(ttl=60)
+
+    async def get_concurrently():
+        return await asyncio.gather(*[snapshot.get_users() for _ in range(10)])
+
+    results = asyncio.run(get_concurrently())
+    assert all(users.keys() == {"alice", "bob"} for users in results)
+    get_users_page.assert_called_once_with(offset=0, etag=None)
+
+
+@patch.object(AsyncHubClient, "get_users_page")
+def test_snapshot_refresh_reuses_unchanged_pages(get_users_page):
+    pages = {0: _page(["alice", "bob"], etag='"p0"', next_offset=2), 2: _page(["carol"], etag='"p2"')}
+
+    async def users_page(offset, etag):
+        if etag == pages[offset]["etag"]:
+            return None
+        return pages[offset]
+
+    get_users_page.side_effect = users_page
+    snapshot = ServerSnapshot(ttl=60)
+
+    async def refresh_after_change():
+        await snapshot.refresh()
+        pages[2] = _page(["carol", "dave"], etag='"p2-v2"')
+        await snapshot.refresh()
+        return await snapshot.get_users()
+
+    users = asyncio.run(refresh_after_change())
+    assert list(users) == ["alice", "bob", "carol", "dave"]
+    assert [call.kwargs for call in get_users_page.call_args_list] == [
+        {"offset": 0, "etag": None},
+        {"offset": 2, "etag": None},
+        {"offset": 0, "etag": '"p0"'},
+        {"offset": 2, "etag": '"p2"'},
+    ]
+
+
+@patch.object(AsyncHubClient, "get_users_page")
+def test_stale_snapshot_is_served_while_refreshing(get_users_page):
+    get_users_page.return_value = _page(["alice"], etag='"v1"')
+    snapshot = ServerSnapshot(ttl=60)
+
+    async def get_stale():
+        await snapshot.get_users()
+        get_users_page.return_value = _page(["alice", "bob"], etag='"v2"')
+        # Make the snapshot stale, but not too old to be served
+        snapshot._refreshed_at -= 61
+        stale_users = await snapshot.get_users()
+        await snapshot._refresh_task
+        return stale_users, await snapshot.get_users()
+
+    stale_users, users = asyncio.run(get_stale())
+    assert list(stale_users) == ["alice"]
+    assert list(users) == ["alice", "bob"]
+
+
+@patch.object(AsyncHubClient, "get_users_page")
+def test_snapshot_keeps_thumbnail_urls(get_users_page, thumbnail_store):
+    page = _page(["alice"], etag='"v1"')
+    page["items"][0]["servers"]["app"]["user_options"] = {"thumbnail": "data:image/svg+xml;base64,PHN2Zy8+"}
+    get_users_page.return_value = page
+    users = asyncio.run(ServerSnapshot(ttl=60).get_users())
+    assert users["alice"]["servers"]["app"]["user_options"]["thumbnail"] == get_thumbnail_url(
+        get_thumbnail_key(b"<svg/>", "image/svg+xml")
+    )
+    assert thumbnail_store.exists(get_thumbnail_key(b"<svg/>", "image/svg+xml"))
@@ -0,0 +1,83 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from jhub_apps.hub_client.async_hub_client import AsyncHubClient
+from jhub_apps.hub_client.utils import is_jupyterhub_5
+from jhub_apps.service.models import SharePermissions, User
+from jhub_apps.service.share_permissions import SharePermissionsCache
+
+
+def _user(name):
+    return User(name=name, admin=False, groups=[], kind="user", scopes=["access:services"])
+
+
+@pytest.mark.skipif(not is_jupyterhub_5(), reason="requires jupyterhub>=5")
+@patch.object(AsyncHubClient, "get_user_scopes")
+@patch.object(AsyncHubClient, "get_groups")
+@patch.object(AsyncHubClient, "get_user_names")
+def test_share_permissions_are_cached(get_user_names, get_groups, get_user_scopes):
+    get_user_names.return_value = ["alice", "bob", "carol"]
+    get_groups.return_value = [{"name": "alpha", "users": []}, {"name": "beta", "users": []}]
+    get_user_scopes.return_value = ["read:users:name!user=bob", "read:groups:name"]
+    share_permissions_cache = SharePermissionsCache(ttl=60)
+
+    async def get_twice():
+        first = await share_permissions_cache.get(_user("alice"))
+        second = await share_permissions_cache.get(_user("alice"))
+        return first, second
+
+    first, second = asyncio.run(get_twice())
+    assert first == second
+    assert first.users == ["bob"]
+    assert set(first.groups) == {"alpha", "beta"}
+    get_user_names.assert_called_once_with()
+    get_groups.assert_called_once_with()
+    get_user_scopes.assert_called_once_with()
+
+
+@pytest.mark.skipif(not is_jupyterhub_5(), reason="requires jupyterhub>=5")
+@patch.object(AsyncHubClient, "get_user_scopes")
+@patch.object(AsyncHubClient, "get_groups")
+@patch.object(AsyncHubClient, "get_user_names")
+def test_share_permissions_invalidated_when_users_change(get_user_names, get_groups, get_user_scopes):
+    get_user_names.return_value = ["alice", "bob"]
+    get_groups.return_value = []
+    get_user_scopes.return_value = ["read:users:name"]
+    share_permissions_cache = SharePermissionsCache(ttl=60)
+
+    async def get_before_and_after_new_user():
+        before = await share_permissions_cache.get(_user("alice"))
+        # Listing expires and a new user shows up on the Hub
+        share_permissions_cache._entities.clear()
+        get_user_names.return_value = ["alice", "bob", "dave"]
+        after = await share_permissions_cache.get(_user("alice"))
+        return before, after
+
+    before, after = asyncio.run(get_before_and_after_new_user())
+    assert before.users == ["bob"]
+    assert set(after.users) == {"bob", "dave"}
+    assert get_user_scopes.call_count == 2
+
+
+@patch("jhub_apps.service.routes.is_jupyterhub_5")
+@patch("jhub_apps.service.routes.get_share_permissions")
+def test_api_share_permissions(get_share_permissions, is_jupyterhub_5_, client):
+    is_jupyterhub_5_.return_value = True
+    get_share_permissions.return_value = SharePermissions(users=["bob"], groups=["alpha"])
+    response = client.get("/share-permissions/")
+    assert response.status_code == 200
+    assert response.json() == {"users": ["bob"], "groups": ["alpha"]}
+
+
+@pytest.mark.skipif(not is_jupyterhub_5(), reason="requires jupyterhub>=5")
+@patch.object(AsyncHubClient, "get_user_scopes")
+@patch.object(AsyncHubClient, "get_groups")
+@patch.object(AsyncHubClient, "get_user_names")
+def test_share_permissions_users_allowed_via_group(get_user_names, get_groups, get_user_scopes):
+    get_user_names.return_value = ["alice", "bob", "carol"]
+    get_groups.return_value = [{"name": "alpha", "users": ["carol"]}]
+    get_user_scopes.return_value = ["read:users:name!group=alpha"]
+    share_permissions = asyncio.run(SharePermissionsCache(ttl=60).get(_user("alice")))
+    assert share_permissions.users == ["carol"]
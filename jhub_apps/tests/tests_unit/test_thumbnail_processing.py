@@ -0,0 +1,46 @@
+import io
+
+import pytest
+from PIL import Image
+
+from jhub_apps.service.thumbnail_processing import (
+    THUMBNAIL_MAX_BYTES,
+    THUMBNAIL_SIZES,
+    InvalidThumbnail,
+    render_thumbnails,
+)
+
+
+def _noisy_image_bytes(width, height):
+    output = io.BytesIO()
+    image = Image.effect_noise((width, height), 64).convert("RGB")
+    exif = Image.Exif()
+    # ImageDescription, which must not end up in the thumbnails
+    exif[0x010E] = "private description"
+    image.save(output, format="PNG", exif=exif)
+    return output.getvalue()
+
+
+def test_render_thumbnails_downscales_to_every_size():
+    content = _noisy_image_bytes(2000, 1000)
+    renditions = render_thumbnails(content)
+    assert list(renditions) == list(THUMBNAIL_SIZES)
+    for size, rendition in renditions.items():
+        image = Image.open(io.BytesIO(rendition.content))
+        assert rendition.mime_type == "image/webp"
+        assert image.format == "WEBP"
+        assert max(image.size) <= size
+        assert not image.info.get("exif") and not image.info.get("icc_profile")
+        assert len(rendition.content) <= THUMBNAIL_MAX_BYTES
+
+
+def test_render_thumbnails_never_upscales():
+    renditions = render_thumbnails(_noisy_image_bytes(200, 100))
+    # Only the renditions smaller than the image itself are made
+    assert list(renditions) == [640, 160]
+    assert Image.open(io.BytesIO(renditions[640].content)).size == (200, 100)
+
+
+def test_render_thumbnails_rejects_invalid_images():
+    with pytest.raises(InvalidThumbnail):
+        render_thumbnails(b"not an image")
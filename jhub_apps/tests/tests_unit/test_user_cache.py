@@ -0,0 +1,51 @@
+import time
+
+from jhub_apps.service.models import User
+from jhub_apps.service.user_cache import UserCache
+
+
+def _user(name="jovyan"):
+    return User(name=name, admin=False, groups=[], kind="user", scopes=["access:services"])
+
+
+def test_user_cache_get_set():
+    user_cache = UserCache(ttl=60, maxsize=10)
+    assert user_cache.get("token-a") is None
+    user_cache.set("token-a", _user())
+    cached_user = user_cache.get("token-a")
+    assert cached_user == _user()
+    # cached users are copies, changing them doesn't change the cache
+    cached_user.name = "changed"
+    assert user_cache.get("token-a").name == "jovyan"
+
+
+def test_user_cache_expires():
+    user_cache = UserCache(ttl=0.01, maxsize=10)
+    user_cache.set("token-a", _user())
+    time.sleep(0.02)
+    assert user_cache.get("token-a") is None
+
+
+def test_user_cache_is_bounded():
+    user_cache = UserCache(ttl=60, maxsize=2)
+    for i in range(3):
+        user_cache.set(f"token-{i}", _user(f"user-{i}"))
+    assert user_cache.get("token-0") is None
+    assert user_cache.get("token-2").name == "user-2"
+
+
+def test_user_cache_evict_user():
+    user_cache = UserCache(ttl=60, maxsize=10)
+    user_cache.set("token-a", _user("alice"))
+    user_cache.set("token-b", _user("alice"))
+    user_cache.set("token-c", _user("bob"))
+    user_cache.evict_user("alice")
+    assert user_cache.get("token-a") is None
+    assert user_cache.get("token-b") is None
+    assert user_cache.get("token-c").name == "bob"
+
+
+def test_user_cache_disabled():
+    user_cache = UserCache(ttl=0, maxsize=10)
+    user_cache.set("token-a", _user())
+    assert user_cache.get("token-a") is None